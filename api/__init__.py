@@ -1,4 +1,20 @@
-__all__ = ['main', 'database', 'models']
+__all__ = ['main', 'database', 'models', 'breeds', 'config', 'outbound', 'crud', 'counts', 'pagination', 'queries', 'migrations', 'metrics', 'profiling', 'executor', 'cache', 'etags', 'serialization', 'compression', 'export', 'importer', 'benchmark']
 
+from . import config
+from . import outbound
+from . import breeds
+from . import metrics
+from . import profiling
+from . import migrations
+from . import executor
 from . import database
-from . import models
\ No newline at end of file
+from . import pagination
+from . import counts
+from . import models
+from . import cache
+from . import etags
+from . import serialization
+from . import compression
+from . import queries
+from . import crud
+from . import export
\ No newline at end of file
@@ -0,0 +1,398 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+import httpx
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
+
+# In-process load benchmark for the SpyCat API.
+#
+#   python -m api.benchmark --cats 1000 --missions 2 --targets 3 --notes 2 \
+#       --requests 2000 --concurrency 16 --output results.json
+#
+# The app is driven through httpx's ASGI transport against a freshly seeded
+# database, with the breed check answered by a mocked TheCatAPI. The database
+# is a temporary SQLite file unless --database-url is given, which also needs
+# --reset because seeding drops every table in it.
+
+BREEDS = ["Abyssinian", "Bengal", "Persian", "Siamese", "Sphynx"]
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    url: Callable[[random.Random], str]
+    body: Optional[Callable[[random.Random], Any]] = None
+
+@dataclass
+class SeedSize:
+    cats: int = 200
+    missions: int = 2
+    targets: int = 3
+    notes: int = 2
+
+    @property
+    def mission_count(self) -> int:
+        return self.cats * self.missions
+
+    @property
+    def target_count(self) -> int:
+        return self.mission_count * self.targets
+
+    @property
+    def note_count(self) -> int:
+        return self.target_count * self.notes
+
+def seed_database(db_engine: Engine, size: SeedSize, batch_size: int = 5000):
+    """Create a fresh schema and fill it with cats, missions, targets and notes.
+
+    Every existing table is dropped first, so only point this at a scratch
+    database. Ids are assigned sequentially, so scenario URLs can pick random
+    existing ids.
+    """
+    from .database import create_db_and_tables, drop_db_and_tables
+    from .models import SpyCat, Mission, Target, Note
+
+    drop_db_and_tables(db_engine)
+    create_db_and_tables(db_engine)
+
+    def rows(count: int, make: Callable[[int], dict]):
+        for start in range(1, count + 1, batch_size):
+            yield [make(i) for i in range(start, min(start + batch_size, count + 1))]
+
+    with db_engine.begin() as connection:
+        for model, count, make in [
+            (SpyCat, size.cats, lambda i: {
+                "id": i, "name": f"Cat{i}", "years_of_experience": i % 20,
+                "breed": BREEDS[i % len(BREEDS)], "salary": float(1000 + i % 500)
+            }),
+            (Mission, size.mission_count, lambda i: {
+                "id": i, "cat_id": (i - 1) // size.missions + 1, "is_complete": False
+            }),
+            (Target, size.target_count, lambda i: {
+                "id": i, "mission_id": (i - 1) // size.targets + 1, "name": f"Target{i}",
+                "country": f"Country{i % 50}", "is_complete": False
+            }),
+            (Note, size.note_count, lambda i: {
+                "id": i, "target_id": (i - 1) // size.notes + 1, "content": f"Note {i}"
+            }),
+        ]:
+            for batch in rows(count, make):
+                connection.execute(insert(model.__table__), batch)
+
+def default_scenarios(size: SeedSize) -> list[Scenario]:
+    """Scenarios covering the list, detail and write paths of each entity."""
+    def cat(rnd):
+        return rnd.randint(1, max(size.cats, 1))
+
+    def mission(rnd):
+        return rnd.randint(1, max(size.mission_count, 1))
+
+    def target(rnd):
+        return rnd.randint(1, max(size.target_count, 1))
+
+    def note(rnd):
+        return rnd.randint(1, max(size.note_count, 1))
+
+    def new_cat(rnd):
+        return {"name": f"Bench{rnd.random()}", "years_of_experience": 3, "breed": rnd.choice(BREEDS), "salary": 1500.0}
+
+    scenarios = [
+        Scenario("list_spycats", "GET", lambda rnd: "/spycat/?limit=20"),
+        Scenario("get_spycat", "GET", lambda rnd: f"/spycat/{cat(rnd)}"),
+        Scenario("list_missions", "GET", lambda rnd: "/mission/?limit=20"),
+        Scenario("list_spycats_page", "GET", lambda rnd: f"/spycat/?limit=200&skip={rnd.randint(0, 5) * 20}"),
+        Scenario("list_missions_page", "GET", lambda rnd: f"/mission/?limit=200&skip={rnd.randint(0, 5) * 20}"),
+        Scenario("create_spycat", "POST", lambda rnd: "/spycat/", new_cat),
+        Scenario("update_spycat", "PUT", lambda rnd: f"/spycat/{cat(rnd)}", new_cat),
+    ]
+    if size.mission_count:
+        scenarios += [
+            Scenario("get_mission", "GET", lambda rnd: f"/mission/{mission(rnd)}"),
+            Scenario("list_targets", "GET", lambda rnd: f"/mission/{mission(rnd)}/target/"),
+            Scenario("create_mission", "POST", lambda rnd: "/mission/", lambda rnd: {
+                "cat_id": cat(rnd), "is_complete": False,
+                "targets": [{"name": "BenchTarget", "country": "Country1"}]
+            }),
+        ]
+    if size.target_count:
+        scenarios += [
+            Scenario("get_target", "GET", lambda rnd: f"/target/{target(rnd)}"),
+            Scenario("list_notes", "GET", lambda rnd: f"/target/{target(rnd)}/note/"),
+            Scenario("update_target", "PUT", lambda rnd: f"/target/{target(rnd)}",
+                     lambda rnd: {"name": f"Target{rnd.random()}", "country": "Country1"}),
+            Scenario("create_note", "POST", lambda rnd: f"/target/{target(rnd)}/note/",
+                     lambda rnd: {"content": "Benchmark note"}),
+        ]
+    if size.note_count:
+        scenarios += [
+            Scenario("get_note", "GET", lambda rnd: f"/note/{note(rnd)}"),
+            Scenario("search_notes", "GET", lambda rnd: f"/search?q=Note+{note(rnd)}&type=note"),
+        ]
+
+    return scenarios
+
+class QueryCounter:
+    """Count the SQL statements executed on an engine."""
+
+    def __init__(self, db_engine: Engine):
+        self.engine = db_engine
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _before_cursor_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    counter: QueryCounter,
+    seed: int = 0,
+    cold: bool = False
+) -> dict:
+    """Send requests for one scenario from concurrent workers and summarize them."""
+    from .cache import response_cache
+
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    remaining = requests
+    rnd = random.Random(seed)
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            url = scenario.url(rnd)
+            body = scenario.body(rnd) if scenario.body else None
+            if cold:
+                response_cache.clear()
+
+            started = time.perf_counter()
+            response = await client.request(scenario.method, url, json=body)
+            latencies.append(time.perf_counter() - started)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    response_cache.clear()
+    queries_before = counter.count
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    queries = counter.count - queries_before
+
+    latencies.sort()
+    return {
+        "method": scenario.method,
+        "requests": len(latencies),
+        "errors": sum(n for status, n in statuses.items() if not status.startswith("2")),
+        "statuses": statuses,
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": 1000 * percentile(latencies, 50),
+            "p95": 1000 * percentile(latencies, 95),
+            "p99": 1000 * percentile(latencies, 99),
+            "max": 1000 * latencies[-1] if latencies else 0.0,
+        },
+        "queries": queries,
+        "queries_per_request": queries / len(latencies) if latencies else 0.0,
+    }
+
+def mock_breed_upstream(request: httpx.Request) -> httpx.Response:
+    """Answer TheCatAPI breed list requests without network access."""
+    return httpx.Response(200, json=[{"name": name} for name in BREEDS])
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run_benchmark(
+    db_engine: Engine,
+    size: SeedSize,
+    requests: int = 500,
+    concurrency: int = 8,
+    only: Optional[list[str]] = None,
+    seed: int = 0,
+    cold: bool = False,
+    mode: Optional[str] = None
+) -> dict:
+    """Seed the database, run every scenario against the app in-process and return the results.
+
+    The endpoints use the sync or async session path given by mode, by
+    default the configured SCA_DATABASE_MODE, against the seeded database.
+    """
+    from .main import app
+    from .database import DATABASE_MODE, get_db, get_engine, db_executor, SessionRunner, \
+        create_session_factory, create_async_db_engine, create_async_session_factory
+    from .outbound import get_http_client
+    from .breeds import breed_registry
+    from .counts import row_counts
+    from .cache import response_cache
+    from . import config
+
+    mode = mode or DATABASE_MODE
+    seed_database(db_engine, size)
+    row_counts.clear()
+    response_cache.clear()
+
+    async_engine = None
+    if mode == "async":
+        async_url = db_engine.url.render_as_string(hide_password=False).replace("sqlite://", "sqlite+aiosqlite://", 1)
+        async_engine = create_async_db_engine(async_url)
+        async_session_factory = create_async_session_factory(async_engine)
+
+        async def get_benchmark_db():
+            async with async_session_factory() as session:
+                yield SessionRunner(session)
+    else:
+        session_factory = create_session_factory(db_engine)
+
+        def get_benchmark_db():
+            with session_factory() as session:
+                yield SessionRunner(session, db_executor if config.DB_THREADPOOL else None)
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(mock_breed_upstream))
+    overrides = {
+        get_db: get_benchmark_db,
+        get_engine: lambda: db_engine,
+        get_http_client: lambda: http_client,
+    }
+    saved_overrides = dict(app.dependency_overrides)
+    app.dependency_overrides.update(overrides)
+    saved_snapshot_path, breed_registry.snapshot_path = breed_registry.snapshot_path, None
+
+    scenarios = [s for s in default_scenarios(size) if not only or s.name in only]
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            # Warm up the breed registry and the connection pool
+            await client.get("/spycat/?limit=1")
+
+            with QueryCounter(async_engine.sync_engine if async_engine else db_engine) as counter:
+                for index, scenario in enumerate(scenarios):
+                    results[scenario.name] = await run_scenario(
+                        client, scenario, requests, concurrency, counter, seed + index, cold
+                    )
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(saved_overrides)
+        breed_registry.snapshot_path = saved_snapshot_path
+        await http_client.aclose()
+        if async_engine is not None:
+            await async_engine.dispose()
+
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "database": db_engine.url.render_as_string(hide_password=True),
+        "mode": mode,
+        "seed": {"cats": size.cats, "missions": size.missions, "targets": size.targets, "notes": size.notes},
+        "requests": requests,
+        "concurrency": concurrency,
+        "cold": cold,
+        "scenarios": results,
+    }
+
+def format_results(results: dict, baseline: Optional[dict] = None) -> str:
+    """Render the results as a table, with throughput changes against a baseline run."""
+    lines = [f"{'scenario':<16}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'q/req':>8}{'errors':>8}"
+             + ("  vs baseline" if baseline else "")]
+
+    for name, result in results["scenarios"].items():
+        latency = result["latency_ms"]
+        line = (f"{name:<16}{result['throughput']:>10.1f}{latency['p50']:>10.2f}{latency['p95']:>10.2f}"
+                f"{latency['p99']:>10.2f}{result['queries_per_request']:>8.1f}{result['errors']:>8}")
+
+        previous = (baseline or {}).get("scenarios", {}).get(name)
+        if previous and previous["throughput"]:
+            change = 100 * (result["throughput"] / previous["throughput"] - 1)
+            line += f"  {change:+.1f}% req/s, p95 {previous['latency_ms']['p95']:.2f} -> {latency['p95']:.2f} ms"
+
+        lines.append(line)
+
+    return "\n".join(lines)
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Command-line entry point: python -m api.benchmark."""
+    parser = argparse.ArgumentParser(prog="python -m api.benchmark", description="Benchmark the SpyCat API in-process.")
+    parser.add_argument("--cats", type=int, default=SeedSize.cats, help="Spy cats to seed")
+    parser.add_argument("--missions", type=int, default=SeedSize.missions, help="Missions per cat")
+    parser.add_argument("--targets", type=int, default=SeedSize.targets, help="Targets per mission")
+    parser.add_argument("--notes", type=int, default=SeedSize.notes, help="Notes per target")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenario", action="append", help="Only run the named scenario (repeatable)")
+    parser.add_argument("--cold", action="store_true", help="Clear the response cache before every request")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the request mix")
+    parser.add_argument("--database-url", help="Database to seed (default: a temporary SQLite file)")
+    parser.add_argument("--reset", action="store_true", help="Allow dropping every table of --database-url")
+    parser.add_argument("--mode", choices=["sync", "async"], help="Session path to benchmark (default: SCA_DATABASE_MODE)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    if args.database_url and not args.reset:
+        parser.error("seeding drops every table of --database-url; pass --reset to confirm")
+
+    from .database import create_db_engine
+
+    size = SeedSize(args.cats, args.missions, args.targets, args.notes)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_engine = create_db_engine(args.database_url or f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}")
+        try:
+            results = asyncio.run(run_benchmark(
+                db_engine, size, args.requests, args.concurrency, args.scenario, args.seed, args.cold, args.mode
+            ))
+        finally:
+            db_engine.dispose()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(format_results(results, baseline))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+import httpx
+from .metrics import breed_upstream
+from . import config
+
+logger = logging.getLogger(__name__)
+
+def normalize_breed(name: str) -> str:
+    """Normalize a breed name for lookups."""
+    return name.strip().lower()
+
+class BreedRegistry:
+    """In-process cache of the breeds known to TheCatAPI.
+
+    The registry serves lookups from memory, refreshes itself in the background
+    once the TTL expires and keeps serving the stale set when the upstream
+    call fails. An optional JSON snapshot on disk is used to warm cold starts.
+    """
+
+    def __init__(
+        self,
+        url: str = config.BREED_API_URL,
+        ttl: float = config.BREED_CACHE_TTL,
+        snapshot_path: Optional[str] = config.BREED_SNAPSHOT_PATH,
+        offline: bool = config.BREED_OFFLINE,
+        retry_interval: float = config.BREED_RETRY_INTERVAL,
+        timeout: float = config.BREED_TIMEOUT,
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.offline = offline
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+
+        self._names: list[str] = []
+        self._breeds: Optional[frozenset[str]] = None
+        self._fetched_at: float = 0.0
+        self._failed_at: float = 0.0
+        self._lock = asyncio.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._breeds is not None
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self._fetched_at >= self.ttl
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._names)
+
+    def _set(self, names: list[str], fetched_at: float):
+        self._names = sorted(set(names))
+        self._breeds = frozenset(normalize_breed(name) for name in names)
+        self._fetched_at = fetched_at
+
+    def load_snapshot(self) -> bool:
+        """Load the breed set from the on-disk snapshot, if there is one."""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._set(data["breeds"], float(data.get("fetched_at", 0.0)))
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning("Could not read breed snapshot %s: %s", self.snapshot_path, exc)
+            return False
+
+        return True
+
+    def save_snapshot(self):
+        """Write the current breed set to the on-disk snapshot."""
+        if not self.snapshot_path or not self.loaded:
+            return
+
+        data = {"source": self.url, "fetched_at": self._fetched_at, "breeds": self._names}
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as exc:
+            logger.warning("Could not write breed snapshot %s: %s", self.snapshot_path, exc)
+
+    async def fetch(self, client: httpx.AsyncClient) -> list[str]:
+        """Download the breed names from the upstream API."""
+        res = await client.get(self.url, timeout=self.timeout)
+        res.raise_for_status()
+        return [b["name"] for b in res.json()]
+
+    async def _refresh(self, client: Optional[httpx.AsyncClient]) -> bool:
+        client = client or self._client
+        if self.offline or client is None:
+            return False
+
+        started = time.perf_counter()
+        try:
+            names = await self.fetch(client)
+        except (httpx.HTTPError, ValueError, KeyError, TypeError) as exc:
+            breed_upstream.observe(time.perf_counter() - started, "error")
+            logger.warning("Breed refresh failed, serving %s set: %s",
+                           "stale" if self.loaded else "empty", exc)
+            self._failed_at = time.time()
+            return False
+
+        breed_upstream.observe(time.perf_counter() - started, "ok")
+
+        self._set(names, time.time())
+        self.save_snapshot()
+        return True
+
+    async def refresh(self, client: Optional[httpx.AsyncClient] = None) -> bool:
+        """Refresh the breed set from upstream, keeping the old set on failure."""
+        async with self._lock:
+            return await self._refresh(client)
+
+    def _schedule_refresh(self, client: Optional[httpx.AsyncClient]):
+        if self.offline or (self._refresh_task and not self._refresh_task.done()):
+            return
+        self._refresh_task = asyncio.create_task(self.refresh(client))
+
+    async def _refresh_loop(self):
+        while True:
+            if self.loaded and not self.stale:
+                delay = self.ttl - (time.time() - self._fetched_at)
+            else:
+                delay = 0
+            await asyncio.sleep(max(delay, self.retry_interval))
+
+            if self.stale:
+                await self.refresh()
+
+    async def ensure_loaded(self, client: Optional[httpx.AsyncClient] = None):
+        """Make sure the registry has a breed set, loading it if needed."""
+        if self.loaded:
+            return
+
+        async with self._lock:
+            if self.loaded or self.load_snapshot():
+                return
+
+            # Do not hammer the upstream API while it is down
+            if time.time() - self._failed_at < self.retry_interval:
+                return
+
+            await self._refresh(client)
+
+    async def start(self, client: httpx.AsyncClient):
+        """Load the registry and start the background refresh loop using the given client."""
+        self._client = client
+        await self.ensure_loaded(client)
+
+        if self.offline:
+            return
+
+        if self.stale:
+            self._schedule_refresh(client)
+        self._loop_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Stop the background refresh tasks."""
+        for task in (self._loop_task, self._refresh_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._loop_task = None
+        self._refresh_task = None
+        self._client = None
+
+    async def contains(self, breed: str, client: Optional[httpx.AsyncClient] = None) -> bool:
+        """Check whether the breed is known, revalidating stale data in the background."""
+        await self.ensure_loaded(client)
+
+        if not self.loaded:
+            return False
+
+        if self.stale:
+            self._schedule_refresh(client)
+
+        return self.known(breed)
+
+    def known(self, breed: str) -> bool:
+        """Check whether the breed is in the loaded set, without loading or refreshing it.
+
+        Safe to call from worker threads, such as an import running on the
+        database thread pool; nothing is known until the registry is loaded.
+        """
+        return self.loaded and normalize_breed(breed) in self._breeds
+
+breed_registry = BreedRegistry()
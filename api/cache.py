@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable, Optional
+from . import config
+
+Tag = tuple[str, int]
+
+class ResponseCache:
+    """In-process LRU cache for encoded detail responses.
+
+    Entries are keyed by (entity, id) and tagged with every entity their payload
+    embeds, e.g. a target entry is tagged with its mission and notes. Writes
+    invalidate by tag, which drops exactly the entries that could have changed.
+    """
+
+    def __init__(self, max_size: int = config.RESPONSE_CACHE_SIZE, ttl: float = config.RESPONSE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._entries: OrderedDict[Hashable, tuple[Any, float, frozenset[Tag]]] = OrderedDict()
+        self._keys_by_tag: dict[Tag, set[Hashable]] = {}
+        self._generation = 0
+        self._floor = 0
+        self._invalidated_at: dict[Tag, int] = {}
+        self._lock = threading.Lock()
+
+    def _drop(self, key: Hashable):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a cached value, counting the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def generation(self) -> int:
+        """Get a token to pass to set() so that values loaded before a concurrent write are not stored."""
+        with self._lock:
+            return self._generation
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[Tag], generation: Optional[int] = None):
+        """Store a value tagged with the entities it was built from."""
+        if self.max_size <= 0:
+            return
+
+        tags = frozenset(tags)
+        with self._lock:
+            if generation is not None and (
+                generation < self._floor
+                or any(self._invalidated_at.get(tag, -1) >= generation for tag in tags)
+            ):
+                return
+
+            if key in self._entries:
+                self._drop(key)
+
+            self._entries[key] = (value, time.monotonic() + self.ttl, tags)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags: Optional[Tag]):
+        """Drop every entry tagged with one of the given entities."""
+        with self._lock:
+            for tag in tags:
+                if tag is None or tag[1] is None:
+                    continue
+
+                self._invalidated_at[tag] = self._generation
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._drop(key)
+                    self.invalidations += 1
+
+            self._generation += 1
+
+            # Only writes racing with in-flight loads need to be remembered;
+            # forgetting them is safe once older loads can no longer be stored
+            if len(self._invalidated_at) > 4 * max(self.max_size, 1):
+                self._invalidated_at.clear()
+                self._floor = self._generation
+
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._invalidated_at.clear()
+            self._generation += 1
+            self._floor = self._generation
+
+    def stats(self) -> dict:
+        """Get the cache counters."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+response_cache = ResponseCache()
@@ -0,0 +1,150 @@
+import asyncio
+import gzip
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from .etags import CODINGS, variant_etag
+from .metrics import http_compressed_responses, http_compression_saved_bytes
+from . import config
+
+try:
+    import brotli
+except ImportError:
+    # Optional; clients are served gzip instead
+    brotli = None
+
+# Content codings in order of preference; etag_matches knows their ETag suffixes
+ENCODINGS = CODINGS if brotli is not None else ("gzip",)
+
+# Media types worth compressing; images, archives and the like already are
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript", "image/svg+xml")
+
+def negotiate_encoding(accept_encoding: Optional[str], available: tuple[str, ...] = ENCODINGS) -> Optional[str]:
+    """Pick the content coding to use for an Accept-Encoding header, or None for identity.
+
+    The coding with the highest q-value wins; ties go to the earlier one in available.
+    """
+    if not accept_encoding:
+        return None
+
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding] = quality
+
+    best, best_quality = None, 0.0
+    for coding in available:
+        quality = qualities.get(coding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+
+    return best
+
+def compress(body: bytes, encoding: str, gzip_level: int = config.COMPRESS_GZIP_LEVEL,
+             brotli_quality: int = config.COMPRESS_BROTLI_QUALITY) -> bytes:
+    """Compress a response body with the given content coding."""
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    # A fixed mtime keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+def is_compressible(headers: Headers) -> bool:
+    content_type = headers.get("content-type", "")
+    return "content-encoding" not in headers and content_type.startswith(COMPRESSIBLE_TYPES)
+
+class CompressionMiddleware:
+    """ASGI middleware compressing response bodies with brotli or gzip, as negotiated.
+
+    Only complete bodies of at least minimum_size bytes are compressed;
+    streaming responses, and responses that already have a Content-Encoding,
+    such as the gzip export, are passed through. Bodies of at least
+    thread_size bytes are compressed on a worker thread so that the event
+    loop keeps serving other requests meanwhile.
+
+    Every response that could be compressed says so with Vary: Accept-Encoding,
+    whether it was or not. A compressed body's ETag gets a suffix per coding,
+    e.g. "…-gzip", since a strong ETag must differ between encodings;
+    etag_matches strips it again when the client sends it back. A 304 carries
+    the suffixed ETag when the client's If-None-Match has it.
+    """
+
+    def __init__(self, app, minimum_size: int = config.COMPRESS_MIN_SIZE,
+                 thread_size: int = config.COMPRESS_THREAD_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_size = thread_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = None
+        if scope["method"] != "HEAD":
+            encoding = negotiate_encoding(request_headers.get("accept-encoding"))
+
+        start = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                if message["status"] == 304:
+                    # Not Modified has no body, only the headers the full response would have had
+                    headers = MutableHeaders(raw=message["headers"])
+                    headers.add_vary_header("Accept-Encoding")
+                    etag = headers.get("etag")
+                    if encoding and etag and variant_etag(etag, encoding) in request_headers.get("if-none-match", ""):
+                        headers["ETag"] = variant_etag(etag, encoding)
+                    passthrough = True
+                    await send(message)
+                    return
+                # Hold the headers back until the body shows whether to compress
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            passthrough = True
+            if message.get("more_body", False) or not is_compressible(headers):
+                await send(start)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is None or len(body) < self.minimum_size:
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= self.thread_size:
+                compressed = await asyncio.to_thread(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+
+            if len(compressed) < len(body):
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(compressed))
+                if "etag" in headers:
+                    headers["ETag"] = variant_etag(headers["etag"], encoding)
+                http_compressed_responses.inc(encoding)
+                http_compression_saved_bytes.inc(encoding, amount=len(body) - len(compressed))
+                body = compressed
+
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
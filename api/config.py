@@ -0,0 +1,83 @@
+import os
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a boolean flag from the environment."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Breed registry settings
+BREED_API_URL = os.getenv("SCA_BREED_API_URL", "https://api.thecatapi.com/v1/breeds")
+BREED_CACHE_TTL = float(os.getenv("SCA_BREED_CACHE_TTL", "86400"))
+BREED_TIMEOUT = float(os.getenv("SCA_BREED_TIMEOUT", "5"))
+BREED_RETRY_INTERVAL = float(os.getenv("SCA_BREED_RETRY_INTERVAL", "60"))
+BREED_SNAPSHOT_PATH = os.getenv("SCA_BREED_SNAPSHOT_PATH", "./breeds.json") or None
+BREED_OFFLINE = _env_bool("SCA_BREED_OFFLINE", False)
+
+# Outbound HTTP client settings
+HTTP_MAX_CONNECTIONS = int(os.getenv("SCA_HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("SCA_HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("SCA_HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("SCA_HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("SCA_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP2 = _env_bool("SCA_HTTP2", True)
+
+# Database settings
+DATABASE_URL = os.getenv("SCA_DATABASE_URL", "sqlite:///./sca.db")
+ASYNC_DATABASE_URL = os.getenv("SCA_ASYNC_DATABASE_URL") or DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+DATABASE_MODE = os.getenv("SCA_DATABASE_MODE", "sync").strip().lower()
+
+# Keep objects loaded after commit, so writes return what they persisted without
+# a refresh SELECT; set to true to expire them as SQLAlchemy does by default
+SESSION_EXPIRE_ON_COMMIT = _env_bool("SCA_SESSION_EXPIRE_ON_COMMIT", False)
+
+# SQLite connection profile ("production" or "default") and per-PRAGMA overrides,
+# e.g. SCA_SQLITE_SYNCHRONOUS=FULL
+SQLITE_PROFILE = os.getenv("SCA_SQLITE_PROFILE", "production").strip().lower()
+SQLITE_PRAGMA_OVERRIDES = {
+    name: os.environ[f"SCA_SQLITE_{name.upper()}"]
+    for name in ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout")
+    if f"SCA_SQLITE_{name.upper()}" in os.environ
+}
+
+# Row count cache settings
+COUNT_CACHE_TTL = float(os.getenv("SCA_COUNT_CACHE_TTL", "30"))
+COUNT_ESTIMATE_TTL = float(os.getenv("SCA_COUNT_ESTIMATE_TTL", "600"))
+
+# Response cache settings
+RESPONSE_CACHE_SIZE = int(os.getenv("SCA_RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_TTL = float(os.getenv("SCA_RESPONSE_CACHE_TTL", "60"))
+
+# Export settings
+EXPORT_CHUNK_SIZE = int(os.getenv("SCA_EXPORT_CHUNK_SIZE", "500"))
+
+# Import settings
+IMPORT_BATCH_SIZE = int(os.getenv("SCA_IMPORT_BATCH_SIZE", "1000"))
+IMPORT_SPOOL_SIZE = int(os.getenv("SCA_IMPORT_SPOOL_SIZE", str(8 * 1024 * 1024)))
+
+# Database thread pool settings (0 workers sizes the pool one below the engine's connection
+# pool capacity, which also caps a configured size)
+DB_THREADPOOL = _env_bool("SCA_DB_THREADPOOL", True)
+DB_WORKERS = int(os.getenv("SCA_DB_WORKERS", "0"))
+DB_WORKERS_FALLBACK = 8
+DB_QUEUE_SIZE = int(os.getenv("SCA_DB_QUEUE_SIZE", "64"))
+DB_RETRY_AFTER = int(os.getenv("SCA_DB_RETRY_AFTER", "1"))
+
+# Response compression: bodies of at least SCA_COMPRESS_MIN_SIZE bytes are sent
+# with brotli or gzip as the client accepts, compressed on a worker thread from
+# SCA_COMPRESS_THREAD_SIZE bytes
+COMPRESSION = _env_bool("SCA_COMPRESSION", True)
+COMPRESS_MIN_SIZE = int(os.getenv("SCA_COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_THREAD_SIZE = int(os.getenv("SCA_COMPRESS_THREAD_SIZE", str(64 * 1024)))
+COMPRESS_GZIP_LEVEL = int(os.getenv("SCA_COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("SCA_COMPRESS_BROTLI_QUALITY", "4"))
+
+# Profiling settings: requests are profiled when they send the header or are
+# sampled, and kept when they take at least the threshold
+PROFILING = _env_bool("SCA_PROFILING", False)
+PROFILE_HEADER = os.getenv("SCA_PROFILE_HEADER", "X-SCA-Profile")
+PROFILE_SAMPLE_RATE = float(os.getenv("SCA_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_THRESHOLD_MS = float(os.getenv("SCA_PROFILE_THRESHOLD_MS", "200"))
+PROFILE_DIR = os.getenv("SCA_PROFILE_DIR", "./profiles")
+PROFILE_MAX_ENTRIES = int(os.getenv("SCA_PROFILE_MAX_ENTRIES", "50"))
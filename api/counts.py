@@ -0,0 +1,79 @@
+import threading
+import time
+from typing import Optional
+from sqlmodel import SQLModel, Session, select, func
+from . import config
+
+class RowCountCache:
+    """Cached row counts for the list endpoints.
+
+    Counts are computed with COUNT(*) on a miss and then maintained in
+    process: writes that add or remove rows adjust the cached value, and
+    writes with unknown effect invalidate it. A maintained count is reported
+    as exact until its TTL expires; after that, or after an invalidation,
+    it may still be served as an estimate to callers that accept one.
+
+    Every adjustment or invalidation bumps the table's generation. A COUNT
+    that ran while the generation changed is returned but not cached, since
+    it may or may not include the write that was adjusted for.
+    """
+
+    def __init__(self, ttl: float = config.COUNT_CACHE_TTL, estimate_ttl: float = config.COUNT_ESTIMATE_TTL):
+        self.ttl = ttl
+        self.estimate_ttl = estimate_ttl
+        self._entries: dict[str, list] = {}
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session: Session, model: type[SQLModel], allow_estimate: bool = False) -> tuple[int, bool]:
+        """Get the row count of a table and whether the value is exact."""
+        key = model.__tablename__
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                count, counted_at, exact = entry
+                age = now - counted_at
+                if exact and age < self.ttl:
+                    return count, True
+                if allow_estimate and age < self.estimate_ttl:
+                    return count, False
+            generation = self._generations.setdefault(key, 0)
+
+        count = session.exec(select(func.count()).select_from(model)).one()
+
+        with self._lock:
+            if self._generations.get(key, 0) == generation:
+                self._entries[key] = [count, now, True]
+
+        return count, True
+
+    def adjust(self, model: type[SQLModel], delta: int):
+        """Adjust a cached count after rows were added or removed."""
+        key = model.__tablename__
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            entry = self._entries.get(key)
+            if entry:
+                entry[0] = max(entry[0] + delta, 0)
+
+    def invalidate(self, model: Optional[type[SQLModel]] = None):
+        """Mark a cached count (or all of them) as an estimate."""
+        with self._lock:
+            keys = [model.__tablename__] if model else list(self._entries)
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+            entries = [self._entries.get(key) for key in keys]
+            for entry in entries:
+                if entry:
+                    entry[2] = False
+
+    def clear(self):
+        """Drop all cached counts."""
+        with self._lock:
+            for key in self._generations:
+                self._generations[key] += 1
+            self._entries.clear()
+
+row_counts = RowCountCache()
@@ -0,0 +1,1162 @@
+import html
+import re
+from typing import Any, Optional, Sequence, TypeVar
+from fastapi import HTTPException
+from sqlalchemy import tuple_, insert, update, delete, case, exists, func, literal, and_, or_, text, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.interfaces import ORMOption
+from sqlmodel import Session, select
+from .pagination import encode_cursor, decode_cursor
+from .counts import row_counts
+from .cache import response_cache
+from .etags import COMPACT, make_etag, etag_matches, variant_etag
+from .serialization import dumps
+from . import queries
+from .models import \
+    SpyCat, SpyCatModel, SpyCatModelPatch, \
+    Mission, MissionModel, MissionModelCreate, MissionModelPatch, \
+    Target, TargetModel, TargetModelCreate, TargetModelPatch, TargetModelBulkPatch, \
+    Note, NoteModel, NoteModelPatch, \
+    CompletionStats, SpyCatStats, \
+    spycat_validate, target_validate, note_validate, mission_patch_validate, target_patch_validate, note_patch_validate
+
+T = TypeVar("T")
+
+# Data-access functions shared by the sync and async session paths.
+# Each function takes a synchronous session as its first argument so it can be
+# called directly or through AsyncSession.run_sync.
+
+def _bulk_insert(session: Session, model: type, rows: list[dict]) -> list[dict]:
+    """Insert rows with executemany-style INSERT ... RETURNING and return them in input order."""
+    if not rows:
+        return []
+
+    # A Core insert keeps rows with NULL values in the same batch as the others.
+    # RETURNING order is not guaranteed, so SQLAlchemy matches the returned rows
+    # to their parameters; without a sentinel column SQLite does that by
+    # inserting one row per statement, still in this one transaction.
+    table = model.__table__
+    result = session.execute(insert(table).returning(*table.columns, sort_by_parameter_order=True), rows)
+
+    return [dict(row) for row in result.mappings()]
+
+def _delete_returning(session: Session, model: type, *conditions) -> Optional[dict]:
+    """Delete the row matching the conditions with one DELETE ... RETURNING and return it.
+
+    Children go with it through ON DELETE CASCADE instead of being loaded into the session.
+    """
+    table = model.__table__
+    row = session.execute(delete(table).where(*conditions).returning(*table.columns)).mappings().first()
+    return dict(row) if row else None
+
+def _update_returning(session: Session, model: type, values: dict, *conditions) -> list[dict]:
+    """Update the rows matching the conditions with one UPDATE ... RETURNING and return them.
+
+    With no values the rows are only read, so an empty partial update still returns them.
+    """
+    table = model.__table__
+    if values:
+        statement = update(table).where(*conditions).values(values).returning(*table.columns)
+    else:
+        statement = select(*table.columns).where(*conditions)
+    return [dict(row) for row in session.execute(statement).mappings()]
+
+def _persisted(session: Session, obj: T) -> T:
+    """Return a just-committed object, reloading it only if the commit expired it."""
+    if session.expire_on_commit:
+        session.refresh(obj)
+    return obj
+
+def _columns(model: type, fields: Sequence[str]) -> list:
+    """Get the columns of a table model for the given fields, in that order."""
+    return [getattr(model, field) for field in fields]
+
+def _row_part(row, start: int, fields: Sequence[str]) -> Optional[dict]:
+    """Map the values of fields starting at position start of a projected row to a dict.
+
+    Returns None for the columns of an outer-joined table that matched no row.
+    """
+    values = row[start:start + len(fields)]
+    if values[0] is None:
+        return None
+    return dict(zip(fields, values))
+
+def _children(rows: Sequence, start: int, fields: Sequence[str]) -> list[dict]:
+    """Collect the outer-joined child rows of a parent read with one joined query."""
+    return [child for child in (_row_part(row, start, fields) for row in rows) if child is not None]
+
+def _check_bulk_errors(errors: list[dict], atomic: bool) -> list[dict]:
+    """Abort an atomic bulk request if any item failed validation."""
+    errors = sorted(errors, key=lambda error: error["index"])
+    if errors and atomic:
+        raise HTTPException(status_code=400, detail=errors)
+    return errors
+
+def _lock_row(session: Session, model: type, entity_id: int):
+    """Take the write lock on a row before reading it, for a read-compare-write in one transaction.
+
+    The no-op UPDATE holds the row lock on server databases and the database
+    write lock on SQLite, so reads after it see the latest commit and no other
+    writer can change the row until the transaction ends.
+    """
+    table = model.__table__
+    session.execute(update(table).where(table.c.id == entity_id).values(id=table.c.id))
+
+
+# SpyCat operations
+def get_spycat(session: Session, spycat_id: int, options: Sequence[ORMOption] = ()) -> SpyCat:
+    """Get a spy cat by ID with the given loader options or raise 404."""
+    spycat = session.get(SpyCat, spycat_id, options=options)
+    if not spycat:
+        raise HTTPException(status_code=404, detail="Spy Cat not found")
+
+    return spycat
+
+def create_spycat(session: Session, spycat: SpyCat) -> SpyCat:
+    """Create a new spy cat."""
+    session.add(spycat)
+    session.commit()
+    row_counts.adjust(SpyCat, 1)
+
+    return _persisted(session, spycat)
+
+# Fields of the nested representations built from column values by the read
+# paths, in the field order of their response models, so that the results can
+# be encoded as JSON directly instead of being validated against the models
+MISSION_COLUMNS = tuple(MissionModel.model_fields)
+TARGET_COLUMNS = tuple(TargetModel.model_fields)
+NOTE_COLUMNS = tuple(NoteModel.model_fields)
+TARGET_ROW_COLUMNS = tuple(Target.model_fields)
+NOTE_ROW_COLUMNS = tuple(Note.model_fields)
+
+def read_spycat(session: Session, spycat_id: int) -> dict:
+    """Read a spy cat by ID together with its missions with one joined query."""
+    rows = session.execute(
+        select(*_columns(SpyCat, SPYCAT_FIELDS), *_columns(Mission, MISSION_COLUMNS))
+        .outerjoin(Mission, Mission.cat_id == SpyCat.id)
+        .where(SpyCat.id == spycat_id)
+        .order_by(Mission.id)
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Spy Cat not found")
+
+    return {
+        **_row_part(rows[0], 0, SPYCAT_FIELDS),
+        "missions": _children(rows, len(SPYCAT_FIELDS), MISSION_COLUMNS)
+    }
+
+# Sort keys and sparse fieldsets accepted by the list endpoints
+SPYCAT_SORT_KEYS = {
+    "id": SpyCat.id,
+    "name": SpyCat.name,
+    "salary": SpyCat.salary,
+    "years_of_experience": SpyCat.years_of_experience,
+}
+SPYCAT_FIELDS = ("id", "name", "years_of_experience", "breed", "salary")
+# Mission sort keys; cat_id pages walk ix_mission_cat_id_is_complete, and so do
+# is_complete pages filtered by cat_id
+MISSION_SORT_KEYS = {
+    "id": Mission.id,
+    "cat_id": Mission.cat_id,
+    "is_complete": Mission.is_complete,
+}
+MISSION_FIELDS = ("id", "cat_id", "is_complete", "cat")
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> Optional[list[str]]:
+    """Parse a comma-separated fields= parameter, always including the id."""
+    if not fields:
+        return None
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    return ["id", *(field for field in allowed if field in requested and field != "id")]
+
+def _prefix_range(column, prefix: str) -> list:
+    """Express a name prefix as a range, which SQLite can answer from the column's index."""
+    conditions = [column >= prefix]
+    if ord(prefix[-1]) < 0x10FFFF:
+        conditions.append(column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    return conditions
+
+def _filtered_count(session: Session, model: type, conditions: list) -> int:
+    return session.exec(select(func.count()).select_from(model).where(*conditions)).one()
+
+def _keyset_after(sort_column, id_column, value: Any, last_id: int):
+    """Condition selecting the rows after (value, last_id) in (sort_column, id) order.
+
+    SQLite sorts NULLs first, so after a NULL value come the remaining NULL rows
+    and then every non-NULL one; a tuple comparison would skip them all.
+    """
+    if value is None:
+        return or_(sort_column.is_not(None), and_(sort_column.is_(None), id_column > last_id))
+    return tuple_(sort_column, id_column) > (value, last_id)
+
+def read_spycats(
+    session: Session,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+    include_count: bool = True,
+    allow_estimate: bool = False,
+    breed: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    min_salary: Optional[float] = None,
+    max_salary: Optional[float] = None,
+    fields: Optional[list[str]] = None
+) -> dict:
+    """Read spy cats matching the filters with offset or keyset (cursor) pagination.
+
+    Only the columns of the requested fields (all by default) are selected, and
+    the spy cats are returned as dicts of those fields.
+    """
+    if cursor and skip > 0:
+        raise HTTPException(status_code=400, detail="Use either skip or cursor, not both")
+    if order_by not in SPYCAT_SORT_KEYS:
+        raise HTTPException(status_code=400, detail="Invalid sort key")
+
+    conditions = []
+    if breed:
+        conditions.append(SpyCat.breed == breed)
+    if name_prefix:
+        conditions.extend(_prefix_range(SpyCat.name, name_prefix))
+    if min_salary is not None:
+        conditions.append(SpyCat.salary >= min_salary)
+    if max_salary is not None:
+        conditions.append(SpyCat.salary <= max_salary)
+
+    sort_column = SPYCAT_SORT_KEYS[order_by]
+    fields = fields or SPYCAT_FIELDS
+    # The sort key and id are needed for the next cursor even if they were not requested
+    statement = select(*_columns(SpyCat, dict.fromkeys([*fields, order_by, "id"]))).where(*conditions)
+
+    if order_by == "id":
+        statement = statement.order_by(SpyCat.id)
+        if cursor:
+            _, last_id = decode_cursor(cursor, order_by)
+            statement = statement.where(SpyCat.id > last_id)
+    else:
+        statement = statement.order_by(sort_column, SpyCat.id)
+        if cursor:
+            value, last_id = decode_cursor(cursor, order_by)
+            statement = statement.where(_keyset_after(sort_column, SpyCat.id, value, last_id))
+
+    if skip > 0:
+        statement = statement.offset(skip)
+    if limit > 0:
+        statement = statement.limit(limit)
+
+    spycats = session.execute(statement).all()
+
+    all_count, all_count_exact = None, False
+    if include_count and conditions:
+        all_count, all_count_exact = _filtered_count(session, SpyCat, conditions), True
+    elif include_count:
+        all_count, all_count_exact = row_counts.get(session, SpyCat, allow_estimate)
+
+    next_cursor = None
+    if limit > 0 and len(spycats) == limit:
+        last = spycats[-1]
+        next_cursor = encode_cursor(order_by, getattr(last, order_by), last.id)
+
+    return {
+        "spycats": [{field: getattr(row, field) for field in fields} for row in spycats],
+        "all_count": all_count,
+        "all_count_exact": all_count_exact,
+        "next_cursor": next_cursor
+    }
+
+def bulk_create_spycats(
+    session: Session,
+    spycats: list[SpyCatModel],
+    errors: list[dict],
+    atomic: bool = False
+) -> dict:
+    """Create many spy cats in one transaction, skipping the invalid ones.
+
+    errors holds the items that already failed validation (e.g. an unknown breed).
+    """
+    failed = {error["index"] for error in errors}
+    rows = []
+
+    for i, spycat in enumerate(spycats):
+        if i in failed:
+            continue
+        if not spycat_validate(spycat):
+            errors.append({"index": i, "detail": "Invalid SpyCat data"})
+            continue
+        rows.append(spycat.model_dump(exclude={"id"}))
+
+    errors = _check_bulk_errors(errors, atomic)
+
+    created = _bulk_insert(session, SpyCat, rows)
+    session.commit()
+    row_counts.adjust(SpyCat, len(created))
+
+    return {
+        "created": created,
+        "errors": errors
+    }
+
+def update_spycat(
+    session: Session, spycat_id: int, spycat: SpyCatModelPatch, if_match: Optional[str] = None
+) -> dict:
+    """Update the given fields of a spy cat by ID."""
+    check_if_match(session, "spycat", spycat_id, if_match)
+
+    rows = _update_returning(session, SpyCat, spycat.model_dump(exclude_unset=True), SpyCat.id == spycat_id)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Spy Cat not found")
+
+    session.commit()
+    response_cache.invalidate(("spycat", spycat_id))
+
+    return rows[0]
+
+def delete_spycat(session: Session, spycat_id: int, if_match: Optional[str] = None) -> dict:
+    """Delete a spy cat by ID, unassigning its missions."""
+    check_if_match(session, "spycat", spycat_id, if_match)
+
+    # Older databases have no ON DELETE action on mission.cat_id
+    session.execute(update(Mission.__table__).where(Mission.cat_id == spycat_id).values(cat_id=None))
+    spycat = _delete_returning(session, SpyCat, SpyCat.id == spycat_id)
+    if spycat is None:
+        raise HTTPException(status_code=404, detail="Spy Cat not found")
+
+    session.commit()
+    response_cache.invalidate(("spycat", spycat_id))
+    row_counts.adjust(SpyCat, -1)
+
+    return spycat
+
+
+# Mission operations
+def get_mission(session: Session, mission_id: int, options: Sequence[ORMOption] = ()) -> Mission:
+    """Get a mission by ID with the given loader options or raise 404."""
+    mission = session.get(Mission, mission_id, options=options)
+    if not mission:
+        raise HTTPException(status_code=404, detail="Mission not found")
+
+    return mission
+
+def create_mission(session: Session, mission: MissionModelCreate) -> Mission:
+    """Create a new mission with its targets."""
+    if mission.cat_id:
+        cat = session.get(SpyCat, mission.cat_id)
+        if not cat:
+            raise HTTPException(status_code=404, detail="SpyCat not found")
+
+    mission_data = {
+        "cat_id": mission.cat_id,
+        "is_complete": mission.is_complete
+    }
+
+    db_mission = Mission(**mission_data)
+
+    if mission.targets:
+        for i, target in enumerate(mission.targets):
+            target_data = {
+                "name": target.name,
+                "country": target.country,
+                "is_complete": target.is_complete
+            }
+
+            db_target = Target(**target_data)
+
+            if not target_validate(target):
+                raise HTTPException(status_code=400, detail=f"Invalid Target #{i + 1} data")
+
+            db_mission.targets.append(db_target)
+
+    session.add(db_mission)
+    session.commit()
+    response_cache.invalidate(("spycat", mission.cat_id))
+    row_counts.adjust(Mission, 1)
+
+    return _persisted(session, db_mission)
+
+def bulk_create_missions(session: Session, missions: list[MissionModelCreate], atomic: bool = False) -> dict:
+    """Create many missions with their targets in one transaction, skipping the invalid ones."""
+    cat_ids = {mission.cat_id for mission in missions if mission.cat_id}
+    existing_cat_ids = set(session.exec(select(SpyCat.id).where(SpyCat.id.in_(cat_ids))).all()) if cat_ids else set()
+
+    errors = []
+    valid = []
+
+    for i, mission in enumerate(missions):
+        if mission.cat_id and mission.cat_id not in existing_cat_ids:
+            errors.append({"index": i, "detail": "SpyCat not found"})
+            continue
+
+        invalid_target = next(
+            (j for j, target in enumerate(mission.targets or []) if not target_validate(target)),
+            None
+        )
+        if invalid_target is not None:
+            errors.append({"index": i, "detail": f"Invalid Target #{invalid_target + 1} data"})
+            continue
+
+        valid.append(mission)
+
+    errors = _check_bulk_errors(errors, atomic)
+
+    created = _bulk_insert(session, Mission, [
+        {"cat_id": mission.cat_id, "is_complete": mission.is_complete}
+        for mission in valid
+    ])
+
+    target_rows = [
+        {
+            "mission_id": db_mission["id"],
+            "name": target.name,
+            "country": target.country,
+            "is_complete": target.is_complete
+        }
+        for mission, db_mission in zip(valid, created)
+        for target in mission.targets or []
+    ]
+    targets = _bulk_insert(session, Target, target_rows)
+
+    session.commit()
+    response_cache.invalidate(*[("spycat", db_mission["cat_id"]) for db_mission in created])
+    row_counts.adjust(Mission, len(created))
+
+    targets_by_mission = {}
+    for target in targets:
+        targets_by_mission.setdefault(target["mission_id"], []).append(target)
+
+    return {
+        "created": [
+            {**db_mission, "targets": targets_by_mission.get(db_mission["id"], [])}
+            for db_mission in created
+        ],
+        "errors": errors
+    }
+
+def read_mission(session: Session, mission_id: int) -> dict:
+    """Read a mission by ID together with its cat and targets with one joined query."""
+    rows = session.execute(
+        select(
+            *_columns(Mission, MISSION_COLUMNS),
+            *_columns(SpyCat, SPYCAT_FIELDS),
+            *_columns(Target, TARGET_COLUMNS)
+        )
+        .outerjoin(SpyCat, Mission.cat_id == SpyCat.id)
+        .outerjoin(Target, Target.mission_id == Mission.id)
+        .where(Mission.id == mission_id)
+        .order_by(Target.id)
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Mission not found")
+
+    cat_start = len(MISSION_COLUMNS)
+    target_start = cat_start + len(SPYCAT_FIELDS)
+    return {
+        **_row_part(rows[0], 0, MISSION_COLUMNS),
+        "targets": _children(rows, target_start, TARGET_COLUMNS),
+        "cat": _row_part(rows[0], cat_start, SPYCAT_FIELDS)
+    }
+
+def read_missions(
+    session: Session,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    order_by: str = "id",
+    include_count: bool = True,
+    allow_estimate: bool = False,
+    is_complete: Optional[bool] = None,
+    cat_id: Optional[int] = None,
+    unassigned: Optional[bool] = None,
+    fields: Optional[list[str]] = None
+) -> dict:
+    """Read missions matching the filters with offset or keyset (cursor) pagination.
+
+    Only the columns of the requested fields (all by default) are selected, the
+    cat through an outer join, and the missions are returned as dicts.
+    """
+    if cursor and skip > 0:
+        raise HTTPException(status_code=400, detail="Use either skip or cursor, not both")
+    if order_by not in MISSION_SORT_KEYS:
+        raise HTTPException(status_code=400, detail="Invalid sort key")
+
+    conditions = []
+    if cat_id is not None:
+        conditions.append(Mission.cat_id == cat_id)
+    if unassigned is not None:
+        conditions.append(Mission.cat_id.is_(None) if unassigned else Mission.cat_id.is_not(None))
+    if is_complete is not None:
+        conditions.append(Mission.is_complete == is_complete)
+
+    with_cat = not fields or "cat" in fields
+    # The sort key and id are needed for the next cursor even if they were not requested
+    mission_fields = list(dict.fromkeys([*(field for field in fields or MISSION_COLUMNS if field != "cat"), order_by, "id"]))
+
+    statement = select(*_columns(Mission, mission_fields))
+    if with_cat:
+        statement = statement.add_columns(*_columns(SpyCat, SPYCAT_FIELDS)).outerjoin(SpyCat, Mission.cat_id == SpyCat.id)
+    statement = statement.where(*conditions)
+
+    sort_column = MISSION_SORT_KEYS[order_by]
+    if order_by == "id":
+        statement = statement.order_by(Mission.id)
+        if cursor:
+            _, last_id = decode_cursor(cursor, order_by)
+            statement = statement.where(Mission.id > last_id)
+    else:
+        statement = statement.order_by(sort_column, Mission.id)
+        if cursor:
+            value, last_id = decode_cursor(cursor, order_by)
+            statement = statement.where(_keyset_after(sort_column, Mission.id, value, last_id))
+
+    if skip > 0:
+        statement = statement.offset(skip)
+    if limit > 0:
+        statement = statement.limit(limit)
+
+    rows = session.execute(statement).all()
+
+    all_count, all_count_exact = None, False
+    if include_count and conditions:
+        all_count, all_count_exact = _filtered_count(session, Mission, conditions), True
+    elif include_count:
+        all_count, all_count_exact = row_counts.get(session, Mission, allow_estimate)
+
+    next_cursor = None
+    if limit > 0 and len(rows) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor(order_by, getattr(last, order_by), last.id)
+
+    missions = []
+    for row in rows:
+        values = dict(zip(mission_fields, row))
+        cat = _row_part(row, len(mission_fields), SPYCAT_FIELDS) if with_cat else None
+        if fields:
+            missions.append({field: cat if field == "cat" else values[field] for field in fields})
+        else:
+            # Field order of MissionModelRead; list pages do not embed the targets
+            missions.append({**values, "targets": None, "cat": cat})
+
+    return {
+        "missions": missions,
+        "all_count": all_count,
+        "all_count_exact": all_count_exact,
+        "next_cursor": next_cursor
+    }
+
+def update_mission(
+    session: Session, mission_id: int, mission: MissionModelPatch, if_match: Optional[str] = None
+) -> dict:
+    """Update the given fields of a mission by ID."""
+    check_if_match(session, "mission", mission_id, if_match)
+
+    if not mission_patch_validate(mission):
+        get_mission(session, mission_id)
+        raise HTTPException(status_code=400, detail="Invalid Mission data")
+
+    try:
+        rows = _update_returning(session, Mission, mission.model_dump(exclude_unset=True), Mission.id == mission_id)
+    except IntegrityError:
+        # Foreign keys are enforced, so assigning an unknown cat fails the UPDATE
+        session.rollback()
+        raise HTTPException(status_code=404, detail="Spy Cat not found")
+
+    if not rows:
+        raise HTTPException(status_code=404, detail="Mission not found")
+
+    session.commit()
+    response_cache.invalidate(("mission", mission_id), ("spycat", rows[0]["cat_id"]))
+
+    return rows[0]
+
+def delete_mission(session: Session, mission_id: int, if_match: Optional[str] = None) -> dict:
+    """Delete an unassigned mission by ID together with its targets and notes."""
+    check_if_match(session, "mission", mission_id, if_match)
+
+    mission = _delete_returning(session, Mission, Mission.id == mission_id, Mission.cat_id.is_(None))
+    if mission is None:
+        get_mission(session, mission_id)
+        raise HTTPException(status_code=400, detail="Cannot delete mission with assigned SpyCat")
+
+    session.commit()
+    response_cache.invalidate(("mission", mission_id))
+    row_counts.adjust(Mission, -1)
+
+    return mission
+
+def delete_missions(session: Session, is_complete: bool) -> dict:
+    """Delete every unassigned mission with the given completion status in one statement."""
+    mission_ids = session.execute(
+        delete(Mission.__table__)
+        .where(Mission.cat_id.is_(None), Mission.is_complete == is_complete)
+        .returning(Mission.__table__.c.id)
+    ).scalars().all()
+    session.commit()
+
+    response_cache.invalidate(*(("mission", mission_id) for mission_id in mission_ids))
+    row_counts.adjust(Mission, -len(mission_ids))
+
+    return {"deleted": len(mission_ids)}
+
+
+# Target operations
+def get_target(session: Session, target_id: int, options: Sequence[ORMOption] = ()) -> Target:
+    """Get a target by ID with the given loader options or raise 404."""
+    target = session.get(Target, target_id, options=options)
+    if not target:
+        raise HTTPException(status_code=404, detail="Target not found")
+
+    return target
+
+def create_target(session: Session, mission_id: int, target: TargetModelCreate) -> Target:
+    """Create a new target with its notes for a mission."""
+    mission = get_mission(session, mission_id)
+
+    db_target = Target(name=target.name, country=target.country, is_complete=target.is_complete)
+
+    if not target_validate(db_target):
+        raise HTTPException(status_code=400, detail="Invalid Target data")
+
+    # Set the parent side so the mission's existing targets are not loaded
+    db_target.mission = mission
+
+    if target.notes:
+        for i, note in enumerate(target.notes):
+            note_data = {
+                "content": note.content
+            }
+            db_note = Note(**note_data)
+
+            if not note_validate(db_note):
+                raise HTTPException(status_code=400, detail=f"Invalid Note #{i + 1} data")
+
+            db_target.notes.append(db_note)
+
+    session.add(db_target)
+    session.commit()
+    response_cache.invalidate(("mission", mission_id))
+
+    return _persisted(session, db_target)
+
+def bulk_create_targets(
+    session: Session,
+    mission_id: int,
+    targets: list[TargetModelCreate],
+    atomic: bool = False
+) -> dict:
+    """Create many targets with their notes for a mission in one transaction, skipping the invalid ones."""
+    get_mission(session, mission_id)
+
+    errors = []
+    valid = []
+
+    for i, target in enumerate(targets):
+        if not target_validate(target):
+            errors.append({"index": i, "detail": "Invalid Target data"})
+            continue
+
+        invalid_note = next(
+            (j for j, note in enumerate(target.notes or []) if not note_validate(note)),
+            None
+        )
+        if invalid_note is not None:
+            errors.append({"index": i, "detail": f"Invalid Note #{invalid_note + 1} data"})
+            continue
+
+        valid.append(target)
+
+    errors = _check_bulk_errors(errors, atomic)
+
+    created = _bulk_insert(session, Target, [
+        {
+            "mission_id": mission_id,
+            "name": target.name,
+            "country": target.country,
+            "is_complete": target.is_complete
+        }
+        for target in valid
+    ])
+
+    notes = _bulk_insert(session, Note, [
+        {"target_id": db_target["id"], "content": note.content}
+        for target, db_target in zip(valid, created)
+        for note in target.notes or []
+    ])
+
+    session.commit()
+    response_cache.invalidate(("mission", mission_id))
+
+    notes_by_target = {}
+    for note in notes:
+        notes_by_target.setdefault(note["target_id"], []).append(note)
+
+    return {
+        "created": [
+            {**db_target, "notes": notes_by_target.get(db_target["id"], [])}
+            for db_target in created
+        ],
+        "errors": errors
+    }
+
+def read_targets(session: Session, mission_id: int) -> list[dict]:
+    """Read all targets for a mission, checking that it exists in the same query."""
+    rows = session.execute(
+        select(Mission.id, *_columns(Target, TARGET_ROW_COLUMNS))
+        .outerjoin(Target, Target.mission_id == Mission.id)
+        .where(Mission.id == mission_id)
+        .order_by(Target.id)
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Mission not found")
+
+    return _children(rows, 1, TARGET_ROW_COLUMNS)
+
+def read_target(session: Session, target_id: int) -> dict:
+    """Read a target by ID together with its mission and notes with one joined query."""
+    rows = session.execute(
+        select(
+            *_columns(Target, TARGET_COLUMNS),
+            *_columns(Mission, MISSION_COLUMNS),
+            *_columns(Note, NOTE_COLUMNS)
+        )
+        .outerjoin(Mission, Target.mission_id == Mission.id)
+        .outerjoin(Note, Note.target_id == Target.id)
+        .where(Target.id == target_id)
+        .order_by(Note.id)
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Target not found")
+
+    mission_start = len(TARGET_COLUMNS)
+    note_start = mission_start + len(MISSION_COLUMNS)
+    return {
+        **_row_part(rows[0], 0, TARGET_COLUMNS),
+        "notes": _children(rows, note_start, NOTE_COLUMNS),
+        "mission": _row_part(rows[0], mission_start, MISSION_COLUMNS)
+    }
+
+def update_target(
+    session: Session, target_id: int, target: TargetModelPatch, if_match: Optional[str] = None
+) -> dict:
+    """Update the given fields of a target by ID."""
+    check_if_match(session, "target", target_id, if_match)
+
+    if not target_patch_validate(target):
+        # A missing target is reported first; valid updates find out from the UPDATE
+        get_target(session, target_id)
+        raise HTTPException(status_code=400, detail="Invalid Target data")
+
+    rows = _update_returning(session, Target, target.model_dump(exclude_unset=True), Target.id == target_id)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Target not found")
+
+    session.commit()
+    response_cache.invalidate(("target", target_id))
+
+    return rows[0]
+
+def bulk_update_targets(session: Session, targets: list[TargetModelBulkPatch], atomic: bool = False) -> dict:
+    """Update many targets in one transaction, skipping the invalid and missing ones.
+
+    Targets receiving the same changes are updated together with one
+    UPDATE ... WHERE id IN (...) RETURNING, so marking any number of targets
+    complete is a single statement.
+    """
+    errors = []
+    groups: dict[tuple, list[tuple[int, int]]] = {}
+    seen = set()
+
+    for i, target in enumerate(targets):
+        if target.id in seen:
+            errors.append({"index": i, "detail": "Duplicate Target ID"})
+            continue
+        seen.add(target.id)
+
+        if not target_patch_validate(target):
+            errors.append({"index": i, "detail": "Invalid Target data"})
+            continue
+
+        changes = tuple(sorted(target.model_dump(exclude_unset=True, exclude={"id"}).items()))
+        groups.setdefault(changes, []).append((i, target.id))
+
+    errors = _check_bulk_errors(errors, atomic)
+
+    updated = {}
+    for changes, items in groups.items():
+        target_ids = [target_id for _, target_id in items]
+        for row in _update_returning(session, Target, dict(changes), Target.id.in_(target_ids)):
+            updated[row["id"]] = row
+
+    missing = [
+        {"index": i, "detail": "Target not found"}
+        for items in groups.values()
+        for i, target_id in items
+        if target_id not in updated
+    ]
+    if missing and atomic:
+        session.rollback()
+    errors = _check_bulk_errors(errors + missing, atomic)
+
+    session.commit()
+    response_cache.invalidate(*(("target", target_id) for target_id in updated))
+
+    return {
+        "updated": [
+            updated[target_id]
+            for _, target_id in sorted(item for items in groups.values() for item in items)
+            if target_id in updated
+        ],
+        "errors": errors
+    }
+
+def delete_target(session: Session, target_id: int, if_match: Optional[str] = None) -> dict:
+    """Delete a target by ID together with its notes."""
+    check_if_match(session, "target", target_id, if_match)
+
+    target = _delete_returning(session, Target, Target.id == target_id)
+    if target is None:
+        raise HTTPException(status_code=404, detail="Target not found")
+
+    session.commit()
+    response_cache.invalidate(("target", target_id))
+
+    return target
+
+
+# Note operations
+def get_note(session: Session, note_id: int, options: Sequence[ORMOption] = ()) -> Note:
+    """Get a note by ID with the given loader options or raise 404."""
+    note = session.get(Note, note_id, options=options)
+    if not note:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    return note
+
+# SQLite caps a compound SELECT at 500 terms
+_NOTE_INSERT_CHUNK = 500
+
+def _open_target(target_id):
+    """EXISTS predicate for a target whose target and mission are both open.
+
+    Used inside the note writes, so a target or mission completed concurrently
+    cannot slip in between the check and the write; target_id may be a value
+    or a column of the statement it is correlated with.
+    """
+    return exists().where(
+        Target.id == target_id,
+        Mission.id == Target.mission_id,
+        ~or_(Target.is_complete, Mission.is_complete)
+    )
+
+def _check_note_target(target: Target):
+    """Reject adding notes to a target whose target or mission is complete."""
+    if target.mission.is_complete:
+        raise HTTPException(status_code=400, detail="Cannot add note to a completed mission")
+
+    if target.is_complete:
+        raise HTTPException(status_code=400, detail="Cannot add note to a completed target")
+
+def _insert_notes(session: Session, target_id: int, contents: list[str]) -> list[dict]:
+    """Insert notes for an open target with INSERT ... SELECT ... RETURNING and return them in input order.
+
+    Nothing is inserted unless the target and its mission are open; the
+    target is only loaded to find out why nothing was.
+    """
+    if not contents:
+        return []
+
+    table = Note.__table__
+    created = []
+    for start in range(0, len(contents), _NOTE_INSERT_CHUNK):
+        new_notes = union_all(*(
+            select(literal(position).label("position"), literal(content).label("content"))
+            for position, content in enumerate(contents[start:start + _NOTE_INSERT_CHUNK], start)
+        )).subquery("new_note")
+        rows = select(literal(target_id), new_notes.c.content).where(_open_target(target_id)).order_by(new_notes.c.position)
+        statement = insert(table).from_select(["target_id", "content"], rows).returning(*table.columns)
+        created += [dict(row) for row in session.execute(statement).mappings()]
+
+    if not created:
+        _check_note_target(get_target(session, target_id, queries.TARGET_MISSION))
+        raise HTTPException(status_code=400, detail="Cannot add note to a completed target")
+
+    # SQLite hands out increasing rowids in SELECT order, so sorting by id restores the input order
+    return sorted(created, key=lambda row: row["id"])
+
+def create_note(session: Session, target_id: int, note: NoteModel) -> dict:
+    """Create a new note for a target while the target and its mission are open."""
+    if not note.content:
+        raise HTTPException(status_code=400, detail="Note content is required")
+
+    if not note_validate(Note(content=note.content)):
+        raise HTTPException(status_code=400, detail="Invalid Note data")
+
+    created = _insert_notes(session, target_id, [note.content])
+    session.commit()
+    response_cache.invalidate(("target", target_id))
+
+    return created[0]
+
+def bulk_create_notes(session: Session, target_id: int, notes: list[NoteModel], atomic: bool = False) -> dict:
+    """Create many notes for a target in one transaction, skipping the invalid ones."""
+    errors = []
+    contents = []
+
+    for i, note in enumerate(notes):
+        if not note_validate(note):
+            errors.append({"index": i, "detail": "Invalid Note data"})
+            continue
+        contents.append(note.content)
+
+    if not contents or (errors and atomic):
+        # A missing or completed target is reported before the items
+        _check_note_target(get_target(session, target_id, queries.TARGET_MISSION))
+
+    errors = _check_bulk_errors(errors, atomic)
+
+    created = _insert_notes(session, target_id, contents)
+    session.commit()
+    response_cache.invalidate(("target", target_id))
+
+    return {
+        "created": created,
+        "errors": errors
+    }
+
+def read_notes(session: Session, target_id: int) -> list[dict]:
+    """Read all notes for a target, checking that it exists in the same query."""
+    rows = session.execute(
+        select(Target.id, *_columns(Note, NOTE_ROW_COLUMNS))
+        .outerjoin(Note, Note.target_id == Target.id)
+        .where(Target.id == target_id)
+        .order_by(Note.id)
+    ).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Target not found")
+
+    return _children(rows, 1, NOTE_ROW_COLUMNS)
+
+def read_note(session: Session, note_id: int) -> dict:
+    """Read a note by ID together with its target and mission with one joined query."""
+    row = session.execute(
+        select(
+            *_columns(Note, NOTE_COLUMNS),
+            *_columns(Target, TARGET_COLUMNS),
+            *_columns(Mission, MISSION_COLUMNS)
+        )
+        .outerjoin(Target, Note.target_id == Target.id)
+        .outerjoin(Mission, Target.mission_id == Mission.id)
+        .where(Note.id == note_id)
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    target_start = len(NOTE_COLUMNS)
+    return {
+        **_row_part(row, 0, NOTE_COLUMNS),
+        "target": _row_part(row, target_start, TARGET_COLUMNS),
+        "mission": _row_part(row, target_start + len(TARGET_COLUMNS), MISSION_COLUMNS)
+    }
+
+def _check_note_open(note: Note):
+    """Reject changes to a note whose target or mission is complete."""
+    if note.target.is_complete:
+        raise HTTPException(status_code=400, detail="Cannot update note for a completed target")
+
+    if note.target.mission.is_complete:
+        raise HTTPException(status_code=400, detail="Cannot update note for a completed mission")
+
+def update_note(session: Session, note_id: int, note: NoteModelPatch, if_match: Optional[str] = None) -> dict:
+    """Update the given fields of a note by ID while its target and mission are open."""
+    check_if_match(session, "note", note_id, if_match)
+
+    if not note_patch_validate(note):
+        # A missing note or a completed target or mission is reported first
+        _check_note_open(get_note(session, note_id, queries.NOTE_DETAIL))
+        raise HTTPException(status_code=400, detail="Note content is required")
+
+    # The completion checks are part of the UPDATE
+    rows = _update_returning(
+        session, Note, note.model_dump(exclude_unset=True), Note.id == note_id, _open_target(Note.target_id)
+    )
+
+    if not rows:
+        # Only find out why the update matched nothing
+        _check_note_open(get_note(session, note_id, queries.NOTE_DETAIL))
+        raise HTTPException(status_code=400, detail="Cannot update note for a completed mission")
+
+    session.commit()
+    response_cache.invalidate(("note", note_id))
+
+    return rows[0]
+
+def delete_note(session: Session, note_id: int, if_match: Optional[str] = None) -> dict:
+    """Delete a note by ID."""
+    check_if_match(session, "note", note_id, if_match)
+
+    note = _delete_returning(session, Note, Note.id == note_id)
+    if note is None:
+        raise HTTPException(status_code=404, detail="Note not found")
+
+    session.commit()
+    response_cache.invalidate(("note", note_id))
+
+    return note
+
+
+# Statistics
+def _completion_columns() -> list:
+    """Aggregates over mission LEFT JOIN target LEFT JOIN note rows."""
+    return [
+        func.count(Mission.id.distinct()).label("missions"),
+        func.count(case((Mission.is_complete, Mission.id)).distinct()).label("missions_complete"),
+        func.count(Target.id.distinct()).label("targets"),
+        func.count(case((Target.is_complete, Target.id)).distinct()).label("targets_complete"),
+        func.count(Note.id).label("notes"),
+    ]
+
+def _completion_stats(row) -> dict:
+    return {
+        "missions": row.missions,
+        "missions_complete": row.missions_complete,
+        "targets": row.targets,
+        "targets_complete": row.targets_complete,
+        "notes": row.notes,
+        "notes_per_target": row.notes / row.targets if row.targets else 0.0,
+    }
+
+def read_stats(session: Session) -> dict:
+    """Count missions, targets and notes per spy cat and overall with two GROUP BY queries."""
+    per_cat = session.exec(
+        select(SpyCat.id, SpyCat.name, *_completion_columns())
+        .select_from(SpyCat)
+        .outerjoin(Mission, Mission.cat_id == SpyCat.id)
+        .outerjoin(Target, Target.mission_id == Mission.id)
+        .outerjoin(Note, Note.target_id == Target.id)
+        .group_by(SpyCat.id)
+        .order_by(SpyCat.id)
+    ).all()
+
+    overall = session.exec(
+        select(*_completion_columns())
+        .select_from(Mission)
+        .outerjoin(Target, Target.mission_id == Mission.id)
+        .outerjoin(Note, Note.target_id == Target.id)
+    ).one()
+
+    cats = [SpyCatStats(cat_id=row.id, name=row.name, **_completion_stats(row)) for row in per_cat]
+
+    # Missions without a cat are the difference between the overall and the per-cat counts
+    unassigned = {
+        key: value - sum(getattr(cat, key) for cat in cats)
+        for key, value in _completion_stats(overall).items()
+        if key != "notes_per_target"
+    }
+    unassigned["notes_per_target"] = unassigned["notes"] / unassigned["targets"] if unassigned["targets"] else 0.0
+
+    return {
+        "overall": CompletionStats(**_completion_stats(overall)),
+        "unassigned": CompletionStats(**unassigned),
+        "cats": cats
+    }
+
+
+# Full-text search
+SEARCH_QUERIES = {
+    "note": (
+        "SELECT 'note' AS type, rowid AS id, bm25(note_fts) AS rank, "
+        "snippet(note_fts, 0, :open, :close, '…', 12) AS snippet "
+        "FROM note_fts WHERE note_fts MATCH :query"
+    ),
+    "target": (
+        "SELECT 'target' AS type, rowid AS id, bm25(target_fts, 2.0, 1.0) AS rank, "
+        "snippet(target_fts, -1, :open, :close, '…', 12) AS snippet "
+        "FROM target_fts WHERE target_fts MATCH :query"
+    ),
+}
+
+_SEARCH_TERM = re.compile(r"\w+\*?")
+
+# FTS5 wraps matches in these control characters, which survive HTML escaping
+# and are then replaced with the highlight markup
+_MATCH_OPEN, _MATCH_CLOSE = "\x02", "\x03"
+
+def highlight_snippet(snippet: str, highlight: tuple[str, str]) -> str:
+    """HTML-escape the stored text of a snippet and wrap its matches in the highlight markup."""
+    return html.escape(snippet).replace(_MATCH_OPEN, highlight[0]).replace(_MATCH_CLOSE, highlight[1])
+
+def fts_query(q: str) -> str:
+    """Turn free text into an FTS5 query matching all of its words.
+
+    Each word is quoted so FTS5 operators in the input are matched literally;
+    a trailing * keeps its meaning as a prefix search.
+    """
+    terms = []
+    for term in _SEARCH_TERM.findall(q):
+        if term.endswith("*"):
+            terms.append(f'"{term[:-1]}"*')
+        else:
+            terms.append(f'"{term}"')
+    return " ".join(terms)
+
+def search(
+    session: Session,
+    q: str,
+    types: Sequence[str] = ("note", "target"),
+    skip: int = 0,
+    limit: int = 10,
+    highlight: tuple[str, str] = ("<mark>", "</mark>")
+) -> dict:
+    """Search notes and targets through the FTS5 indexes, best bm25 matches first.
+
+    Snippets are HTML: the stored text is escaped, and matches are wrapped in
+    the highlight markup.
+    """
+    if session.get_bind().dialect.name != "sqlite":
+        raise HTTPException(status_code=501, detail="Search requires SQLite FTS5")
+
+    query = fts_query(q)
+    if not query:
+        raise HTTPException(status_code=400, detail="Search query has no words")
+
+    statement = text(
+        " UNION ALL ".join(SEARCH_QUERIES[t] for t in types)
+        + " ORDER BY rank, type, id LIMIT :limit OFFSET :skip"
+    )
+    rows = session.connection().execute(statement, {
+        "query": query, "open": _MATCH_OPEN, "close": _MATCH_CLOSE, "limit": limit, "skip": skip
+    }).mappings().all()
+
+    return {
+        "results": [{**row, "snippet": highlight_snippet(row["snippet"], highlight)} for row in rows],
+        "next_skip": skip + limit if len(rows) == limit else None
+    }
+
+
+# Conditional writes
+# Table model and detail read of each entity with an ETag; the ETag is that of
+# the encoded detail response
+_DETAIL_READS = {
+    "spycat": (SpyCat, read_spycat),
+    "mission": (Mission, read_mission),
+    "target": (Target, read_target),
+    "note": (Note, read_note),
+}
+
+def check_if_match(session: Session, entity: str, entity_id: int, if_match: Optional[str]):
+    """Reject a write with 412 if If-Match matches neither the entity's current ETag nor its compact one.
+
+    Runs in the write's own transaction with the row locked, so no other write
+    can land between the comparison and this one. A missing entity is a 404.
+    """
+    if if_match is None:
+        return
+
+    model, read = _DETAIL_READS[entity]
+    _lock_row(session, model, entity_id)
+    etag = make_etag(dumps(read(session, entity_id)))
+    if not any(etag_matches(if_match, candidate, weak=False) for candidate in (etag, variant_etag(etag, COMPACT))):
+        raise HTTPException(status_code=412, detail="Precondition Failed")
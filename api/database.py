@@ -1,13 +1,230 @@
+import re
+from typing import Any, Callable, Optional, TypeVar, Union
+from fastapi import Depends
 from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from . import config
+from .migrations import run_migrations, reset_migrations
+from .executor import DatabaseExecutor, executor_workers
+from .metrics import instrument_engine
 
-DATABASE_URL = "sqlite:///./sca.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, echo=False)
+T = TypeVar("T")
 
-def create_db_and_tables():
-    """Create the database and tables if they do not exist."""
-    SQLModel.metadata.create_all(engine)
+DATABASE_URL = config.DATABASE_URL
+ASYNC_DATABASE_URL = config.ASYNC_DATABASE_URL
+DATABASE_MODE = config.DATABASE_MODE
+
+if DATABASE_MODE not in ("sync", "async"):
+    raise ValueError(f"Unknown database mode: {DATABASE_MODE!r}")
+
+# Connection-time PRAGMAs for each SQLite profile
+SQLITE_PROFILES = {
+    "default": {},
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": "-65536",     # 64 MiB
+        "mmap_size": "268435456",   # 256 MiB
+        "temp_store": "MEMORY",
+        "busy_timeout": "5000",
+    },
+}
+
+# PRAGMAs every SQLite connection gets regardless of the profile; the schema
+# relies on ON DELETE CASCADE, which SQLite only honours with foreign_keys on
+SQLITE_REQUIRED_PRAGMAS = {"foreign_keys": "ON"}
+
+_PRAGMA_VALUE = re.compile(r"^-?[A-Za-z0-9_]+$")
+
+def sqlite_pragmas(profile: str = config.SQLITE_PROFILE, overrides: Optional[dict] = None) -> dict[str, str]:
+    """Get the PRAGMAs of a SQLite profile with the configured overrides applied."""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile: {profile!r}")
+
+    pragmas = {**SQLITE_PROFILES[profile], **(config.SQLITE_PRAGMA_OVERRIDES if overrides is None else overrides)}
+    for name, value in pragmas.items():
+        if not _PRAGMA_VALUE.match(str(value)):
+            raise ValueError(f"Invalid value for PRAGMA {name}: {value!r}")
+
+    return pragmas
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: dict[str, str]):
+    """Run the given PRAGMAs on every new connection of the engine."""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def create_db_engine(url: str, profile: str = config.SQLITE_PROFILE) -> Engine:
+    """Create an instrumented database engine, applying the SQLite profile to SQLite databases."""
+    if make_url(url).get_backend_name() != "sqlite":
+        db_engine = create_engine(url, echo=False)
+    else:
+        db_engine = create_engine(url, connect_args={"check_same_thread": False}, echo=False)
+        apply_sqlite_pragmas(db_engine, {**SQLITE_REQUIRED_PRAGMAS, **sqlite_pragmas(profile)})
+
+    instrument_engine(db_engine)
+    return db_engine
+
+def create_async_db_engine(url: str, profile: str = config.SQLITE_PROFILE, **kwargs: Any) -> AsyncEngine:
+    """Create an instrumented async database engine, applying the SQLite profile to SQLite databases."""
+    db_engine = create_async_engine(url, echo=False, **kwargs)
+    if make_url(url).get_backend_name() == "sqlite":
+        apply_sqlite_pragmas(db_engine.sync_engine, {**SQLITE_REQUIRED_PRAGMAS, **sqlite_pragmas(profile)})
+
+    instrument_engine(db_engine.sync_engine)
+    return db_engine
+
+def create_session_factory(
+    db_engine: Engine, expire_on_commit: bool = config.SESSION_EXPIRE_ON_COMMIT
+) -> sessionmaker[Session]:
+    """Create a factory of sessions bound to the engine.
+
+    Unless expire_on_commit is set, committed objects keep their loaded state,
+    so a write can return what it persisted without a refresh SELECT.
+    """
+    return sessionmaker(db_engine, class_=Session, expire_on_commit=expire_on_commit)
+
+def create_async_session_factory(
+    db_engine: AsyncEngine, expire_on_commit: bool = config.SESSION_EXPIRE_ON_COMMIT
+) -> async_sessionmaker[AsyncSession]:
+    """Create a factory of async sessions bound to the engine, see create_session_factory."""
+    return async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=expire_on_commit)
+
+engine = create_db_engine(DATABASE_URL)
+session_factory = create_session_factory(engine)
+
+# Blocking session work of the sync path runs here, sized below the connection pool
+db_executor = DatabaseExecutor(executor_workers(engine))
+
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+
+def get_async_engine() -> AsyncEngine:
+    """Get the async database engine, creating it on first use."""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_db_engine(ASYNC_DATABASE_URL)
+    return _async_engine
+
+def get_async_session_factory() -> async_sessionmaker[AsyncSession]:
+    """Get the factory of async sessions, creating it with the async engine on first use."""
+    global _async_session_factory
+    if _async_session_factory is None:
+        _async_session_factory = create_async_session_factory(get_async_engine())
+    return _async_session_factory
+
+async def dispose_async_engine():
+    """Close the connections of the async database engine."""
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_session_factory = None
+
+def create_db_and_tables(db_engine: Optional[Engine] = None):
+    """Create the database and tables if they do not exist and apply pending migrations."""
+    db_engine = db_engine or engine
+    SQLModel.metadata.create_all(db_engine)
+    run_migrations(db_engine)
+
+def drop_db_and_tables(db_engine: Optional[Engine] = None):
+    """Drop every table, including the ones created by migrations."""
+    db_engine = db_engine or engine
+    SQLModel.metadata.drop_all(db_engine)
+    reset_migrations(db_engine)
+
+def get_engine() -> Engine:
+    """Get the sync database engine for work that manages its own connection."""
+    return engine
 
 def get_session():
     """Get a database session."""
-    with Session(engine) as session:
+    with session_factory() as session:
+        yield session
+
+async def get_async_session():
+    """Get an async database session."""
+    async with get_async_session_factory()() as session:
         yield session
+
+def read_database_diagnostics(session: Session) -> dict:
+    """Describe the configured database and the PRAGMAs in effect on the session's connection."""
+    connection = session.connection()
+    url = make_url(ASYNC_DATABASE_URL if DATABASE_MODE == "async" else DATABASE_URL)
+
+    diagnostics = {
+        "url": url.render_as_string(hide_password=True),
+        "mode": DATABASE_MODE,
+        "profile": config.SQLITE_PROFILE,
+        "pragmas": {},
+        "effective": {},
+    }
+
+    if connection.dialect.name == "sqlite":
+        diagnostics["pragmas"] = sqlite_pragmas()
+        diagnostics["effective"] = {
+            name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in [*SQLITE_REQUIRED_PRAGMAS, *SQLITE_PROFILES["production"]]
+        }
+
+    return diagnostics
+
+class SessionRunner:
+    """Run data-access functions against a sync or async session.
+
+    Data-access functions take a synchronous session as their first argument.
+    With an AsyncSession they are executed through run_sync, so the database
+    I/O is awaited instead of blocking the event loop. With a sync session and
+    an executor they run on the executor's threads for the same reason.
+
+    A sync session is closed after each call, giving its connection back to
+    the pool, so a request waiting between two calls holds no connection
+    that the workers running other requests' calls could need.
+    """
+
+    def __init__(self, session: Union[Session, AsyncSession], executor: Optional[DatabaseExecutor] = None):
+        self.session = session
+        self.executor = executor
+
+    @property
+    def is_async(self) -> bool:
+        return isinstance(self.session, AsyncSession)
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run fn(session, *args, **kwargs) on the underlying session."""
+        if self.is_async:
+            return await self.session.run_sync(fn, *args, **kwargs)
+        if self.executor is not None:
+            return await self.executor.run(self._call, fn, args, kwargs)
+        return self._call(fn, args, kwargs)
+
+    def _call(self, fn: Callable[..., T], args: tuple, kwargs: dict) -> T:
+        # Closing rolls back whatever fn left uncommitted; the objects it
+        # returns keep their loaded state
+        try:
+            return fn(self.session, *args, **kwargs)
+        finally:
+            self.session.close()
+
+def get_sync_db(session: Session = Depends(get_session)) -> SessionRunner:
+    """Get a session runner backed by a sync session."""
+    return SessionRunner(session, db_executor if config.DB_THREADPOOL else None)
+
+def get_async_db(session: AsyncSession = Depends(get_async_session)) -> SessionRunner:
+    """Get a session runner backed by an async session."""
+    return SessionRunner(session)
+
+# The data-access path used by the endpoints, selected by SCA_DATABASE_MODE
+get_db = get_async_db if DATABASE_MODE == "async" else get_sync_db
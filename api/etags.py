@@ -0,0 +1,46 @@
+import hashlib
+from typing import Optional
+
+# Other representations of the same content get the content's ETag with a
+# suffix: compact responses, and bodies compressed by CompressionMiddleware
+# (one suffix per content coding)
+COMPACT = "compact"
+CODINGS = ("br", "gzip")
+
+def make_etag(payload: bytes) -> str:
+    """Build a strong ETag from an encoded response body."""
+    return '"' + hashlib.blake2b(payload, digest_size=16).hexdigest() + '"'
+
+def variant_etag(etag: str, variant: str) -> str:
+    """Derive the ETag of another representation of the same content, e.g. "…-compact"."""
+    return f'{etag[:-1]}-{variant}"'
+
+def strip_coding(etag: str) -> str:
+    """Remove the content-coding suffix CompressionMiddleware adds to an ETag, if any."""
+    for coding in CODINGS:
+        suffix = f'-{coding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """Check an If-None-Match (weak comparison) or If-Match (strong comparison) header against an ETag.
+
+    The header's ETags are compared without their content-coding suffix, since
+    the endpoints compare against the ETag of the uncompressed body.
+    """
+    if header is None:
+        return False
+
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            if not weak:
+                continue
+            candidate = candidate[2:]
+        if strip_coding(candidate) == etag:
+            return True
+
+    return False
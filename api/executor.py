@@ -0,0 +1,162 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, TypeVar
+from fastapi import HTTPException
+from sqlalchemy.engine import Engine
+from .metrics import db_executor_wait, db_executor_rejected
+from .profiling import active_profile
+from . import config
+
+T = TypeVar("T")
+
+_DONE = object()
+
+def engine_pool_capacity(engine: Engine) -> int:
+    """Get the number of connections the engine's pool can hand out at once."""
+    pool = engine.pool
+    size = getattr(pool, "size", None)
+    if not callable(size):
+        # SingletonThreadPool, StaticPool and NullPool have no fixed capacity
+        return config.DB_WORKERS_FALLBACK
+
+    return size() + max(getattr(pool, "_max_overflow", 0), 0)
+
+def executor_workers(engine: Engine, configured: int = config.DB_WORKERS) -> int:
+    """Get the number of database worker threads for an engine, strictly below its pool capacity.
+
+    One connection is left for those held between executor calls, such as an
+    export's cursor, so the workers never all wait on the pool. A configured
+    size above that is capped.
+    """
+    capacity = engine_pool_capacity(engine)
+    return max(min(configured or capacity, capacity - 1), 1)
+
+class DatabaseExecutor:
+    """Bounded thread pool for blocking database work.
+
+    Session work is handed to at most max_workers threads, which should stay
+    below the number of connections the engine can check out, with up to max_queue
+    calls waiting for a free thread. Calls beyond that are rejected with 503
+    and a Retry-After header instead of piling up behind a write storm, so the
+    event loop stays free for health checks and cached reads.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int = config.DB_QUEUE_SIZE,
+                 retry_after: int = config.DB_RETRY_AFTER):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._max_queue_depth = 0
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._pending - self._running
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sca-db")
+        return self._pool
+
+    def _reject(self):
+        self._rejected += 1
+        db_executor_rejected.inc()
+        raise HTTPException(
+            status_code=503,
+            detail="Database is busy, try again later",
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+    def _call(self, submitted_at: float, fn: Callable[..., T], args: tuple, kwargs: dict) -> T:
+        waited = time.perf_counter() - submitted_at
+        with self._lock:
+            self._running += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        db_executor_wait.observe(waited)
+
+        try:
+            capture = active_profile.get()
+            if capture is not None:
+                return capture.call(fn, *args, **kwargs)
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+                self._completed += 1
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run fn(*args, **kwargs) on the pool, or raise 503 if the queue is full."""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._reject()
+
+            self._pending += 1
+            self._submitted += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._pending - self._running)
+
+        # Run in a copy of the caller's context so per-request state follows the call
+        context = contextvars.copy_context()
+        future = self._get_pool().submit(context.run, self._call, time.perf_counter(), fn, args, kwargs)
+
+        # The call keeps its worker until it finishes, even if the request is cancelled
+        return await asyncio.wrap_future(future)
+
+    async def iterate(self, iterator: Iterator[T]) -> AsyncIterator[T]:
+        """Advance a blocking iterator on the pool, one item per call, and close it there when done.
+
+        Each item waits for a worker like any other call, so a streamed export
+        shares the limit on database threads instead of using another pool.
+        """
+        # A request cancelled mid-item leaves the item running; closing waits for it
+        lock = threading.Lock()
+
+        def advance():
+            with lock:
+                return next(iterator, _DONE)
+
+        def close():
+            with lock:
+                getattr(iterator, "close", lambda: None)()
+
+        try:
+            while (item := await self.run(advance)) is not _DONE:
+                yield item
+        finally:
+            # Closing is not refused with 503, since it gives the connection back
+            await asyncio.wrap_future(self._get_pool().submit(close))
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self._max_queue_depth,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "wait_avg": self._wait_total / started if started else 0.0,
+                "wait_max": self._wait_max,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker threads; a new pool is created on the next call."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
@@ -0,0 +1,62 @@
+import json
+import zlib
+from typing import Iterator, Optional
+from sqlalchemy import Select, select
+from sqlalchemy.engine import Engine
+from .models import SpyCat, Mission, Target, Note
+from . import config
+
+def export_statements(is_complete: Optional[bool] = None, cat_id: Optional[int] = None) -> list[tuple[str, Select]]:
+    """Build the per-entity SELECTs of an export, parents first."""
+    spycat, mission, target, note = SpyCat.__table__, Mission.__table__, Target.__table__, Note.__table__
+
+    spycats = select(spycat).order_by(spycat.c.id)
+    missions = select(mission).order_by(mission.c.id)
+
+    if cat_id is not None:
+        spycats = spycats.where(spycat.c.id == cat_id)
+        missions = missions.where(mission.c.cat_id == cat_id)
+    if is_complete is not None:
+        missions = missions.where(mission.c.is_complete == is_complete)
+
+    mission_ids = missions.with_only_columns(mission.c.id).order_by(None)
+    targets = select(target).where(target.c.mission_id.in_(mission_ids)).order_by(target.c.id)
+
+    target_ids = targets.with_only_columns(target.c.id).order_by(None)
+    notes = select(note).where(note.c.target_id.in_(target_ids)).order_by(note.c.id)
+
+    return [("spycat", spycats), ("mission", missions), ("target", targets), ("note", notes)]
+
+def export_ndjson(
+    db_engine: Engine,
+    is_complete: Optional[bool] = None,
+    cat_id: Optional[int] = None,
+    chunk_size: int = config.EXPORT_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """Stream the SpyCat/Mission/Target/Note graph as newline-delimited JSON.
+
+    Rows are read with a server-side cursor in chunks of chunk_size, so memory
+    use does not depend on the size of the database. Each line is one row
+    tagged with its type; parents are emitted before their children.
+    """
+    with db_engine.connect() as connection:
+        connection = connection.execution_options(stream_results=True, yield_per=chunk_size)
+
+        for entity, statement in export_statements(is_complete, cat_id):
+            result = connection.execute(statement)
+            for rows in result.mappings().partitions():
+                yield "".join(
+                    json.dumps({"type": entity, **row}, separators=(",", ":")) + "\n"
+                    for row in rows
+                ).encode()
+
+def gzip_stream(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip a stream of byte chunks incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+
+    yield compressor.flush()
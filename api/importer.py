@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Callable, Iterable, Optional, Union
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlmodel import Session
+from .breeds import breed_registry
+from .outbound import create_http_client
+from .counts import row_counts
+from .cache import response_cache
+from .models import \
+    SpyCat, Mission, Target, Note, \
+    BulkItemError, ImportResult, \
+    spycat_validate, target_validate, note_validate
+from . import config
+
+# Importable record types in parent-first insert order, with their validators
+IMPORT_TYPES: dict[str, tuple[type, Optional[Callable]]] = {
+    "spycat": (SpyCat, spycat_validate),
+    "mission": (Mission, None),
+    "target": (Target, target_validate),
+    "note": (Note, note_validate),
+}
+
+# Foreign keys a record cannot be imported without
+REQUIRED_PARENTS = {"target": "mission_id", "note": "target_id"}
+
+# Only the first errors are kept in the result
+MAX_REPORTED_ERRORS = 100
+
+def parse_record(line: Union[str, bytes], is_known_breed: Callable[[str], bool] = breed_registry.known) -> tuple[str, dict]:
+    """Parse and validate one NDJSON line, returning its type and table row.
+
+    Spy cat breeds are checked with is_known_breed, by default against the
+    loaded breed registry, so an import accepts the same cats as the API.
+    """
+    try:
+        data = json.loads(line)
+    except ValueError as exc:
+        raise ValueError(f"Invalid JSON: {exc}")
+
+    if not isinstance(data, dict) or data.get("type") not in IMPORT_TYPES:
+        raise ValueError(f"Record type must be one of {', '.join(IMPORT_TYPES)}")
+
+    record_type = data.pop("type")
+    model, validator = IMPORT_TYPES[record_type]
+
+    try:
+        obj = model.model_validate(data)
+    except ValidationError as exc:
+        raise ValueError(f"Invalid {record_type}: {exc.errors()[0]['msg']}")
+
+    if validator and not validator(obj):
+        raise ValueError(f"Invalid {record_type} data")
+
+    if record_type == "spycat" and not is_known_breed(obj.breed):
+        raise ValueError("Invalid breed")
+
+    parent = REQUIRED_PARENTS.get(record_type)
+    if parent and getattr(obj, parent) is None:
+        raise ValueError(f"Invalid {record_type}: {parent} is required")
+
+    return record_type, {column.name: getattr(obj, column.name) for column in model.__table__.columns}
+
+def _flush(session: Session, batch: dict[str, list[tuple[int, dict]]]) -> list[BulkItemError]:
+    """Insert a batch of (line number, row) pairs in one transaction, returning the rows that failed.
+
+    The batch is inserted with one executemany INSERT per type. If a row breaks
+    a constraint, such as a duplicate id or a missing parent, the batch is
+    inserted again one row at a time, each in a savepoint, so only the
+    offending lines are left out.
+    """
+    try:
+        for record_type, (model, _) in IMPORT_TYPES.items():
+            if batch[record_type]:
+                session.execute(insert(model.__table__), [row for _, row in batch[record_type]])
+        session.commit()
+        return []
+    except IntegrityError:
+        session.rollback()
+
+    errors = []
+    for record_type, (model, _) in IMPORT_TYPES.items():
+        rows = batch[record_type]
+        for position, row in list(rows):
+            try:
+                with session.begin_nested():
+                    session.execute(insert(model.__table__), row)
+            except IntegrityError as exc:
+                rows.remove((position, row))
+                errors.append(BulkItemError(index=position - 1, detail=str(exc.orig)))
+    session.commit()
+
+    return errors
+
+def import_ndjson(
+    session: Session,
+    lines: Iterable[Union[str, bytes]],
+    batch_size: int = config.IMPORT_BATCH_SIZE,
+    offset: int = 0,
+    on_checkpoint: Optional[Callable[[int], None]] = None,
+    is_known_breed: Callable[[str], bool] = breed_registry.known
+) -> ImportResult:
+    """Import spy cats, missions, targets and notes from newline-delimited JSON.
+
+    Lines are read one at a time, validated and inserted in batches of
+    batch_size rows, one transaction per batch on the given session. Lines
+    that fail validation or break a constraint are reported and skipped. The
+    first offset lines are skipped, and the returned checkpoint is the offset
+    to resume from after the last committed batch. The format is the one
+    written by GET /export.
+    """
+    result = ImportResult(imported={record_type: 0 for record_type in IMPORT_TYPES}, checkpoint=offset)
+    batch: dict[str, list[tuple[int, dict]]] = {record_type: [] for record_type in IMPORT_TYPES}
+    pending = 0
+    started = time.perf_counter()
+
+    def report(error: BulkItemError):
+        result.skipped += 1
+        if len(result.errors) < MAX_REPORTED_ERRORS:
+            result.errors.append(error)
+
+    def commit(position: int):
+        for error in _flush(session, batch):
+            report(error)
+        for record_type, rows in batch.items():
+            result.imported[record_type] += len(rows)
+            rows.clear()
+        result.checkpoint = position
+        if on_checkpoint:
+            on_checkpoint(position)
+
+    try:
+        position = offset
+        for position, line in enumerate(lines, start=1):
+            if position <= offset or not line.strip():
+                continue
+
+            try:
+                record_type, row = parse_record(line, is_known_breed)
+            except ValueError as exc:
+                report(BulkItemError(index=position - 1, detail=str(exc)))
+                continue
+
+            batch[record_type].append((position, row))
+            pending += 1
+
+            if pending >= batch_size:
+                commit(position)
+                pending = 0
+
+        if position > result.checkpoint:
+            commit(position)
+    except DBAPIError as exc:
+        session.rollback()
+        result.aborted = str(exc.orig)
+
+    # Constraint errors are found after the validation errors of later lines
+    result.errors.sort(key=lambda error: error.index)
+
+    imported = sum(result.imported.values())
+    if imported:
+        # Rows landed outside the crud functions, so every cached read may be stale
+        row_counts.invalidate()
+        response_cache.clear()
+
+    result.elapsed = time.perf_counter() - started
+    result.rows_per_second = imported / result.elapsed if result.elapsed else 0.0
+
+    return result
+
+def read_checkpoint(path: str) -> int:
+    """Read a saved import offset, or 0 if there is none."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+def write_checkpoint(path: str, offset: int):
+    """Save an import offset atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(str(offset))
+    os.replace(tmp_path, path)
+
+async def load_breeds():
+    """Load the breed registry from its snapshot, or from upstream if there is none."""
+    async with create_http_client() as client:
+        await breed_registry.ensure_loaded(client)
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Command-line entry point: python -m api.importer FILE."""
+    # Not imported by the package __init__, so that "python -m api.importer" runs cleanly
+    parser = argparse.ArgumentParser(prog="python -m api.importer", description="Import NDJSON records into the SpyCat database.")
+    parser.add_argument("file", help="NDJSON file to import, or - for stdin")
+    parser.add_argument("--batch-size", type=int, default=config.IMPORT_BATCH_SIZE)
+    parser.add_argument("--offset", type=int, help="Number of lines to skip (overrides the checkpoint file)")
+    parser.add_argument("--checkpoint", help="File the committed offset is saved to and resumed from")
+    parser.add_argument("--database-url", default=config.DATABASE_URL)
+    args = parser.parse_args(argv)
+
+    # Imported here so that --help works without touching the database
+    from .database import create_db_engine, create_db_and_tables, create_session_factory
+
+    offset = args.offset
+    if offset is None:
+        offset = read_checkpoint(args.checkpoint) if args.checkpoint else 0
+
+    on_checkpoint = None
+    if args.checkpoint:
+        on_checkpoint = lambda position: write_checkpoint(args.checkpoint, position)
+
+    asyncio.run(load_breeds())
+    if not breed_registry.loaded:
+        print("Breed registry unavailable, spy cats will be rejected", file=sys.stderr)
+
+    db_engine = create_db_engine(args.database_url)
+    create_db_and_tables(db_engine)
+
+    f = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+    try:
+        with create_session_factory(db_engine)() as session:
+            result = import_ndjson(session, f, args.batch_size, offset, on_checkpoint)
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+        db_engine.dispose()
+
+    for error in result.errors:
+        print(f"line {error.index + 1}: {error.detail}", file=sys.stderr)
+
+    rows = sum(result.imported.values())
+    print(f"Imported {rows} rows ({', '.join(f'{n} {t}' for t, n in result.imported.items())}), "
+          f"skipped {result.skipped}, in {result.elapsed:.2f}s ({result.rows_per_second:.0f} rows/s); "
+          f"checkpoint {result.checkpoint}")
+
+    if result.aborted:
+        print(f"Aborted: {result.aborted}", file=sys.stderr)
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,49 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Header, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from sqlmodel import Session, select, func
-from .database import create_db_and_tables, get_session
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from .database import create_db_and_tables, dispose_async_engine, get_db, get_engine, SessionRunner, \
+    read_database_diagnostics, db_executor
+from .breeds import breed_registry
+from .outbound import open_http_client, close_http_client, get_http_client
 from .models import \
-    SpyCat, SpyCatModel, SpyCatModelRead, SpyCatsCount, \
-    Mission, MissionModel, MissionModelCreate, MissionModelRead, MissionCount, \
-    Target, TargetModel, TargetModelCreate, TargetModelRead, \
-    Note, NoteModel, NoteModelRead, \
-    breed_validate, spycat_validate, target_validate, note_validate
+    SpyCat, SpyCatModel, SpyCatModelPatch, SpyCatModelRead, SpyCatsCount, \
+    Mission, MissionModel, MissionModelCreate, MissionModelPatch, MissionModelRead, MissionCount, \
+    Target, TargetModel, TargetModelCreate, TargetModelPatch, TargetModelBulkPatch, TargetModelRead, \
+    Note, NoteModel, NoteModelPatch, NoteModelRead, \
+    SpyCatBulkResult, MissionBulkDeleteResult, ImportResult, Stats, SearchResults, MissionBulkResult, TargetBulkResult, \
+    TargetBulkUpdateResult, NoteBulkResult, \
+    breed_validate, spycat_validate, spycat_patch_validate
+from .cache import response_cache
+from .etags import COMPACT, make_etag, etag_matches, variant_etag
+from .export import export_ndjson, gzip_stream
+from .serialization import FastJSONResponse, compact_json, dumps, encode_response
+from .compression import CompressionMiddleware
+from .importer import import_ndjson
+from .profiling import ProfilingMiddleware, request_profiler
+from .metrics import MetricsMiddleware, CallbackGauge, registry as metrics_registry, render_metrics
+from . import crud, config
 from contextlib import asynccontextmanager
+from sqlalchemy.engine import Engine
+from tempfile import SpooledTemporaryFile
+from typing import Any, Literal, Optional
+import httpx
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Create the database and tables at startup."""
+    """Create the database and tables, open the HTTP client and load the breed registry at startup."""
     create_db_and_tables()
+    http_client = open_http_client()
+    await breed_registry.start(http_client)
     
     yield
 
-app = FastAPI(lifespan=lifespan)
+    await breed_registry.stop()
+    await close_http_client()
+    await dispose_async_engine()
+    db_executor.shutdown()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,17 +51,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+if config.COMPRESSION:
+    app.add_middleware(CompressionMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc: HTTPException):
     """Custom exception handler for HTTP exceptions."""
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=exc.status_code,
         content={
             "detail": exc.detail,
             "headers": exc.headers if exc.headers else {}
-        }
+        },
+        headers=exc.headers
     )
 
 
@@ -45,387 +76,528 @@ def read_root():
     """Root endpoint."""
     return {"message": "Welcome to the SpyCat API!"}
 
+def etag_response(payload: bytes, etag: str, if_none_match: Optional[str]) -> Response:
+    """Send an encoded JSON body with its ETag, or 304 if the client already has it."""
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return Response(content=payload, media_type="application/json", headers={"ETag": etag})
+
+# Detail responses: data-access function and the entities each payload embeds.
+# The functions return plain column values shaped like the response models,
+# so the payloads are encoded directly without another validation pass.
+DETAILS = {
+    "spycat": (
+        crud.read_spycat,
+        lambda spycat: [("mission", mission["id"]) for mission in spycat["missions"]]
+    ),
+    "mission": (
+        crud.read_mission,
+        lambda mission: [("spycat", mission["cat_id"]), *(("target", target["id"]) for target in mission["targets"])]
+    ),
+    "target": (
+        crud.read_target,
+        lambda target: [("mission", target["mission"]["id"]), *(("note", note["id"]) for note in target["notes"])]
+    ),
+    "note": (
+        crud.read_note,
+        lambda note: [("target", note["target"]["id"]), ("mission", note["mission"]["id"])]
+    ),
+}
+
+async def load_detail(db: SessionRunner, entity: str, entity_id: int) -> tuple[bytes, str]:
+    """Get the encoded detail response and its ETag from the response cache, loading it on a miss."""
+    key = (entity, entity_id)
+    entry = response_cache.get(key)
+
+    if entry is None:
+        read, related = DETAILS[entity]
+        generation = response_cache.generation()
+        item = await db.run(read, entity_id)
+        payload = dumps(item)
+        entry = (payload, make_etag(payload))
+        response_cache.set(key, entry, [key, *related(item)], generation)
+
+    return entry
+
+def compacted(tp: Any, payload: bytes, etag: str, compact: bool) -> tuple[bytes, str]:
+    """Drop null and default fields from an encoded response if the client asked for compact output.
+
+    The compact body gets the ETag of the full one with a suffix, so that it
+    still identifies the content for If-Match.
+    """
+    if not compact:
+        return payload, etag
+
+    return compact_json(tp, payload), variant_etag(etag, COMPACT)
+
+async def missing_first(db: SessionRunner, entity: str, entity_id: int, if_match: Optional[str]):
+    """Report a missing entity with 404, or a failed If-Match with 412, before rejecting the data sent for it.
+
+    Valid writes check both themselves in their UPDATE's transaction; only
+    rejected ones pay for this lookup.
+    """
+    await db.run(crud.check_if_match, entity, entity_id, if_match or "*")
+
+
+@app.get("/health")
+async def health():
+    """Liveness check that does not touch the database."""
+    return {"status": "ok"}
+
+@app.get("/diagnostics/cache")
+async def cache_diagnostics():
+    """Show the response cache counters."""
+    return {"responses": response_cache.stats()}
+
+@app.get("/diagnostics/database")
+async def database_diagnostics(db: SessionRunner = Depends(get_db)):
+    """Show the database configuration and the SQLite PRAGMAs in effect."""
+    return await db.run(read_database_diagnostics)
+
+metrics_registry.register(CallbackGauge(
+    "sca_db_executor_queue_depth", "Database calls waiting for a worker thread.", lambda: db_executor.queue_depth))
+metrics_registry.register(CallbackGauge(
+    "sca_response_cache_entries", "Entries in the response cache.", lambda: response_cache.stats()["size"]))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Expose the service metrics in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/diagnostics/profiles")
+async def list_profiles():
+    """List the captured slow-request profiles, newest first."""
+    return await run_in_threadpool(request_profiler.store.list)
+
+@app.get("/diagnostics/profiles/{profile_id}")
+async def read_profile(profile_id: str):
+    """Get a captured profile with its SQL statement log and top functions."""
+    profile = await run_in_threadpool(request_profiler.store.get, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@app.get("/diagnostics/profiles/{profile_id}/pstats")
+async def read_profile_pstats(profile_id: str):
+    """Download the raw pstats dump of a captured profile."""
+    path = request_profiler.store.pstats_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+@app.get("/diagnostics/executor")
+async def executor_diagnostics():
+    """Show the queue depth and wait times of the database thread pool."""
+    return db_executor.stats()
+
 # SpyCat endpoints
 @app.post("/spycat/", response_model=SpyCat)
-async def create_spycat(spycat: SpyCat, session: Session = Depends(get_session)):
+async def create_spycat(
+    spycat: SpyCat,
+    db: SessionRunner = Depends(get_db),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+):
     """Create a new spy cat."""
-    if not await breed_validate(spycat.breed):
+    if not await breed_validate(spycat.breed, http_client):
         raise HTTPException(status_code=400, detail="Invalid breed")
     
     if not spycat_validate(spycat):
         raise HTTPException(status_code=400, detail="Invalid SpyCat data")
     
-    session.add(spycat)
-    session.commit()
-    session.refresh(spycat)
-    
-    return spycat
+    return await db.run(crud.create_spycat, spycat)
+
+@app.post("/spycat/bulk", response_model=SpyCatBulkResult)
+async def create_spycats_bulk(
+    spycats: list[SpyCatModel],
+    atomic: bool = False,
+    db: SessionRunner = Depends(get_db),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+):
+    """Create many spy cats in one transaction."""
+    errors = [
+        {"index": i, "detail": "Invalid breed"}
+        for i, spycat in enumerate(spycats)
+        if not await breed_validate(spycat.breed, http_client)
+    ]
+
+    return await db.run(crud.bulk_create_spycats, spycats, errors, atomic)
 
 @app.get("/spycat/{spycat_id}", response_model=SpyCatModelRead)
-async def read_spycat(spycat_id: int, session: Session = Depends(get_session)):
+async def read_spycat(
+    spycat_id: int,
+    compact: bool = False,
+    db: SessionRunner = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
+):
     """Read a spy cat by ID."""
-    spycat = session.get(SpyCat, spycat_id)
-    if not spycat:
-        raise HTTPException(status_code=404, detail="Spy Cat not found")
+    payload, etag = await load_detail(db, "spycat", spycat_id)
 
-    return {
-        **spycat.model_dump(),
-        "missions": spycat.missions
-    }
+    return etag_response(*compacted(SpyCatModelRead, payload, etag, compact), if_none_match)
 
 @app.get("/spycat/", response_model=SpyCatsCount)
-async def read_spycats(skip: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    """Read all spy cats with pagination."""
-    statement = select(SpyCat)
-
-    if skip > 0:
-        statement = statement.offset(skip)
-    if limit > 0:
-        statement = statement.limit(limit)
-    
-    spycats = session.exec(statement).all()
+async def read_spycats(
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    order_by: Literal["id", "name", "salary", "years_of_experience"] = "id",
+    include_count: bool = True,
+    count: Literal["exact", "estimate"] = "exact",
+    breed: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    min_salary: Optional[float] = None,
+    max_salary: Optional[float] = None,
+    fields: Optional[str] = None,
+    db: SessionRunner = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Read spy cats with filters, sorting, sparse fieldsets and offset or cursor pagination."""
+    selected = crud.parse_fields(fields, crud.SPYCAT_FIELDS)
+    data = await db.run(
+        crud.read_spycats, skip, limit, cursor, order_by,
+        include_count=include_count, allow_estimate=count == "estimate",
+        breed=breed, name_prefix=name_prefix, min_salary=min_salary, max_salary=max_salary,
+        fields=selected
+    )
+    payload = dumps(data)
 
-    all_count = session.exec(select(func.count(SpyCat.id))).one()
-    
-    return {
-        "spycats": spycats,
-        "all_count": all_count
-    }
+    return etag_response(payload, make_etag(payload), if_none_match)
 
 @app.put("/spycat/{spycat_id}", response_model=SpyCat)
-async def update_spycat(spycat_id: int, spycat: SpyCatModel, session: Session = Depends(get_session)):
+async def update_spycat(
+    spycat_id: int,
+    spycat: SpyCatModel,
+    db: SessionRunner = Depends(get_db),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+    if_match: Optional[str] = Header(None)
+):
     """Update a spy cat by ID."""
-    existing_spycat = session.get(SpyCat, spycat_id)
-
-    if not existing_spycat:
-        raise HTTPException(status_code=404, detail="Spy Cat not found")
-    
-    if not await breed_validate(spycat.breed):
+    if not await breed_validate(spycat.breed, http_client):
+        await missing_first(db, "spycat", spycat_id, if_match)
         raise HTTPException(status_code=400, detail="Invalid breed")
     
     if not spycat_validate(spycat):
+        await missing_first(db, "spycat", spycat_id, if_match)
         raise HTTPException(status_code=400, detail="Invalid SpyCat data")
     
-    existing_spycat.name = spycat.name
-    existing_spycat.years_of_experience = spycat.years_of_experience
-    existing_spycat.breed = spycat.breed
-    existing_spycat.salary = spycat.salary
-    
-    session.add(existing_spycat)
-    session.commit()
-    session.refresh(existing_spycat)
-    
-    return existing_spycat
+    return await db.run(crud.update_spycat, spycat_id, SpyCatModelPatch(**spycat.model_dump(exclude={"id"})), if_match)
+
+@app.patch("/spycat/{spycat_id}", response_model=SpyCat)
+async def patch_spycat(
+    spycat_id: int,
+    spycat: SpyCatModelPatch,
+    db: SessionRunner = Depends(get_db),
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+    if_match: Optional[str] = Header(None)
+):
+    """Update only the given fields of a spy cat by ID."""
+    if spycat.breed is not None and not await breed_validate(spycat.breed, http_client):
+        await missing_first(db, "spycat", spycat_id, if_match)
+        raise HTTPException(status_code=400, detail="Invalid breed")
+
+    if not spycat_patch_validate(spycat):
+        await missing_first(db, "spycat", spycat_id, if_match)
+        raise HTTPException(status_code=400, detail="Invalid SpyCat data")
+
+    return await db.run(crud.update_spycat, spycat_id, spycat, if_match)
 
 @app.delete("/spycat/{spycat_id}", response_model=SpyCat)
-async def delete_spycat(spycat_id: int, session: Session = Depends(get_session)):
+async def delete_spycat(
+    spycat_id: int, db: SessionRunner = Depends(get_db), if_match: Optional[str] = Header(None)
+):
     """Delete a spy cat by ID."""
-    spycat = session.get(SpyCat, spycat_id)
-    
-    if not spycat:
-        raise HTTPException(status_code=404, detail="Spy Cat not found")
-    
-    session.delete(spycat)
-    session.commit()
-    
-    return spycat
+    return await db.run(crud.delete_spycat, spycat_id, if_match)
 
 # Mission endpoints
 @app.post("/mission/", response_model=Mission)
-async def create_mission(mission: MissionModelCreate, session: Session = Depends(get_session)):
+async def create_mission(mission: MissionModelCreate, db: SessionRunner = Depends(get_db)):
     """Create a new mission."""
-    if mission.cat_id:
-        cat = session.get(SpyCat, mission.cat_id)
-        if not cat:
-            raise HTTPException(status_code=404, detail="SpyCat not found")
-    
-    mission_data = {
-        "cat_id": mission.cat_id,
-        "is_complete": mission.is_complete
-    }
-
-    db_mission = Mission(**mission_data)
-
-    if mission.targets:
-        for i, target in enumerate(mission.targets):
-            target_data = {
-                "name": target.name,
-                "country": target.country,
-                "is_complete": target.is_complete
-            }
-
-            db_target = Target(**target_data)
-
-            if not target_validate(target):
-                raise HTTPException(status_code=400, detail=f"Invalid Target #{i + 1} data")
-            
-            db_mission.targets.append(db_target)
-
-    session.add(db_mission)
-    session.commit()
-    session.refresh(db_mission)
-    
-    return db_mission
+    return await db.run(crud.create_mission, mission)
+
+@app.post("/mission/bulk", response_model=MissionBulkResult)
+async def create_missions_bulk(
+    missions: list[MissionModelCreate], atomic: bool = False, db: SessionRunner = Depends(get_db)
+):
+    """Create many missions with their targets in one transaction."""
+    return await db.run(crud.bulk_create_missions, missions, atomic)
 
 @app.get("/mission/{mission_id}", response_model=MissionModelRead)
-async def read_mission(mission_id: int, session: Session = Depends(get_session)):
+async def read_mission(
+    mission_id: int,
+    compact: bool = False,
+    db: SessionRunner = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
+):
     """Read a mission by ID."""
-    mission = session.get(Mission, mission_id)
-    
-    if not mission:
-        raise HTTPException(status_code=404, detail="Mission not found")
+    payload, etag = await load_detail(db, "mission", mission_id)
 
-    return {
-        **mission.model_dump(),
-        "cat": mission.cat,
-        "targets": mission.targets
-    }
+    return etag_response(*compacted(MissionModelRead, payload, etag, compact), if_none_match)
 
 @app.get("/mission/", response_model=MissionCount)
-async def read_missions(skip: int = 0, limit: int = 10, session: Session = Depends(get_session)):
-    """Read all missions with pagination."""
-    statement = select(Mission)
-
-    if skip > 0:
-        statement = statement.offset(skip)
-    if limit > 0:
-        statement = statement.limit(limit)
-
-    missions = session.exec(statement).all()
-
-    all_count = session.exec(select(func.count(Mission.id))).one()
-
-    return {
-        "missions": [
-            {
-                **mission.model_dump(),
-                "cat": mission.cat
-            }
-            for mission in missions
-        ],
-        "all_count": all_count
-    }
+async def read_missions(
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    order_by: Literal["id", "cat_id", "is_complete"] = "id",
+    include_count: bool = True,
+    count: Literal["exact", "estimate"] = "exact",
+    is_complete: Optional[bool] = None,
+    cat_id: Optional[int] = None,
+    unassigned: Optional[bool] = None,
+    fields: Optional[str] = None,
+    compact: bool = False,
+    db: SessionRunner = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Read missions with filters, sorting, sparse fieldsets and offset or cursor pagination."""
+    selected = crud.parse_fields(fields, crud.MISSION_FIELDS)
+    data = await db.run(
+        crud.read_missions, skip, limit, cursor, order_by,
+        include_count=include_count, allow_estimate=count == "estimate",
+        is_complete=is_complete, cat_id=cat_id, unassigned=unassigned, fields=selected
+    )
+    payload = dumps(data)
+
+    return etag_response(*compacted(MissionCount, payload, make_etag(payload), compact), if_none_match)
 
 @app.put("/mission/{mission_id}", response_model=Mission)
-async def update_mission(mission_id: int, mission: MissionModel, session: Session = Depends(get_session)):
+async def update_mission(
+    mission_id: int, mission: MissionModel, db: SessionRunner = Depends(get_db), if_match: Optional[str] = Header(None)
+):
     """Update a mission by ID."""
-    existing_mission = session.get(Mission, mission_id)
-
-    if not existing_mission:
-        raise HTTPException(status_code=404, detail="Mission not found")
-    
-    existing_mission.is_complete = mission.is_complete
-    
+    patch = MissionModelPatch(is_complete=mission.is_complete)
     if mission.cat_id:
-        cat = session.get(SpyCat, mission.cat_id)
-        if not cat:
-            raise HTTPException(status_code=404, detail="Spy Cat not found")
-        existing_mission.cat_id = mission.cat_id
-    
-    session.add(existing_mission)
-    session.commit()
-    session.refresh(existing_mission)
-    
-    return existing_mission
+        # A full update without a cat keeps the current one
+        patch.cat_id = mission.cat_id
+
+    return await db.run(crud.update_mission, mission_id, patch, if_match)
+
+@app.patch("/mission/{mission_id}", response_model=Mission)
+async def patch_mission(
+    mission_id: int,
+    mission: MissionModelPatch,
+    db: SessionRunner = Depends(get_db),
+    if_match: Optional[str] = Header(None)
+):
+    """Update only the given fields of a mission by ID; a null cat_id unassigns the cat."""
+    return await db.run(crud.update_mission, mission_id, mission, if_match)
 
 @app.delete("/mission/{mission_id}", response_model=Mission)
-async def delete_mission(mission_id: int, session: Session = Depends(get_session)):
+async def delete_mission(
+    mission_id: int, db: SessionRunner = Depends(get_db), if_match: Optional[str] = Header(None)
+):
     """Delete a mission by ID."""
+    return await db.run(crud.delete_mission, mission_id, if_match)
 
-    mission = session.get(Mission, mission_id)
-    
-    if not mission:
-        raise HTTPException(status_code=404, detail="Mission not found")
-    
-    if mission.cat:
-        raise HTTPException(status_code=400, detail="Cannot delete mission with assigned SpyCat")
-    
-    session.delete(mission)
-    session.commit()
-    
-    return mission
+@app.delete("/mission/", response_model=MissionBulkDeleteResult)
+async def delete_missions(is_complete: bool, db: SessionRunner = Depends(get_db)):
+    """Delete every unassigned mission with the given completion status, with its targets and notes."""
+    return await db.run(crud.delete_missions, is_complete)
 
 
 # Target endpoints
 @app.post("/mission/{mission_id}/target/", response_model=Target)
-async def create_target(mission_id: int, target: TargetModelCreate, session: Session = Depends(get_session)):
+async def create_target(mission_id: int, target: TargetModelCreate, db: SessionRunner = Depends(get_db)):
     """Create a new target."""
-    mission = session.get(Mission, mission_id)
-    if not mission:
-        raise HTTPException(status_code=404, detail="Mission not found")
-
-    db_target = Target(name=target.name, country=target.country, is_complete=target.is_complete)
-
-    if not target_validate(db_target):
-        raise HTTPException(status_code=400, detail="Invalid Target data")
-
-    mission.targets.append(db_target)
-
-    if target.notes:
-        for i, note in enumerate(target.notes):
-            note_data = {
-                "content": note.content
-            }
-            db_note = Note(**note_data)
-
-            if not note_validate(db_note):
-                raise HTTPException(status_code=400, detail=f"Invalid Note #{i + 1} data")
+    return await db.run(crud.create_target, mission_id, target)
 
-            db_target.notes.append(db_note)
-
-    session.add(db_target)
-    session.commit()
-    session.refresh(db_target)
-
-    return db_target
+@app.post("/mission/{mission_id}/target/bulk", response_model=TargetBulkResult)
+async def create_targets_bulk(
+    mission_id: int, targets: list[TargetModelCreate], atomic: bool = False, db: SessionRunner = Depends(get_db)
+):
+    """Create many targets for a mission in one transaction."""
+    return await db.run(crud.bulk_create_targets, mission_id, targets, atomic)
 
 @app.get("/mission/{mission_id}/target/", response_model=list[Target])
-async def read_targets(mission_id: int, session: Session = Depends(get_session)):
+async def read_targets(
+    mission_id: int, db: SessionRunner = Depends(get_db), if_none_match: Optional[str] = Header(None)
+):
     """Read all targets for a mission."""
-    mission = session.get(Mission, mission_id)
-    if not mission:
-        raise HTTPException(status_code=404, detail="Mission not found")
+    payload = dumps(await db.run(crud.read_targets, mission_id))
 
-    return mission.targets
+    return etag_response(payload, make_etag(payload), if_none_match)
 
 @app.get("/target/{target_id}", response_model=TargetModelRead)
-async def read_target(target_id: int, session: Session = Depends(get_session)):
+async def read_target(
+    target_id: int,
+    compact: bool = False,
+    db: SessionRunner = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
+):
     """Read a target by ID."""
-    target = session.get(Target, target_id)
-    if not target:
-        raise HTTPException(status_code=404, detail="Target not found")
+    payload, etag = await load_detail(db, "target", target_id)
 
-    return {
-        **target.model_dump(),
-        "mission": target.mission,
-        "notes": target.notes
-    }
+    return etag_response(*compacted(TargetModelRead, payload, etag, compact), if_none_match)
 
 @app.put("/target/{target_id}", response_model=Target)
-async def update_target(target_id: int, target: TargetModel, session: Session = Depends(get_session)):
+async def update_target(
+    target_id: int, target: TargetModel, db: SessionRunner = Depends(get_db), if_match: Optional[str] = Header(None)
+):
     """Update a target by ID."""
-    existing_target = session.get(Target, target_id)
-    if not existing_target:
-        raise HTTPException(status_code=404, detail="Target not found")
+    return await db.run(crud.update_target, target_id, TargetModelPatch(**target.model_dump(exclude={"id"})), if_match)
 
-    existing_target.name = target.name
-    existing_target.country = target.country
-    existing_target.is_complete = target.is_complete
-
-    if not target_validate(existing_target):
-        raise HTTPException(status_code=400, detail="Invalid Target data")
-
-    session.add(existing_target)
-    session.commit()
-    session.refresh(existing_target)
-
-    return existing_target
+@app.patch("/target/bulk", response_model=TargetBulkUpdateResult)
+async def patch_targets_bulk(
+    targets: list[TargetModelBulkPatch], atomic: bool = False, db: SessionRunner = Depends(get_db)
+):
+    """Update only the given fields of many targets in one transaction."""
+    return await db.run(crud.bulk_update_targets, targets, atomic)
+
+@app.patch("/target/{target_id}", response_model=Target)
+async def patch_target(
+    target_id: int,
+    target: TargetModelPatch,
+    db: SessionRunner = Depends(get_db),
+    if_match: Optional[str] = Header(None)
+):
+    """Update only the given fields of a target by ID."""
+    return await db.run(crud.update_target, target_id, target, if_match)
 
 @app.delete("/target/{target_id}", response_model=Target)
-async def delete_target(target_id: int, session: Session = Depends(get_session)):
+async def delete_target(
+    target_id: int, db: SessionRunner = Depends(get_db), if_match: Optional[str] = Header(None)
+):
     """Delete a target by ID."""
-    target = session.get(Target, target_id)
-    if not target:
-        raise HTTPException(status_code=404, detail="Target not found")
-
-    session.delete(target)
-    session.commit()
-
-    return target
+    return await db.run(crud.delete_target, target_id, if_match)
 
 
 # Note endpoints
 @app.post("/target/{target_id}/note/", response_model=Note)
-async def create_note(target_id: int, note: NoteModel, session: Session = Depends(get_session)):
+async def create_note(target_id: int, note: NoteModel, db: SessionRunner = Depends(get_db)):
     """Create a new note for a target."""
-    if not note.content:
-        raise HTTPException(status_code=400, detail="Note content is required")
-
-    target = session.get(Target, target_id)
-    if not target:
-        raise HTTPException(status_code=404, detail="Target not found")
-
-    if target.mission.is_complete:
-        raise HTTPException(status_code=400, detail="Cannot add note to a completed mission")
-
-    if target.is_complete:
-        raise HTTPException(status_code=400, detail="Cannot add note to a completed target")
-
-    db_note = Note(content=note.content)
+    return await db.run(crud.create_note, target_id, note)
 
-    if not note_validate(db_note):
-        raise HTTPException(status_code=400, detail="Invalid Note data")
-    
-    target.notes.append(db_note)
-
-    session.add(db_note)
-    session.commit()
-    session.refresh(db_note)
-
-    return db_note
+@app.post("/target/{target_id}/note/bulk", response_model=NoteBulkResult)
+async def create_notes_bulk(
+    target_id: int, notes: list[NoteModel], atomic: bool = False, db: SessionRunner = Depends(get_db)
+):
+    """Create many notes for a target in one transaction."""
+    return await db.run(crud.bulk_create_notes, target_id, notes, atomic)
 
 @app.get("/target/{target_id}/note/", response_model=list[Note])
 async def read_notes(
-    target_id: int, session: Session = Depends(get_session)
+    target_id: int, db: SessionRunner = Depends(get_db), if_none_match: Optional[str] = Header(None)
 ):
     """Read all notes for a target."""
-    target = session.get(Target, target_id)
-    if not target:
-        raise HTTPException(status_code=404, detail="Target not found")
+    payload = dumps(await db.run(crud.read_notes, target_id))
 
-    return target.notes
+    return etag_response(payload, make_etag(payload), if_none_match)
 
 @app.get("/note/{note_id}", response_model=NoteModelRead)
 async def read_note(
-    note_id: int, session: Session = Depends(get_session)
+    note_id: int,
+    compact: bool = False,
+    db: SessionRunner = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Read a note by ID."""
-    note = session.get(Note, note_id)
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
+    payload, etag = await load_detail(db, "note", note_id)
 
-    return {
-        **note.model_dump(),
-        "target": note.target,
-        "mission": note.target.mission
-    }
+    return etag_response(*compacted(NoteModelRead, payload, etag, compact), if_none_match)
 
 @app.put("/note/{note_id}", response_model=Note)
 async def update_note(
-    note_id: int, note: NoteModel, session: Session = Depends(get_session)
+    note_id: int, note: NoteModel, db: SessionRunner = Depends(get_db), if_match: Optional[str] = Header(None)
 ):
     """Update a note by ID."""
-    existing_note = session.get(Note, note_id)
-    if not existing_note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    
-    if existing_note.target.is_complete:
-        raise HTTPException(status_code=400, detail="Cannot update note for a completed target")
-    
-    if existing_note.target.mission.is_complete:
-        raise HTTPException(status_code=400, detail="Cannot update note for a completed mission")
+    return await db.run(crud.update_note, note_id, NoteModelPatch(content=note.content), if_match)
+
+@app.patch("/note/{note_id}", response_model=Note)
+async def patch_note(
+    note_id: int,
+    note: NoteModelPatch,
+    db: SessionRunner = Depends(get_db),
+    if_match: Optional[str] = Header(None)
+):
+    """Update only the given fields of a note by ID."""
+    return await db.run(crud.update_note, note_id, note, if_match)
+
+@app.delete("/note/{note_id}", response_model=Note)
+async def delete_note(
+    note_id: int, db: SessionRunner = Depends(get_db), if_match: Optional[str] = Header(None)
+):
+    """Delete a note by ID."""
+    return await db.run(crud.delete_note, note_id, if_match)
 
-    existing_note.content = note.content
 
-    if not note_validate(existing_note):
-        raise HTTPException(status_code=400, detail="Note content is required")
+# Statistics endpoints
+@app.get("/stats", response_model=Stats)
+async def read_stats(
+    db: SessionRunner = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Count missions and targets (total and complete) and notes per spy cat and overall."""
+    payload = encode_response(Stats, await db.run(crud.read_stats))
 
-    session.add(existing_note)
-    session.commit()
-    session.refresh(existing_note)
+    return etag_response(payload, make_etag(payload), if_none_match)
 
-    return existing_note
 
-@app.delete("/note/{note_id}", response_model=Note)
-async def delete_note(
-    note_id: int, session: Session = Depends(get_session)
+# Search endpoints
+@app.get("/search", response_model=SearchResults)
+async def search(
+    q: str,
+    type: Optional[Literal["note", "target"]] = None,
+    skip: int = 0,
+    limit: int = 10,
+    db: SessionRunner = Depends(get_db)
 ):
-    """Delete a note by ID."""
-    note = session.get(Note, note_id)
-    if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
+    """Full-text search over note contents and target names and countries, best matches first."""
+    if skip < 0 or not 0 < limit <= 100:
+        raise HTTPException(status_code=400, detail="Invalid skip or limit")
+
+    types = (type,) if type else ("note", "target")
+    return await db.run(crud.search, q, types, skip, limit)
+
+
+# Export endpoints
+@app.get("/export")
+async def export(
+    is_complete: Optional[bool] = None,
+    cat_id: Optional[int] = None,
+    compress: Literal["none", "gzip"] = "none",
+    db_engine: Engine = Depends(get_engine)
+):
+    """Stream spy cats, missions, targets and notes as newline-delimited JSON.
+
+    The chunks are read on the database executor rather than Starlette's
+    threadpool, so exports count against the same worker limit as other
+    database calls.
+    """
+    chunks = export_ndjson(db_engine, is_complete, cat_id)
+    headers = {"Content-Disposition": 'attachment; filename="export.ndjson"'}
+
+    if compress == "gzip":
+        chunks = gzip_stream(chunks)
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(db_executor.iterate(chunks), media_type="application/x-ndjson", headers=headers)
+
+
+# Import endpoints
+@app.post("/import", response_model=ImportResult)
+async def import_records(
+    request: Request,
+    batch_size: int = config.IMPORT_BATCH_SIZE,
+    offset: int = 0,
+    db: SessionRunner = Depends(get_db),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+):
+    """Import newline-delimited JSON records in batched transactions."""
+    if batch_size < 1 or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid batch size or offset")
+
+    # The import checks spy cat breeds against the registry without awaiting it
+    await breed_registry.ensure_loaded(http_client)
+
+    # Spool the body so the import can read it line by line from the database session's thread
+    with SpooledTemporaryFile(max_size=config.IMPORT_SPOOL_SIZE) as body:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+
+        result = await db.run(import_ndjson, body, batch_size, offset)
 
-    session.delete(note)
-    session.commit()
+    if result.aborted:
+        return FastJSONResponse(status_code=409, content=result.model_dump())
 
-    return note
+    return result
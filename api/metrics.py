@@ -0,0 +1,271 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Optional, Union
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Minimal Prometheus text-format metrics, kept dependency-free.
+# Observations take one lock and a dict lookup, so they are cheap enough for
+# every request and every SQL statement.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+LabelValues = tuple[str, ...]
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+class CallbackGauge(Metric):
+    """Gauge whose values are read from a callback when the metrics are rendered."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, callback: Callable[[], Union[float, dict[LabelValues, float]]],
+                 labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+
+    def samples(self) -> list[str]:
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in sorted(values.items())]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: bucket counts (the last one is +Inf), sum and count
+        self._values: dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return entry[2] if entry else 0
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((labels, (list(entry[0]), entry[1], entry[2])) for labels, entry in self._values.items())
+
+        lines = []
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "sca_http_requests_total", "HTTP requests by method, route and status code.", ("method", "route", "status")))
+http_request_duration = registry.register(Histogram(
+    "sca_http_request_duration_seconds", "HTTP request latency by method and route.", ("method", "route")))
+http_requests_in_flight = registry.register(Gauge(
+    "sca_http_requests_in_flight", "HTTP requests currently being served."))
+http_compressed_responses = registry.register(Counter(
+    "sca_http_compressed_responses_total", "HTTP responses sent compressed, by content coding.", ("encoding",)))
+http_compression_saved_bytes = registry.register(Counter(
+    "sca_http_compression_saved_bytes_total", "Response bytes saved by compression, by content coding.", ("encoding",)))
+
+db_queries = registry.register(Counter(
+    "sca_db_queries_total", "SQL statements executed."))
+db_query_seconds = registry.register(Counter(
+    "sca_db_query_seconds_total", "Time spent executing SQL statements."))
+db_queries_per_request = registry.register(Histogram(
+    "sca_db_queries_per_request", "SQL statements executed per HTTP request.", ("route",), COUNT_BUCKETS))
+db_query_seconds_per_request = registry.register(Histogram(
+    "sca_db_query_seconds_per_request", "Time spent in SQL per HTTP request.", ("route",)))
+db_pool_checkout = registry.register(Histogram(
+    "sca_db_pool_checkout_seconds", "Time spent waiting for a pooled database connection."))
+db_executor_wait = registry.register(Histogram(
+    "sca_db_executor_wait_seconds", "Time database calls waited for a worker thread."))
+db_executor_rejected = registry.register(Counter(
+    "sca_db_executor_rejected_total", "Database calls rejected because the worker queue was full."))
+
+breed_validation = registry.register(Histogram(
+    "sca_breed_validation_seconds", "Time spent validating a breed, by result.", ("result",)))
+breed_upstream = registry.register(Histogram(
+    "sca_breed_upstream_seconds", "Time spent fetching the breed list from TheCatAPI, by outcome.", ("outcome",)))
+
+class RequestStats:
+    """SQL statements and time attributed to the current request."""
+    __slots__ = ("queries", "query_seconds", "statements")
+
+    def __init__(self, log_statements: bool = False):
+        self.queries = 0
+        self.query_seconds = 0.0
+        # (statement, parameters, seconds) of every statement, for profiled requests only
+        self.statements: Optional[list[tuple[str, Any, float]]] = [] if log_statements else None
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("sca_request_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sca_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["sca_query_start"].pop()
+    db_queries.inc()
+    db_query_seconds.inc(amount=elapsed)
+
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+        if stats.statements is not None:
+            stats.statements.append((statement, parameters, elapsed))
+
+def _handle_error(context):
+    # after_cursor_execute is skipped for failed statements
+    starts = context.connection.info.get("sca_query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+def instrument_engine(engine: Engine):
+    """Record statement counts, statement time and pool checkout wait for an engine."""
+    if getattr(engine, "_sca_instrumented", False):
+        return
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+    # The pool has no "before checkout" event, so time the engine's checkout call
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return raw_connection(*args, **kwargs)
+        finally:
+            db_pool_checkout.observe(time.perf_counter() - started)
+
+    engine.raw_connection = timed_raw_connection
+    engine._sca_instrumented = True
+
+def route_name(scope: dict) -> str:
+    """Get the route template of a handled request, keeping label cardinality bounded."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency, in-flight requests and SQL per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_requests_in_flight.dec()
+            request_stats.reset(token)
+
+            route = route_name(scope)
+            http_requests.inc(scope["method"], route, status)
+            http_request_duration.observe(elapsed, scope["method"], route)
+            db_queries_per_request.observe(stats.queries, route)
+            db_query_seconds_per_request.observe(stats.query_seconds, route)
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    return registry.render()
@@ -0,0 +1,85 @@
+import logging
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Schema changes for databases created by older versions of the models.
+# create_all only creates missing tables, so anything added to existing tables
+# (indexes, columns, triggers) goes here. Each migration runs once, in order,
+# and the applied version is stored in PRAGMA user_version. Statements should
+# be idempotent because fresh databases already get the current schema from
+# create_all.
+MIGRATIONS: list[tuple[int, str, list[str]]] = [
+    (1, "Index foreign keys and common mission filters", [
+        "CREATE INDEX IF NOT EXISTS ix_mission_cat_id_is_complete ON mission (cat_id, is_complete)",
+        "CREATE INDEX IF NOT EXISTS ix_target_mission_id ON target (mission_id)",
+        "CREATE INDEX IF NOT EXISTS ix_note_target_id ON note (target_id)",
+    ]),
+    (2, "Index spy cat breeds for list filters", [
+        "CREATE INDEX IF NOT EXISTS ix_spycat_breed ON spycat (breed)",
+    ]),
+    (3, "Full-text search over notes and targets", [
+        # External-content FTS5 tables: the text stays in note/target, the
+        # triggers below keep the indexes in sync with every write
+        "CREATE VIRTUAL TABLE IF NOT EXISTS note_fts USING fts5("
+        "content, content='note', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS target_fts USING fts5("
+        "name, country, content='target', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS note_fts_insert AFTER INSERT ON note BEGIN "
+        "INSERT INTO note_fts (rowid, content) VALUES (new.id, new.content); END",
+        "CREATE TRIGGER IF NOT EXISTS note_fts_delete AFTER DELETE ON note BEGIN "
+        "INSERT INTO note_fts (note_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+        "CREATE TRIGGER IF NOT EXISTS note_fts_update AFTER UPDATE OF content ON note BEGIN "
+        "INSERT INTO note_fts (note_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+        "INSERT INTO note_fts (rowid, content) VALUES (new.id, new.content); END",
+        "CREATE TRIGGER IF NOT EXISTS target_fts_insert AFTER INSERT ON target BEGIN "
+        "INSERT INTO target_fts (rowid, name, country) VALUES (new.id, new.name, new.country); END",
+        "CREATE TRIGGER IF NOT EXISTS target_fts_delete AFTER DELETE ON target BEGIN "
+        "INSERT INTO target_fts (target_fts, rowid, name, country) VALUES ('delete', old.id, old.name, old.country); END",
+        "CREATE TRIGGER IF NOT EXISTS target_fts_update AFTER UPDATE OF name, country ON target BEGIN "
+        "INSERT INTO target_fts (target_fts, rowid, name, country) VALUES ('delete', old.id, old.name, old.country); "
+        "INSERT INTO target_fts (rowid, name, country) VALUES (new.id, new.name, new.country); END",
+        "INSERT INTO note_fts (note_fts) VALUES ('rebuild')",
+        "INSERT INTO target_fts (target_fts) VALUES ('rebuild')",
+    ]),
+]
+
+# Tables created by migrations rather than by the models
+MIGRATION_TABLES = ["note_fts", "target_fts"]
+
+def get_schema_version(engine: Engine) -> int:
+    """Get the schema version of the database."""
+    with engine.connect() as connection:
+        return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+def run_migrations(engine: Engine) -> list[int]:
+    """Apply the pending migrations and return their versions."""
+    if engine.dialect.name != "sqlite":
+        return []
+
+    applied = []
+
+    with engine.begin() as connection:
+        current = connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+        for version, description, statements in MIGRATIONS:
+            if version <= current:
+                continue
+
+            logger.info("Applying migration %d: %s", version, description)
+            for statement in statements:
+                connection.exec_driver_sql(statement)
+            connection.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+            applied.append(version)
+
+    return applied
+
+def reset_migrations(engine: Engine):
+    """Drop the tables created by migrations and mark the schema as unversioned."""
+    if engine.dialect.name != "sqlite":
+        return
+
+    with engine.begin() as connection:
+        for table in MIGRATION_TABLES:
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {table}")
+        connection.exec_driver_sql("PRAGMA user_version = 0")
@@ -1,15 +1,19 @@
 from sqlmodel import SQLModel, Field, Relationship
 from pydantic import BaseModel
 from typing import Optional
+from sqlalchemy import Index
 from sqlalchemy.dialects.sqlite import TEXT
+import time
 import httpx
+from .breeds import breed_registry
+from .metrics import breed_validation
 
 # SpyCat database model
 class SpyCat(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str                = Field(index=True)
     years_of_experience: int = Field(default=0)
-    breed: str               = Field()
+    breed: str               = Field(index=True)
     salary: float            = Field(default=0.0)
 
     missions: list["Mission"] = Relationship(back_populates="cat")
@@ -22,21 +26,31 @@ class SpyCatModel(BaseModel):
     breed: str
     salary: float = 0.0
 
+# Partial update: omitted fields are left unchanged
+class SpyCatModelPatch(BaseModel):
+    name: Optional[str] = None
+    years_of_experience: Optional[int] = None
+    breed: Optional[str] = None
+    salary: Optional[float] = None
+
 class SpyCatsCount(BaseModel):
     spycats: list["SpyCatModel"]
-    all_count: int
+    all_count: Optional[int] = None
+    all_count_exact: bool = False
+    next_cursor: Optional[str] = None
 
 class SpyCatModelRead(SpyCatModel):
     missions: Optional[list["MissionModel"]] = None
 
-async def breed_validate(breed: str) -> bool:
-    async with httpx.AsyncClient() as client:
-        res = await client.get("https://api.thecatapi.com/v1/breeds")
-        
-        if res.status_code != 200:
-            return False
-        
-        return any(b["name"].lower() == breed.lower() for b in res.json())
+async def breed_validate(breed: str, client: Optional[httpx.AsyncClient] = None) -> bool:
+    started = time.perf_counter()
+    valid = await breed_registry.contains(breed, client)
+    breed_validation.observe(time.perf_counter() - started, "valid" if valid else "invalid")
+    return valid
+
+class SpyCatBulkResult(BaseModel):
+    created: list[SpyCatModel]
+    errors: list["BulkItemError"] = []
 
 def spycat_validate(cat: SpyCat) -> bool:
     if not cat.name or not cat.breed:
@@ -45,15 +59,29 @@ def spycat_validate(cat: SpyCat) -> bool:
         return False
     return True
 
+def sets_null(patch: BaseModel, exclude: tuple[str, ...] = ()) -> bool:
+    """Check whether a patch explicitly sets a field to null."""
+    return any(getattr(patch, field) is None for field in patch.model_fields_set if field not in exclude)
+
+def spycat_patch_validate(cat: SpyCatModelPatch) -> bool:
+    if sets_null(cat) or cat.name == "" or cat.breed == "":
+        return False
+    if (cat.years_of_experience or 0) < 0 or (cat.salary or 0) < 0:
+        return False
+    return True
+
 
 # Mission database model
 class Mission(SQLModel, table=True):
+    # Also serves lookups by cat_id alone
+    __table_args__ = (Index("ix_mission_cat_id_is_complete", "cat_id", "is_complete"),)
+
     id: Optional[int]     = Field(default=None, primary_key=True)
     cat_id: Optional[int] = Field(default=None, foreign_key="spycat.id")
     is_complete: bool     = Field(default=False)
 
     cat: Optional[SpyCat]   = Relationship(back_populates="missions")
-    targets: list["Target"] = Relationship(back_populates="mission", cascade_delete=True)
+    targets: list["Target"] = Relationship(back_populates="mission", cascade_delete=True, passive_deletes=True)
 
 # Pydantic model for mission input validation
 class MissionModel(BaseModel):
@@ -61,9 +89,19 @@ class MissionModel(BaseModel):
     cat_id: Optional[int] = None
     is_complete: bool = False
 
+# Partial update: omitted fields are left unchanged, a null cat_id unassigns the cat
+class MissionModelPatch(BaseModel):
+    cat_id: Optional[int] = None
+    is_complete: Optional[bool] = None
+
+def mission_patch_validate(mission: MissionModelPatch) -> bool:
+    return not sets_null(mission, exclude=("cat_id",))
+
 class MissionCount(BaseModel):
     missions: list["MissionModelRead"]
-    all_count: int
+    all_count: Optional[int] = None
+    all_count_exact: bool = False
+    next_cursor: Optional[str] = None
 
 class MissionModelCreate(MissionModel):
     targets: Optional[list["TargetModel"]] = None
@@ -71,17 +109,24 @@ class MissionModelCreate(MissionModel):
 class MissionModelRead(MissionModelCreate):
     cat: Optional[SpyCatModel] = None
 
+class MissionBulkResult(BaseModel):
+    created: list[MissionModelCreate]
+    errors: list["BulkItemError"] = []
+
+class MissionBulkDeleteResult(BaseModel):
+    deleted: int
+
 
 # Target database model
 class Target(SQLModel, table=True):
     id: Optional[int]         = Field(default=None, primary_key=True)
-    mission_id: int = Field(default=None, foreign_key="mission.id", ondelete="CASCADE")
+    mission_id: int = Field(default=None, foreign_key="mission.id", ondelete="CASCADE", index=True)
     name: str                 = Field(index=True)
     country: str              = Field()
     is_complete: bool         = Field(default=False)
 
     mission: Mission           = Relationship(back_populates="targets")
-    notes: list["Note"]        = Relationship(back_populates="target", cascade_delete=True)
+    notes: list["Note"]        = Relationship(back_populates="target", cascade_delete=True, passive_deletes=True)
 
 # Pydantic model for target input validation
 class TargetModel(BaseModel):
@@ -90,21 +135,43 @@ class TargetModel(BaseModel):
     country: str
     is_complete: bool = False
 
+# Partial update: omitted fields are left unchanged
+class TargetModelPatch(BaseModel):
+    name: Optional[str] = None
+    country: Optional[str] = None
+    is_complete: Optional[bool] = None
+
+class TargetModelBulkPatch(TargetModelPatch):
+    id: int
+
 class TargetModelCreate(TargetModel):
     notes: Optional[list["NoteModel"]] = None
 
 class TargetModelRead(TargetModelCreate):
     mission: Optional[MissionModel] = None
 
+class TargetBulkResult(BaseModel):
+    created: list[TargetModelCreate]
+    errors: list["BulkItemError"] = []
+
+class TargetBulkUpdateResult(BaseModel):
+    updated: list[Target]
+    errors: list["BulkItemError"] = []
+
 def target_validate(target: Target) -> bool:
     if not target.name or not target.country:
         return False
     return True
 
+def target_patch_validate(target: TargetModelPatch) -> bool:
+    if sets_null(target) or target.name == "" or target.country == "":
+        return False
+    return True
+
 # Note database model
 class Note(SQLModel, table=True):
     id: Optional[int]        = Field(default=None, primary_key=True)
-    target_id: int           = Field(default=None, foreign_key="target.id", ondelete="CASCADE")
+    target_id: int           = Field(default=None, foreign_key="target.id", ondelete="CASCADE", index=True)
     content: str             = Field(sa_column=TEXT)
 
     target: Target = Relationship(back_populates="notes")
@@ -114,11 +181,71 @@ class NoteModel(BaseModel):
     id: Optional[int] = None
     content: str
 
+# Partial update: omitted fields are left unchanged
+class NoteModelPatch(BaseModel):
+    content: Optional[str] = None
+
 class NoteModelRead(NoteModel):
     target: Optional[TargetModel] = None
     mission: Optional[MissionModel] = None
 
+class NoteBulkResult(BaseModel):
+    created: list[NoteModel]
+    errors: list["BulkItemError"] = []
+
 def note_validate(note: Note) -> bool:
     if not note.content:
         return False
     return True
+
+def note_patch_validate(note: NoteModelPatch) -> bool:
+    if sets_null(note) or note.content == "":
+        return False
+    return True
+
+
+# Per-item error reported by the bulk create endpoints
+class BulkItemError(BaseModel):
+    index: int
+    detail: str
+
+# Mission, target and note counts for the dashboard
+class CompletionStats(BaseModel):
+    missions: int = 0
+    missions_complete: int = 0
+    targets: int = 0
+    targets_complete: int = 0
+    notes: int = 0
+    notes_per_target: float = 0.0
+
+class SpyCatStats(CompletionStats):
+    cat_id: int
+    name: str
+
+class Stats(BaseModel):
+    overall: CompletionStats
+    unassigned: CompletionStats
+    cats: list[SpyCatStats]
+
+
+# Full-text search results
+class SearchResult(BaseModel):
+    type: str
+    id: int
+    rank: float
+    snippet: str
+
+class SearchResults(BaseModel):
+    results: list[SearchResult]
+    next_skip: Optional[int] = None
+
+
+# Summary of an NDJSON import run
+class ImportResult(BaseModel):
+    imported: dict[str, int] = {}
+    skipped: int = 0
+    errors: list[BulkItemError] = []
+    checkpoint: int = 0
+    elapsed: float = 0.0
+    rows_per_second: float = 0.0
+    aborted: Optional[str] = None
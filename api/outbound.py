@@ -0,0 +1,42 @@
+from typing import Optional
+import httpx
+from . import config
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_client: Optional[httpx.AsyncClient] = None
+
+def create_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Create a pooled HTTP client for outbound calls."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(config.HTTP_TIMEOUT, connect=config.HTTP_CONNECT_TIMEOUT),
+        http2=config.HTTP2 and HTTP2_AVAILABLE,
+        transport=transport,
+    )
+
+def open_http_client() -> httpx.AsyncClient:
+    """Create the application-wide HTTP client if it does not exist yet."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+async def close_http_client():
+    """Close the application-wide HTTP client."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the application-wide HTTP client."""
+    return open_http_client()
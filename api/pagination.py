@@ -0,0 +1,28 @@
+import base64
+import binascii
+import json
+from typing import Any
+from fastapi import HTTPException
+
+def encode_cursor(order_by: str, value: Any, last_id: int) -> str:
+    """Encode the position after the last row of a page as an opaque cursor."""
+    raw = json.dumps([order_by, value, last_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, order_by: str) -> tuple[Any, int]:
+    """Decode a cursor produced by encode_cursor for the given sort key."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if key != order_by:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested ordering")
+
+    # Only scalars can be compared with the sort columns
+    if isinstance(last_id, bool) or not isinstance(last_id, int) or \
+            (value is not None and not isinstance(value, (str, int, float))):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return value, last_id
@@ -0,0 +1,266 @@
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional, TypeVar
+from .metrics import RequestStats, request_stats, route_name
+from . import config
+
+T = TypeVar("T")
+
+# Number of functions kept in the summary of a saved profile
+TOP_FUNCTIONS = 40
+
+_PROFILE_ID = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+
+class ProfileCapture:
+    """cProfile data of one request, collected from every thread that worked on it."""
+
+    def __init__(self):
+        self._profiles: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """Start a profiler on the current thread."""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active, e.g. one that already covers every thread
+            return None
+        return profiler
+
+    def stop(self, profiler: Optional[cProfile.Profile]):
+        """Stop a profiler started with start() and keep its data."""
+        if profiler is None:
+            return
+        profiler.disable()
+        with self._lock:
+            self._profiles.append(profiler)
+
+    def call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run fn under a profiler on the current thread."""
+        profiler = self.start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.stop(profiler)
+
+    def stats(self) -> Optional[pstats.Stats]:
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+# Capture of the request being profiled, if any; database workers pick it up
+# through the context the executor copies into them
+active_profile: ContextVar[Optional[ProfileCapture]] = ContextVar("sca_active_profile", default=None)
+
+def summarize_stats(stats: pstats.Stats, limit: int = TOP_FUNCTIONS) -> list[dict]:
+    """Get the functions with the highest cumulative time."""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            "function": f"{filename}:{line}({name})",
+            "calls": calls,
+            "total_ms": 1000 * total_time,
+            "cumulative_ms": 1000 * cumulative_time,
+        }
+        for (filename, line, name), (_, calls, total_time, cumulative_time, _) in rows
+    ]
+
+class ProfileStore:
+    """Bounded on-disk ring buffer of captured profiles.
+
+    Each profile is a JSON summary plus the raw pstats dump, which can be
+    opened with pstats or snakeviz. Only the newest max_entries are kept.
+    """
+
+    def __init__(self, directory: str = config.PROFILE_DIR, max_entries: int = config.PROFILE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def _ids(self) -> list[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith(".json") and _PROFILE_ID.match(name[:-5]))
+
+    def save(self, entry: dict, stats: Optional[pstats.Stats]) -> str:
+        """Write a profile and drop the oldest ones beyond max_entries."""
+        profile_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        entry = {"id": profile_id, **entry, "functions": summarize_stats(stats) if stats else []}
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if stats:
+                stats.dump_stats(self._path(profile_id, "prof"))
+
+            tmp_path = self._path(profile_id, "json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, indent=2, default=str)
+            os.replace(tmp_path, self._path(profile_id, "json"))
+
+            for old_id in self._ids()[:-self.max_entries or None]:
+                for extension in ("json", "prof"):
+                    try:
+                        os.remove(self._path(old_id, extension))
+                    except FileNotFoundError:
+                        pass
+
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        """Get a saved profile, or None if it does not exist."""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id, "json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def pstats_path(self, profile_id: str) -> Optional[str]:
+        """Get the path of a saved pstats dump, or None if it does not exist."""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = self._path(profile_id, "prof")
+        return path if os.path.exists(path) else None
+
+    def list(self) -> list[dict]:
+        """List the saved profiles, newest first, without their SQL and function details."""
+        entries = []
+        for profile_id in reversed(self._ids()):
+            entry = self.get(profile_id)
+            if entry is not None:
+                entries.append({key: value for key, value in entry.items() if key not in ("sql", "functions")})
+        return entries
+
+class RequestProfiler:
+    """Decides which requests are profiled and saves the slow ones."""
+
+    def __init__(
+        self,
+        store: ProfileStore,
+        enabled: bool = config.PROFILING,
+        header: str = config.PROFILE_HEADER,
+        sample_rate: float = config.PROFILE_SAMPLE_RATE,
+        threshold_ms: float = config.PROFILE_THRESHOLD_MS
+    ):
+        self.store = store
+        self.enabled = enabled
+        self.header = header
+        self.sample_rate = sample_rate
+        self.threshold_ms = threshold_ms
+        # cProfile on the event loop thread can only follow one request at a time
+        self._busy = threading.Lock()
+
+    def trigger(self, scope: dict) -> Optional[str]:
+        """Get why a request should be profiled, or None if it should not."""
+        if not self.enabled:
+            return None
+
+        header = self.header.lower().encode()
+        if any(name == header and value not in (b"", b"0") for name, value in scope["headers"]):
+            return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def acquire(self) -> bool:
+        return self._busy.acquire(blocking=False)
+
+    def release(self):
+        self._busy.release()
+
+def build_entry(scope: dict, trigger: str, status: int, elapsed: float, stats: RequestStats) -> dict:
+    """Describe a profiled request and its SQL statement log."""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "method": scope["method"],
+        "path": scope["path"],
+        "query_string": scope.get("query_string", b"").decode("latin-1"),
+        "route": route_name(scope),
+        "status": status,
+        "trigger": trigger,
+        "elapsed_ms": 1000 * elapsed,
+        "queries": stats.queries,
+        "query_ms": 1000 * stats.query_seconds,
+        "sql": [
+            {"statement": statement, "parameters": repr(parameters)[:500], "ms": 1000 * seconds}
+            for statement, parameters, seconds in stats.statements or []
+        ],
+    }
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles opted-in requests and keeps the slow ones.
+
+    The event loop thread is profiled for the whole request, so coroutines of
+    other requests running meanwhile show up too; database calls on executor
+    threads are profiled separately and merged in.
+    """
+
+    def __init__(self, app, profiler: Optional["RequestProfiler"] = None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler or request_profiler
+        trigger = profiler.trigger(scope) if scope["type"] == "http" else None
+        if trigger is None or not profiler.acquire():
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = request_stats.get()
+        stats_token = None
+        if stats is None:
+            stats = RequestStats()
+            stats_token = request_stats.set(stats)
+        stats.statements = []
+
+        capture = ProfileCapture()
+        capture_token = active_profile.set(capture)
+        started = time.perf_counter()
+        loop_profiler = capture.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            capture.stop(loop_profiler)
+            elapsed = time.perf_counter() - started
+            active_profile.reset(capture_token)
+            if stats_token is not None:
+                request_stats.reset(stats_token)
+            profiler.release()
+
+        if 1000 * elapsed >= profiler.threshold_ms:
+            entry = build_entry(scope, trigger, status, elapsed, stats)
+            await asyncio.to_thread(profiler.store.save, entry, capture.stats())
+
+profile_store = ProfileStore()
+request_profiler = RequestProfiler(profile_store)
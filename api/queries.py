@@ -0,0 +1,10 @@
+from sqlalchemy.orm import joinedload
+from .models import Target, Note
+
+# Loader options for the write paths that need an object's parents. Many-to-one
+# parents are joined into the main query, so loading them costs no extra
+# statement. The read paths select column values instead, see crud.read_*.
+
+TARGET_MISSION = (joinedload(Target.mission),)
+
+NOTE_DETAIL = (joinedload(Note.target).joinedload(Target.mission),)
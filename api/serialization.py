@@ -0,0 +1,44 @@
+from functools import lru_cache
+from typing import Any
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from pydantic_core import to_json, to_jsonable_python
+
+try:
+    import orjson
+except ImportError:
+    # Optional speedup; pydantic-core's encoder produces the same compact JSON
+    orjson = None
+
+def dumps(data: Any) -> bytes:
+    """Encode plain data (dicts, lists and scalars) as compact JSON.
+
+    Read paths build their responses from column values in the field order of
+    the response models, so they can be encoded directly without validating
+    them against the models first. Anything orjson does not know, such as a
+    Pydantic model, is converted the way Pydantic would.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=to_jsonable_python, option=orjson.OPT_NON_STR_KEYS)
+    return to_json(data)
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with dumps()."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+@lru_cache(maxsize=None)
+def type_adapter(tp: Any) -> TypeAdapter:
+    """Get a reusable TypeAdapter for a response type."""
+    return TypeAdapter(tp)
+
+def encode_response(tp: Any, data: Any) -> bytes:
+    """Validate data (dicts or ORM objects) against a response type and encode it as JSON."""
+    adapter = type_adapter(tp)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+
+def compact_json(tp: Any, payload: bytes) -> bytes:
+    """Re-encode a JSON payload of a response type without null fields and fields at their default."""
+    adapter = type_adapter(tp)
+    return adapter.dump_json(adapter.validate_json(payload), exclude_none=True, exclude_defaults=True)
@@ -1,42 +1,127 @@
+import os
+import asyncio
+import base64
+import threading
+import time
+import json
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from ..main import app
-from sqlmodel import Session, create_engine, SQLModel
-from ..database import get_session
+from .. import database
+from sqlmodel import Session, select
+from sqlalchemy.pool import NullPool
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import IntegrityError
+from ..database import get_session, get_db, get_engine, drop_db_and_tables, SessionRunner, create_db_engine, create_async_db_engine, \
+    create_session_factory, create_async_session_factory, \
+    sqlite_pragmas, create_db_and_tables, db_executor
+from ..migrations import MIGRATIONS, run_migrations, get_schema_version
+from ..breeds import BreedRegistry, breed_registry
+from ..outbound import get_http_client
+from ..counts import RowCountCache
+from ..cache import ResponseCache, response_cache
+from ..models import Mission, SpyCat, Target, Note, \
+    TargetModelPatch, SpyCatModelRead, SpyCatsCount, MissionModelRead, MissionCount, TargetModelRead, NoteModelRead
+from .. import serialization, compression, config, crud, etags
+from ..executor import DatabaseExecutor, engine_pool_capacity, executor_workers
+from ..profiling import ProfileStore, request_profiler
+from ..benchmark import SeedSize, run_benchmark, main as benchmark_main
+from ..importer import import_ndjson, main as import_main
 import httpx
 
 
 TEST_DATABASE_URL = "sqlite:///./test_sca.db"
 
-TEST_ENGINE = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False}, echo=False)
+TEST_ENGINE = create_db_engine(TEST_DATABASE_URL)
+
+TEST_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./test_sca.db"
+
+# TestClient runs each request on its own event loop, so async connections are not pooled
+TEST_ASYNC_ENGINE = create_async_db_engine(TEST_ASYNC_DATABASE_URL, poolclass=NullPool)
+
+TEST_SESSION_FACTORY = create_session_factory(TEST_ENGINE)
+TEST_ASYNC_SESSION_FACTORY = create_async_session_factory(TEST_ASYNC_ENGINE)
 
 def get_test_session():
     """Get a test database session."""
-    with Session(TEST_ENGINE) as session:
+    with TEST_SESSION_FACTORY() as session:
         yield session
 
+# Serve TheCatAPI from the bundled snapshot so test runs never touch the network
+BREED_SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), "breeds.json")
+
+with open(BREED_SNAPSHOT_PATH, encoding="utf-8") as f:
+    BREEDS = json.load(f)["breeds"]
+
+upstream_calls = []
+
+def mock_upstream(request: httpx.Request) -> httpx.Response:
+    """Mock transport handler for outbound HTTP calls."""
+    upstream_calls.append(request)
+
+    if request.url.path == "/v1/breeds":
+        return httpx.Response(200, json=[{"name": name} for name in BREEDS])
+
+    return httpx.Response(404)
+
+TEST_HTTP_CLIENT = httpx.AsyncClient(transport=httpx.MockTransport(mock_upstream))
+
+def get_test_http_client():
+    """Get the mocked outbound HTTP client."""
+    return TEST_HTTP_CLIENT
+
+async def get_test_async_db():
+    """Get a session runner backed by an async test database session."""
+    async with TEST_ASYNC_SESSION_FACTORY() as session:
+        yield SessionRunner(session)
+
 app.dependency_overrides[get_session] = get_test_session
+app.dependency_overrides[get_engine] = lambda: TEST_ENGINE
+app.dependency_overrides[get_http_client] = get_test_http_client
+
+breed_registry.snapshot_path = None
 
 client = TestClient(app)
 
 async def get_breeds():
-    """Fetch cat breeds from the external API."""
-    async with httpx.AsyncClient() as client:
-        res = await client.get("https://api.thecatapi.com/v1/breeds")
+    """Fetch cat breeds from the (mocked) external API."""
+    res = await TEST_HTTP_CLIENT.get("https://api.thecatapi.com/v1/breeds")
+
+    if res.status_code == 200:
+        return [breed["name"] for breed in res.json()]
+
+    return []
+
+class QueryCounter:
+    """Count the SQL statements executed on an engine."""
 
-        if res.status_code == 200:
-            return [breed["name"] for breed in res.json()]
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
 
-        return []
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
 
 @pytest.fixture(scope="module", autouse=True)
 def setup_database():
     """Set up the test database before running tests."""
-    SQLModel.metadata.create_all(TEST_ENGINE)
+    create_db_and_tables(TEST_ENGINE)
     
     yield
 
-    SQLModel.metadata.drop_all(TEST_ENGINE)
+    drop_db_and_tables(TEST_ENGINE)
 
 
 def test_spycat_create():
@@ -193,6 +278,161 @@ def test_spycat_invalid_breed():
     assert response.status_code == 400
     assert response.json() == {"detail": "Invalid breed"}
 
+@pytest.mark.asyncio
+async def test_breed_registry_snapshot(tmp_path):
+    """Test loading the breed registry from an on-disk snapshot."""
+    snapshot_path = tmp_path / "breeds.json"
+    snapshot_path.write_text(json.dumps({"fetched_at": 0.0, "breeds": ["Siamese", "Maine Coon"]}))
+
+    registry = BreedRegistry(snapshot_path=str(snapshot_path), offline=True)
+    await registry.start(TEST_HTTP_CLIENT)
+
+    assert registry.loaded
+    assert await registry.contains("siamese")
+    assert await registry.contains("  MAINE COON ")
+    assert not await registry.contains("InvalidBreed")
+
+    await registry.stop()
+
+@pytest.mark.asyncio
+async def test_breed_registry_stale_while_revalidate(tmp_path):
+    """Test that a failed refresh keeps serving the stale breed set."""
+    registry = BreedRegistry(snapshot_path=str(tmp_path / "breeds.json"), ttl=0, offline=False)
+
+    async def fetch_ok(client):
+        return ["Siamese"]
+
+    async def fetch_fail(client):
+        raise httpx.ConnectError("upstream unavailable")
+
+    registry.fetch = fetch_ok
+    assert await registry.refresh(TEST_HTTP_CLIENT)
+    assert os.path.exists(tmp_path / "breeds.json")
+
+    registry.fetch = fetch_fail
+    assert not await registry.refresh(TEST_HTTP_CLIENT)
+    assert registry.stale
+    assert await registry.contains("Siamese", TEST_HTTP_CLIENT)
+
+    cold_registry = BreedRegistry(snapshot_path=str(tmp_path / "breeds.json"), offline=True)
+    assert await cold_registry.contains("Siamese")
+
+    await registry.stop()
+
+def test_breed_validate_reuses_registry():
+    """Test that spy cat writes validate breeds without calling upstream each time."""
+    obj_data = {
+        "name": "Pooled",
+        "years_of_experience": 1,
+        "breed": "Bengal",
+        "salary": 1000.0
+    }
+
+    calls_before = len(upstream_calls)
+    for _ in range(3):
+        response = client.post("/spycat/", json=obj_data)
+        assert response.status_code == 200
+
+    assert len(upstream_calls) == calls_before
+
+def test_spycat_cursor_pagination():
+    """Test walking spy cats page by page with a cursor ordered by name."""
+    for name in ["Cursor-C", "Cursor-A", "Cursor-B", "Cursor-A"]:
+        obj_data = {
+            "name": name,
+            "years_of_experience": 1,
+            "breed": "Siamese",
+            "salary": 100.0
+        }
+        response = client.post("/spycat/", json=obj_data)
+        assert response.status_code == 200
+
+    response = client.get("/spycat/", params={"limit": 1000, "order_by": "name"})
+    assert response.status_code == 200
+    expected = [(cat["name"], cat["id"]) for cat in response.json()["spycats"]]
+    assert expected == sorted(expected)
+
+    seen = []
+    params = {"limit": 2, "order_by": "name"}
+    while True:
+        response = client.get("/spycat/", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        seen.extend((cat["name"], cat["id"]) for cat in data["spycats"])
+        if not data["next_cursor"]:
+            break
+        params["cursor"] = data["next_cursor"]
+
+    assert seen == expected
+
+    response = client.get("/spycat/", params={"cursor": data["next_cursor"] or "bogus", "order_by": "id"})
+    assert response.status_code == 400
+
+    # Well-formed cursors with non-scalar values are rejected too
+    for value, last_id in [({"a": 1}, 1), (["x"], 1), ("Cursor-A", "1"), ("Cursor-A", [1]), ("Cursor-A", True)]:
+        raw = json.dumps(["name", value, last_id]).encode()
+        cursor = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+        response = client.get("/spycat/", params={"cursor": cursor, "order_by": "name"})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+
+def test_database_diagnostics():
+    """Test that the SQLite production profile is applied to connections."""
+    response = client.get("/diagnostics/database")
+    assert response.status_code == 200
+    data = response.json()
+
+    assert data["profile"] == "production"
+    assert data["pragmas"]["journal_mode"] == "WAL"
+    assert data["effective"]["journal_mode"] == "wal"
+    assert data["effective"]["synchronous"] == 1  # NORMAL
+    assert data["effective"]["busy_timeout"] == 5000
+    assert data["effective"]["temp_store"] == 2  # MEMORY
+
+def test_sqlite_pragma_overrides():
+    """Test that PRAGMA overrides are merged into the profile and validated."""
+    assert sqlite_pragmas("default", {}) == {}
+    assert sqlite_pragmas("production", {"synchronous": "FULL"})["synchronous"] == "FULL"
+
+    with pytest.raises(ValueError):
+        sqlite_pragmas("production", {"synchronous": "OFF; DROP TABLE spycat"})
+
+    with pytest.raises(ValueError):
+        sqlite_pragmas("unknown", {})
+
+def test_migrations_add_indexes_to_existing_database(tmp_path):
+    """Test that migrations upgrade a database created before the foreign key indexes existed."""
+    legacy_engine = create_db_engine(f"sqlite:///{tmp_path / 'legacy.db'}", profile="default")
+    with legacy_engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE spycat (id INTEGER PRIMARY KEY, name VARCHAR, "
+                                   "years_of_experience INTEGER, breed VARCHAR, salary FLOAT)")
+        connection.exec_driver_sql("CREATE TABLE mission (id INTEGER PRIMARY KEY, cat_id INTEGER "
+                                   "REFERENCES spycat (id), is_complete BOOLEAN)")
+        connection.exec_driver_sql("CREATE TABLE target (id INTEGER PRIMARY KEY, mission_id INTEGER "
+                                   "REFERENCES mission (id) ON DELETE CASCADE, name VARCHAR, country VARCHAR, "
+                                   "is_complete BOOLEAN)")
+        connection.exec_driver_sql("CREATE TABLE note (id INTEGER PRIMARY KEY, target_id INTEGER "
+                                   "REFERENCES target (id) ON DELETE CASCADE, content TEXT)")
+
+    create_db_and_tables(legacy_engine)
+    assert get_schema_version(legacy_engine) == MIGRATIONS[-1][0]
+    assert run_migrations(legacy_engine) == []
+
+    with legacy_engine.connect() as connection:
+        indexes = {
+            row[1]
+            for table in ("mission", "target", "note")
+            for row in connection.exec_driver_sql(f"PRAGMA index_list({table})")
+        }
+        plan = connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM target WHERE mission_id = 1"
+        ).all()
+
+    assert {"ix_mission_cat_id_is_complete", "ix_target_mission_id", "ix_note_target_id"} <= indexes
+    assert "ix_target_mission_id" in plan[0][-1]
+
+    legacy_engine.dispose()
+
 
 def test_mission_create():
     """Test creating a new mission."""
@@ -274,6 +514,92 @@ def test_mission_read_all():
         assert mission["cat"] is not None
         assert mission["cat"]["id"] == obj_data["cat_id"]
 
+def test_mission_cursor_pagination():
+    """Test that cursor pagination returns the same missions as offset pagination."""
+    for _ in range(5):
+        response = client.post("/mission/", json={"is_complete": False})
+        assert response.status_code == 200
+
+    response = client.get("/mission/", params={"limit": 0})
+    assert response.status_code == 200
+    expected = [mission["id"] for mission in response.json()["missions"]]
+
+    seen = []
+    params = {"limit": 3}
+    while True:
+        response = client.get("/mission/", params=params)
+        assert response.status_code == 200
+        data = response.json()
+        seen.extend(mission["id"] for mission in data["missions"])
+        if not data["next_cursor"]:
+            break
+        params["cursor"] = data["next_cursor"]
+
+    assert seen == expected
+
+    response = client.get("/mission/", params={"skip": 3, "cursor": "eyJ4Ijox"})
+    assert response.status_code == 400
+
+def test_list_count_options():
+    """Test opting out of the list count and accepting an estimate."""
+    response = client.get("/mission/", params={"include_count": False})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["all_count"] is None
+    assert data["all_count_exact"] is False
+
+    response = client.get("/mission/")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["all_count_exact"] is True
+    all_count = data["all_count"]
+
+    response = client.post("/mission/", json={"is_complete": False})
+    assert response.status_code == 200
+    mission_id = response.json()["id"]
+
+    response = client.get("/mission/")
+    assert response.json()["all_count"] == all_count + 1
+
+    response = client.delete(f"/mission/{mission_id}")
+    assert response.status_code == 200
+
+    response = client.get("/mission/", params={"count": "estimate"})
+    data = response.json()
+    assert data["all_count"] == all_count
+
+def test_row_count_cache_estimate():
+    """Test that invalidated row counts are only served as estimates."""
+    cache = RowCountCache(ttl=60, estimate_ttl=60)
+
+    with Session(TEST_ENGINE) as session:
+        count, exact = cache.get(session, Mission)
+        assert exact
+
+        cache.invalidate(Mission)
+        assert cache.get(session, Mission, allow_estimate=True) == (count, False)
+        assert cache.get(session, Mission) == (count, True)
+
+        cache.adjust(Mission, 2)
+        assert cache.get(session, Mission) == (count + 2, True)
+
+    # A write adjusted for while a COUNT runs keeps that COUNT out of the cache
+    cache = RowCountCache(ttl=60, estimate_ttl=60)
+
+    class RacingSession(Session):
+        def exec(self, statement, **kwargs):
+            result = super().exec(statement, **kwargs)
+            cache.adjust(Mission, 1)
+            return result
+
+    with RacingSession(TEST_ENGINE) as session:
+        assert cache.get(session, Mission) == (count, True)
+    with Session(TEST_ENGINE) as session, QueryCounter(TEST_ENGINE) as counter:
+        assert cache.get(session, Mission) == (count, True)
+        assert counter.count == 1
+        assert cache.get(session, Mission) == (count, True)
+        assert counter.count == 1
+
 def test_mission_update():
     """Test updating a mission by ID."""
     
@@ -832,3 +1158,1172 @@ def test_note_cascade_mission_delete():
 
     response = client.get(f"/target/{target_id}/note/")
     assert response.status_code == 404  # Notes should be deleted with the mission
+
+
+def test_async_session_path():
+    """Test the CRUD endpoints on the async database session path."""
+    app.dependency_overrides[get_db] = get_test_async_db
+    try:
+        cat_data = {
+            "name": "Async",
+            "years_of_experience": 2,
+            "breed": "Sphynx",
+            "salary": 2000.0
+        }
+        response = client.post("/spycat/", json=cat_data)
+        assert response.status_code == 200
+        spycat_id = response.json()["id"]
+
+        mission_data = {
+            "cat_id": spycat_id,
+            "is_complete": False,
+            "targets": [
+                {"name": "AsyncTarget", "country": "Country1", "is_complete": False}
+            ]
+        }
+        response = client.post("/mission/", json=mission_data)
+        assert response.status_code == 200
+        mission_id = response.json()["id"]
+
+        response = client.get(f"/mission/{mission_id}")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["cat"]["id"] == spycat_id
+        target_id = data["targets"][0]["id"]
+
+        response = client.post(f"/target/{target_id}/note/", json={"content": "Async note"})
+        assert response.status_code == 200
+        note_id = response.json()["id"]
+
+        response = client.put(f"/note/{note_id}", json={"content": "Updated async note"})
+        assert response.status_code == 200
+
+        response = client.get(f"/note/{note_id}")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["content"] == "Updated async note"
+        assert data["target"]["id"] == target_id
+        assert data["mission"]["id"] == mission_id
+
+        response = client.get(f"/spycat/{spycat_id}")
+        assert response.status_code == 200
+        assert response.json()["missions"][0]["id"] == mission_id
+
+        response = client.put(f"/spycat/{spycat_id}", json={**cat_data, "breed": "Invalid"})
+        assert response.status_code == 400
+
+        response = client.get("/mission/")
+        assert response.status_code == 200
+        assert response.json()["all_count"] >= 1
+
+        response = client.delete(f"/target/{target_id}")
+        assert response.status_code == 200
+
+        response = client.get(f"/note/{note_id}")
+        assert response.status_code == 404
+    finally:
+        del app.dependency_overrides[get_db]
+
+def test_read_query_counts():
+    """Test that read endpoints issue a fixed number of SQL statements."""
+    cat_data = {
+        "name": "Counter",
+        "years_of_experience": 3,
+        "breed": "Bombay",
+        "salary": 3000.0
+    }
+    response = client.post("/spycat/", json=cat_data)
+    assert response.status_code == 200
+    spycat_id = response.json()["id"]
+
+    for _ in range(12):
+        mission_data = {
+            "cat_id": spycat_id,
+            "is_complete": False,
+            "targets": [
+                {"name": f"Target{i}", "country": "Country", "is_complete": False}
+                for i in range(3)
+            ]
+        }
+        response = client.post("/mission/", json=mission_data)
+        assert response.status_code == 200
+    mission_id = response.json()["id"]
+
+    response = client.get(f"/mission/{mission_id}")
+    target_id = response.json()["targets"][0]["id"]
+    for i in range(3):
+        response = client.post(f"/target/{target_id}/note/", json={"content": f"Note{i}"})
+        assert response.status_code == 200
+    note_id = response.json()["id"]
+
+    # Warm up the row count cache
+    client.get("/mission/", params={"limit": 1})
+
+    with QueryCounter(TEST_ENGINE) as small_page:
+        response = client.get("/mission/", params={"limit": 2})
+        assert response.status_code == 200
+
+    with QueryCounter(TEST_ENGINE) as large_page:
+        response = client.get("/mission/", params={"limit": 12})
+        assert response.status_code == 200
+        assert len(response.json()["missions"]) == 12
+
+    assert large_page.count == small_page.count == 1
+
+    for url, expected in [
+        (f"/spycat/{spycat_id}", 1),
+        (f"/mission/{mission_id}", 1),
+        (f"/target/{target_id}", 1),
+        (f"/note/{note_id}", 1),
+        (f"/target/{target_id}/note/", 1),
+    ]:
+        with QueryCounter(TEST_ENGINE) as counter:
+            response = client.get(url)
+            assert response.status_code == 200
+        assert counter.count == expected, (url, counter.statements)
+
+def test_bulk_create_spycats():
+    """Test creating many spy cats in one request with per-item errors."""
+    items = [
+        {"name": "Bulk1", "years_of_experience": 1, "breed": "Siamese", "salary": 100.0},
+        {"name": "Bulk2", "years_of_experience": 2, "breed": "InvalidBreed", "salary": 200.0},
+        {"name": "Bulk3", "years_of_experience": -1, "breed": "Persian", "salary": 300.0},
+        {"name": "Bulk4", "years_of_experience": 4, "breed": "persian", "salary": 400.0},
+    ]
+
+    response = client.post("/spycat/bulk", json=items, params={"atomic": True})
+    assert response.status_code == 400
+
+    response = client.post("/spycat/bulk", json=items)
+    assert response.status_code == 200
+    data = response.json()
+
+    assert [cat["name"] for cat in data["created"]] == ["Bulk1", "Bulk4"]
+    assert all(cat["id"] for cat in data["created"])
+    assert data["errors"] == [
+        {"index": 1, "detail": "Invalid breed"},
+        {"index": 2, "detail": "Invalid SpyCat data"},
+    ]
+
+    response = client.get(f"/spycat/{data['created'][1]['id']}")
+    assert response.status_code == 200
+    assert response.json()["salary"] == 400.0
+
+def test_bulk_create_missions_targets_notes():
+    """Test bulk creating missions, targets and notes in single transactions."""
+    missions = [
+        {"cat_id": 1, "is_complete": False, "targets": [
+            {"name": "BulkTarget1", "country": "Country1"},
+            {"name": "BulkTarget2", "country": "Country2"},
+        ]},
+        {"cat_id": 99999, "is_complete": False},
+        {"is_complete": False, "targets": [{"name": "", "country": "Country3"}]},
+        {"is_complete": False},
+    ]
+
+    with QueryCounter(TEST_ENGINE) as counter:
+        response = client.post("/mission/bulk", json=missions)
+    assert response.status_code == 200
+    data = response.json()
+
+    assert len(data["created"]) == 2
+    assert [target["name"] for target in data["created"][0]["targets"]] == ["BulkTarget1", "BulkTarget2"]
+    assert data["created"][1]["targets"] == []
+    assert [error["index"] for error in data["errors"]] == [1, 2]
+    # SQLite can only match RETURNING rows to their parameters one row per INSERT
+    assert len([s for s in counter.statements if s.startswith("INSERT")]) == 4
+
+    mission_id = data["created"][0]["id"]
+    response = client.get(f"/mission/{mission_id}")
+    assert len(response.json()["targets"]) == 2
+
+    targets = [
+        {"name": f"BulkTarget{i}", "country": "Country", "notes": [{"content": "a"}, {"content": "b"}]}
+        for i in range(3)
+    ]
+    response = client.post(f"/mission/{mission_id}/target/bulk", json=targets)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["created"]) == 3
+    assert all(len(target["notes"]) == 2 for target in data["created"])
+
+    target_id = data["created"][0]["id"]
+    response = client.post(f"/target/{target_id}/note/bulk", json=[{"content": "c"}, {"content": ""}])
+    assert response.status_code == 200
+    data = response.json()
+    assert [note["content"] for note in data["created"]] == ["c"]
+    assert data["errors"] == [{"index": 1, "detail": "Invalid Note data"}]
+
+    response = client.get(f"/target/{target_id}/note/")
+    assert [note["content"] for note in response.json()] == ["a", "b", "c"]
+
+    response = client.post("/mission/99999/target/bulk", json=targets)
+    assert response.status_code == 404
+
+def test_response_cache_invalidation():
+    """Test that detail responses are cached and invalidated by related writes."""
+    response = client.post("/mission/", json={
+        "cat_id": 1,
+        "is_complete": False,
+        "targets": [{"name": "CachedTarget", "country": "Country1"}]
+    })
+    assert response.status_code == 200
+    mission_id = response.json()["id"]
+
+    response = client.get(f"/mission/{mission_id}")
+    target_id = response.json()["targets"][0]["id"]
+
+    response = client.post(f"/target/{target_id}/note/", json={"content": "Cached note"})
+    note_id = response.json()["id"]
+
+    stats = response_cache.stats()
+    for url in [f"/note/{note_id}", f"/target/{target_id}", f"/mission/{mission_id}", "/spycat/1"]:
+        assert client.get(url).status_code == 200
+        with QueryCounter(TEST_ENGINE) as counter:
+            assert client.get(url).status_code == 200
+        assert counter.count == 0
+
+    data = client.get("/diagnostics/cache").json()["responses"]
+    assert data["hits"] == stats["hits"] + 4
+    assert data["misses"] == stats["misses"] + 4
+
+    # A note edit invalidates the note and the target that embeds it
+    response = client.put(f"/note/{note_id}", json={"content": "Edited note"})
+    assert response.status_code == 200
+    assert client.get(f"/note/{note_id}").json()["content"] == "Edited note"
+    assert client.get(f"/target/{target_id}").json()["notes"][0]["content"] == "Edited note"
+
+    # A target edit invalidates the mission listing it and the notes embedding it
+    response = client.put(f"/target/{target_id}", json={"name": "Renamed", "country": "Country1"})
+    assert response.status_code == 200
+    assert client.get(f"/mission/{mission_id}").json()["targets"][0]["name"] == "Renamed"
+    assert client.get(f"/note/{note_id}").json()["target"]["name"] == "Renamed"
+
+    # A mission edit invalidates the cat listing it
+    response = client.put(f"/mission/{mission_id}", json={"cat_id": 1, "is_complete": True})
+    assert response.status_code == 200
+    missions = client.get("/spycat/1").json()["missions"]
+    assert next(m for m in missions if m["id"] == mission_id)["is_complete"] is True
+    assert client.get(f"/target/{target_id}").json()["mission"]["is_complete"] is True
+
+    # Deleting the target drops its cached notes
+    response = client.delete(f"/target/{target_id}")
+    assert response.status_code == 200
+    assert client.get(f"/note/{note_id}").status_code == 404
+    assert client.get(f"/mission/{mission_id}").json()["targets"] == []
+
+def test_response_cache_lru_and_races():
+    """Test LRU eviction, TTL expiry and that loads racing with writes are not stored."""
+    cache = ResponseCache(max_size=2, ttl=60)
+
+    cache.set(("note", 1), b"1", [("note", 1)])
+    cache.set(("note", 2), b"2", [("note", 2)])
+    assert cache.get(("note", 1)) == b"1"
+    cache.set(("note", 3), b"3", [("note", 3)])
+
+    assert cache.get(("note", 2)) is None
+    assert cache.get(("note", 1)) == b"1"
+    assert cache.stats()["evictions"] == 1
+
+    generation = cache.generation()
+    cache.invalidate(("target", 7))
+    cache.set(("note", 4), b"4", [("note", 4), ("target", 7)], generation)
+    assert cache.get(("note", 4)) is None
+
+    expired = ResponseCache(max_size=2, ttl=0)
+    expired.set(("note", 1), b"1", [("note", 1)])
+    assert expired.get(("note", 1)) is None
+
+def test_etag_conditional_requests():
+    """Test If-None-Match on reads and If-Match on writes."""
+    response = client.post("/mission/", json={
+        "is_complete": False,
+        "targets": [{"name": "EtagTarget", "country": "Country1"}]
+    })
+    mission_id = response.json()["id"]
+
+    response = client.get(f"/mission/{mission_id}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    target_id = response.json()["targets"][0]["id"]
+
+    with QueryCounter(TEST_ENGINE) as counter:
+        response = client.get(f"/mission/{mission_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert counter.count == 0
+
+    response = client.get(f"/mission/{mission_id}", headers={"If-None-Match": f'W/{etag}, "other"'})
+    assert response.status_code == 304
+
+    for url in ["/mission/", "/spycat/", f"/mission/{mission_id}/target/", f"/target/{target_id}/note/"]:
+        response = client.get(url)
+        assert response.status_code == 200
+        response = client.get(url, headers={"If-None-Match": response.headers["ETag"]})
+        assert response.status_code == 304
+
+    response = client.put(f"/target/{target_id}", headers={"If-Match": etag},
+                          json={"name": "EtagTarget", "country": "Country1"})
+    assert response.status_code == 412
+
+    target_etag = client.get(f"/target/{target_id}").headers["ETag"]
+    response = client.put(f"/target/{target_id}", headers={"If-Match": target_etag},
+                          json={"name": "Renamed", "country": "Country1"})
+    assert response.status_code == 200
+
+    # The first editor's ETag is now stale
+    response = client.put(f"/target/{target_id}", headers={"If-Match": target_etag},
+                          json={"name": "Clobbered", "country": "Country1"})
+    assert response.status_code == 412
+
+    response = client.get(f"/mission/{mission_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    response = client.delete(f"/mission/{mission_id}", headers={"If-Match": etag})
+    assert response.status_code == 412
+
+    response = client.delete(f"/mission/{mission_id}", headers={"If-Match": "*"})
+    assert response.status_code == 200
+
+def test_if_match_concurrent_writers(monkeypatch):
+    """Test that two writers holding the same ETag cannot both pass If-Match."""
+    response = client.post("/mission/", json={
+        "is_complete": False,
+        "targets": [{"name": "RaceTarget", "country": "Country1"}]
+    })
+    target_id = client.get(f"/mission/{response.json()['id']}").json()["targets"][0]["id"]
+    etag = client.get(f"/target/{target_id}").headers["ETag"]
+
+    # The first writer pauses between comparing the ETag and updating, so the
+    # second one compares while the first update is still pending
+    read_target = crud.read_target
+    reads = []
+
+    def slow_read(session, target_id):
+        item = read_target(session, target_id)
+        reads.append(item["name"])
+        if len(reads) == 1:
+            time.sleep(0.2)
+        return item
+
+    monkeypatch.setitem(crud._DETAIL_READS, "target", (Target, slow_read))
+
+    statuses = []
+
+    def write(name):
+        with TEST_SESSION_FACTORY() as session:
+            try:
+                crud.update_target(session, target_id, TargetModelPatch(name=name), etag)
+                statuses.append(200)
+            except HTTPException as e:
+                statuses.append(e.status_code)
+
+    writers = [threading.Thread(target=write, args=(name,)) for name in ("First", "Second")]
+    for writer in writers:
+        writer.start()
+        time.sleep(0.05)
+    for writer in writers:
+        writer.join()
+
+    assert sorted(statuses) == [200, 412]
+    # The second writer compared against the first one's update
+    assert reads == ["RaceTarget", "First"]
+    assert client.get(f"/target/{target_id}").json()["name"] == "First"
+
+def test_export_ndjson():
+    """Test streaming the database as newline-delimited JSON."""
+    response = client.post("/spycat/", json={"name": "Exporter", "years_of_experience": 3, "breed": "Bengal", "salary": 100})
+    cat_id = response.json()["id"]
+    mission_id = client.post("/mission/", json={"cat_id": cat_id, "is_complete": False}).json()["id"]
+    response = client.post(f"/mission/{mission_id}/target/", json={"name": "ExportTarget", "country": "Country1"})
+    client.post(f"/target/{response.json()['id']}/note/", json={"content": "Note1"})
+    client.post("/mission/", json={"cat_id": cat_id, "is_complete": True})
+    client.post("/mission/", json={"is_complete": False})
+
+    submitted = db_executor.stats()["submitted"]
+    response = client.get("/export", params={"cat_id": cat_id, "is_complete": False})
+    assert response.status_code == 200
+    # The chunks are read on the database executor: four entities and the end of the stream
+    assert db_executor.stats()["submitted"] - submitted == 5
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["type"] for record in records] == ["spycat", "mission", "target", "note"]
+    assert records[0]["name"] == "Exporter"
+    assert records[1]["id"] == mission_id
+    assert records[2]["mission_id"] == mission_id
+    assert records[3]["content"] == "Note1"
+
+    # The test client decodes the gzip body transparently
+    response = client.get("/export", params={"compress": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    lines = response.text.splitlines()
+    assert len([line for line in lines if json.loads(line)["type"] == "mission"]) >= 3
+
+def test_import_ndjson():
+    """Test importing newline-delimited JSON in batches with per-line validation."""
+    records = [
+        {"type": "spycat", "id": 9001, "name": "Imported", "years_of_experience": 1, "breed": "Bengal", "salary": 10},
+        {"type": "mission", "id": 9001, "cat_id": 9001, "is_complete": False},
+        {"type": "target", "mission_id": 9001, "name": "ImportTarget", "country": "Country1"},
+        {"type": "spycat", "name": "", "breed": "Bengal"},
+        {"type": "planet"},
+        {"type": "note", "content": "Orphan"},
+        {"type": "spycat", "name": "Stray", "years_of_experience": 1, "breed": "Unknown Breed", "salary": 10},
+    ]
+    body = "\n".join(json.dumps(record) for record in records) + "\nnot json\n"
+
+    response = client.post("/import", params={"batch_size": 2}, content=body)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["imported"] == {"spycat": 1, "mission": 1, "target": 1, "note": 0}
+    assert [error["index"] for error in data["errors"]] == [3, 4, 5, 6, 7]
+    assert data["errors"][3]["detail"] == "Invalid breed"
+    assert data["checkpoint"] == 8
+
+    response = client.get("/mission/9001")
+    assert response.json()["cat"]["name"] == "Imported"
+    assert response.json()["targets"][0]["name"] == "ImportTarget"
+
+    # Re-imported ids are reported per line and the rest of the batch goes in
+    response = client.post("/import", params={"batch_size": 2}, content=body)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["imported"] == {"spycat": 0, "mission": 0, "target": 1, "note": 0}
+    assert [error["index"] for error in data["errors"]] == [0, 1, 3, 4, 5, 6, 7]
+    assert "UNIQUE" in data["errors"][0]["detail"]
+    assert data["checkpoint"] == 8
+
+    response = client.post("/import", params={"offset": 3}, content=body)
+    assert response.status_code == 200
+    assert response.json()["imported"]["spycat"] == 0
+
+def test_import_resumes_after_bad_line():
+    """Test that a line breaking a foreign key is skipped and checkpointed past."""
+    records = [
+        {"type": "spycat", "id": 9101, "name": "Resumer", "years_of_experience": 1, "breed": "Bengal", "salary": 10},
+        {"type": "mission", "id": 9101, "cat_id": 999999, "is_complete": False},
+        {"type": "mission", "id": 9102, "cat_id": 9101, "is_complete": False},
+        {"type": "target", "mission_id": 999999, "name": "Lost", "country": "Country1"},
+        {"type": "target", "mission_id": 9102, "name": "Found", "country": "Country1"},
+    ]
+    lines = [json.dumps(record) for record in records]
+
+    checkpoints = []
+    with TEST_SESSION_FACTORY() as session:
+        result = import_ndjson(session, lines[:4], batch_size=2, on_checkpoint=checkpoints.append)
+    assert result.aborted is None
+    assert result.imported == {"spycat": 1, "mission": 1, "target": 0, "note": 0}
+    assert [(error.index, error.detail) for error in result.errors] == [
+        (1, "FOREIGN KEY constraint failed"), (3, "FOREIGN KEY constraint failed")
+    ]
+    assert checkpoints == [2, 4]
+
+    # Resuming from the checkpoint goes on after the bad lines
+    with TEST_SESSION_FACTORY() as session:
+        result = import_ndjson(session, lines, batch_size=2, offset=checkpoints[-1])
+    assert result.errors == []
+    assert result.imported == {"spycat": 0, "mission": 0, "target": 1, "note": 0}
+    assert result.checkpoint == 5
+
+    response = client.get("/mission/9102")
+    assert response.json()["targets"][0]["name"] == "Found"
+    assert client.get("/mission/9101").status_code == 404
+
+def test_import_cli_round_trip(tmp_path):
+    """Test exporting the database and importing it into a new one with the CLI."""
+    client.post("/spycat/", json={"name": "RoundTrip", "years_of_experience": 2, "breed": "Bengal", "salary": 50})
+    export_path = tmp_path / "export.ndjson"
+    export_path.write_bytes(client.get("/export").content)
+    lines = len(export_path.read_text().splitlines())
+
+    checkpoint_path = tmp_path / "checkpoint"
+    database_url = f"sqlite:///{tmp_path / 'copy.db'}"
+    args = [str(export_path), "--batch-size", "1", "--checkpoint", str(checkpoint_path), "--database-url", database_url]
+
+    assert import_main(args) == 0
+    assert checkpoint_path.read_text() == str(lines)
+
+    # Nothing is left to import once the checkpoint reaches the end of the file
+    engine = create_db_engine(database_url)
+    with Session(engine) as session:
+        result = import_ndjson(session, export_path.open("rb"), offset=int(checkpoint_path.read_text()))
+        assert sum(result.imported.values()) == 0
+        assert session.exec(select(SpyCat).where(SpyCat.name == "RoundTrip")).first() is not None
+    engine.dispose()
+
+@pytest.mark.asyncio
+async def test_database_executor_backpressure(monkeypatch):
+    """Test that a saturated database thread pool sheds load while the event loop stays responsive."""
+    executor = DatabaseExecutor(max_workers=1, max_queue=1, retry_after=3)
+    monkeypatch.setattr(database, "db_executor", executor)
+    release = threading.Event()
+
+    busy = asyncio.ensure_future(executor.run(release.wait, 5))
+    queued = asyncio.ensure_future(executor.run(lambda: "queued"))
+    await asyncio.sleep(0.05)
+    assert executor.stats()["running"] == 1
+    assert executor.stats()["queue_depth"] == 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+        response = await async_client.get("/spycat/")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "3"
+
+        response = await asyncio.wait_for(async_client.get("/health"), timeout=1)
+        assert response.status_code == 200
+
+        release.set()
+        assert await busy is True
+        assert await queued == "queued"
+
+        response = await async_client.get("/spycat/")
+        assert response.status_code == 200
+
+        stats = executor.stats()
+        assert stats["rejected"] == 1
+        assert stats["completed"] == stats["submitted"] == 3
+        assert stats["queue_depth"] == 0
+
+    executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_database_executor_pool_sizing(tmp_path):
+    """Test that requests making several database calls cannot starve the workers of connections."""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", connect_args={"check_same_thread": False},
+        pool_size=2, max_overflow=0, pool_timeout=2
+    )
+    assert engine_pool_capacity(engine) == 2
+    assert executor_workers(engine) == 1
+    assert executor_workers(engine, configured=8) == 1
+
+    executor = DatabaseExecutor(executor_workers(engine))
+    factory = create_session_factory(engine)
+
+    async def request():
+        # Like a conditional write that reads first: two calls with a wait between
+        with factory() as session:
+            db = SessionRunner(session, executor)
+            await db.run(lambda session: session.execute(text("SELECT 1")).scalar())
+            await asyncio.sleep(0.01)
+            return await db.run(lambda session: session.execute(text("SELECT 2")).scalar())
+
+    # Sessions used to keep their connection between calls, so with a worker
+    # per connection the queued calls waited on the pool for the idle requests
+    results = await asyncio.wait_for(asyncio.gather(*(request() for _ in range(10))), timeout=10)
+    assert results == [2] * 10
+    assert engine.pool.checkedout() == 0
+
+    executor.shutdown()
+    engine.dispose()
+
+@pytest.mark.asyncio
+async def test_benchmark_harness(tmp_path):
+    """Test that the benchmark seeds its own database and reports every scenario."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'benchmark.db'}")
+    calls_before = len(upstream_calls)
+
+    results = await run_benchmark(engine, SeedSize(cats=5, missions=1, targets=2, notes=1), requests=6, concurrency=3)
+    engine.dispose()
+
+    assert results["seed"] == {"cats": 5, "missions": 1, "targets": 2, "notes": 1}
+    assert len(results["scenarios"]) == 16
+    for result in results["scenarios"].values():
+        assert result["requests"] == 6
+        assert result["errors"] == 0
+        assert result["queries"] > 0
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"]
+
+    # The breed check used the benchmark's mock, and the test overrides are back in place
+    assert len(upstream_calls) == calls_before
+    assert app.dependency_overrides[get_engine]() is TEST_ENGINE
+
+    # The async session path runs against the seeded database too
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'benchmark_async.db'}")
+    results = await run_benchmark(engine, SeedSize(cats=5, missions=1, targets=2, notes=1), requests=4,
+                                  concurrency=2, only=["get_mission", "create_note"], mode="async")
+    engine.dispose()
+
+    assert results["mode"] == "async"
+    assert set(results["scenarios"]) == {"get_mission", "create_note"}
+    for result in results["scenarios"].values():
+        assert result["errors"] == 0
+        assert result["queries"] > 0
+    assert get_db not in app.dependency_overrides
+
+    # A database of its own is only seeded with --reset
+    with pytest.raises(SystemExit):
+        benchmark_main(["--database-url", f"sqlite:///{tmp_path / 'keep.db'}"])
+    assert not (tmp_path / "keep.db").exists()
+
+def test_metrics_endpoint():
+    """Test the Prometheus metrics for requests, SQL and breed validation."""
+    response = client.post("/spycat/", json={"name": "Metered", "years_of_experience": 1, "breed": "Bengal", "salary": 1})
+    spycat_id = response.json()["id"]
+    client.get(f"/spycat/{spycat_id}")
+    client.get("/spycat/999999")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+
+    assert 'sca_http_requests_total{method="GET",route="/spycat/{spycat_id}",status="404"}' in text
+    assert 'sca_http_request_duration_seconds_bucket{method="POST",route="/spycat/",le="+Inf"}' in text
+    assert 'sca_db_queries_per_request_count{route="/spycat/{spycat_id}"}' in text
+    assert 'sca_breed_validation_seconds_count{result="valid"}' in text
+    assert "sca_db_pool_checkout_seconds_count" in text
+    assert "sca_http_requests_in_flight 1" in text
+    assert "sca_db_executor_queue_depth 0" in text
+
+    queries = [line for line in text.splitlines() if line.startswith("sca_db_queries_total ")]
+    assert int(float(queries[0].split()[1])) > 0
+
+def test_profiling_captures_slow_requests(tmp_path, monkeypatch):
+    """Test opt-in request profiling with a bounded on-disk ring buffer."""
+    monkeypatch.setattr(request_profiler, "store", ProfileStore(str(tmp_path), max_entries=2))
+    monkeypatch.setattr(request_profiler, "threshold_ms", 0)
+
+    response = client.post("/spycat/", json={"name": "Profiled", "years_of_experience": 1, "breed": "Bengal", "salary": 1})
+    spycat_id = response.json()["id"]
+
+    # Profiling is off by default, even with the header
+    client.get(f"/spycat/{spycat_id}", headers={"X-SCA-Profile": "1"})
+    assert client.get("/diagnostics/profiles").json() == []
+
+    monkeypatch.setattr(request_profiler, "enabled", True)
+    client.get(f"/spycat/{spycat_id}")
+    assert client.get("/diagnostics/profiles").json() == []
+
+    response_cache.clear()
+    for years in range(3):
+        response = client.put(f"/spycat/{spycat_id}", headers={"X-SCA-Profile": "1"},
+                              json={"name": "Profiled", "years_of_experience": years + 2, "breed": "Bengal", "salary": 2})
+        assert response.status_code == 200
+
+    profiles = client.get("/diagnostics/profiles").json()
+    assert len(profiles) == 2
+    assert profiles[0]["route"] == "/spycat/{spycat_id}"
+    assert profiles[0]["trigger"] == "header"
+    assert profiles[0]["queries"] > 0
+
+    profile = client.get(f"/diagnostics/profiles/{profiles[0]['id']}").json()
+    assert any(entry["statement"].startswith("UPDATE spycat") for entry in profile["sql"])
+    # Functions run on the database worker threads are part of the profile
+    assert any("update_spycat" in entry["function"] for entry in profile["functions"])
+
+    response = client.get(f"/diagnostics/profiles/{profiles[0]['id']}/pstats")
+    assert response.status_code == 200
+    assert client.get("/diagnostics/profiles/../../etc").status_code == 404
+
+    # Requests below the threshold are not kept
+    monkeypatch.setattr(request_profiler, "threshold_ms", 60_000)
+    client.get(f"/spycat/{spycat_id}", headers={"X-SCA-Profile": "1"})
+    assert len(client.get("/diagnostics/profiles").json()) == 2
+
+def test_stats():
+    """Test the per-cat and overall completion counts."""
+    before = client.get("/stats").json()
+
+    cat_id = client.post("/spycat/", json={"name": "Counted", "years_of_experience": 1, "breed": "Bengal", "salary": 1}).json()["id"]
+    mission_id = client.post("/mission/", json={"cat_id": cat_id, "is_complete": False}).json()["id"]
+    first = client.post(f"/mission/{mission_id}/target/", json={"name": "T1", "country": "C", "notes": [{"content": "a"}, {"content": "b"}]}).json()["id"]
+    client.post(f"/mission/{mission_id}/target/", json={"name": "T2", "country": "C", "is_complete": True})
+    client.post("/mission/", json={"cat_id": cat_id, "is_complete": True})
+    unassigned_id = client.post("/mission/", json={"is_complete": False}).json()["id"]
+    client.post(f"/mission/{unassigned_id}/target/", json={"name": "T3", "country": "C"})
+    client.post("/spycat/", json={"name": "Idle", "years_of_experience": 1, "breed": "Bengal", "salary": 1})
+
+    with QueryCounter(TEST_ENGINE) as counter:
+        response = client.get("/stats")
+    assert response.status_code == 200
+    assert counter.count == 2
+    data = response.json()
+
+    cat = next(cat for cat in data["cats"] if cat["cat_id"] == cat_id)
+    assert cat == {
+        "cat_id": cat_id, "name": "Counted", "missions": 2, "missions_complete": 1,
+        "targets": 2, "targets_complete": 1, "notes": 2, "notes_per_target": 1.0
+    }
+    assert data["cats"][-1]["name"] == "Idle"
+    assert data["cats"][-1]["missions"] == 0
+
+    assert data["overall"]["missions"] == before["overall"]["missions"] + 3
+    assert data["overall"]["targets"] == before["overall"]["targets"] + 3
+    assert data["unassigned"]["missions"] == before["unassigned"]["missions"] + 1
+    assert data["unassigned"]["targets"] == before["unassigned"]["targets"] + 1
+
+    response = client.get("/stats", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+    client.put(f"/target/{first}", json={"name": "T1", "country": "C", "is_complete": True})
+    cat = next(cat for cat in client.get("/stats").json()["cats"] if cat["cat_id"] == cat_id)
+    assert cat["targets_complete"] == 2
+
+def test_list_filters_sorting_and_fields():
+    """Test the SQL filters, sort keys and sparse fieldsets of the list endpoints."""
+    cats = [
+        {"name": "FilterAlpha", "years_of_experience": 5, "breed": "Sphynx", "salary": 300},
+        {"name": "FilterBeta", "years_of_experience": 1, "breed": "Sphynx", "salary": 100},
+        {"name": "FilterGamma", "years_of_experience": 3, "breed": "Bengal", "salary": 200},
+        {"name": "Filtes", "years_of_experience": 2, "breed": "Sphynx", "salary": 150},
+    ]
+    ids = [client.post("/spycat/", json=cat).json()["id"] for cat in cats]
+
+    response = client.get("/spycat/", params={"name_prefix": "Filter", "breed": "Sphynx", "order_by": "salary"})
+    data = response.json()
+    assert [cat["name"] for cat in data["spycats"]] == ["FilterBeta", "FilterAlpha"]
+    assert data["all_count"] == 2
+    assert data["all_count_exact"]
+
+    response = client.get("/spycat/", params={"name_prefix": "Filt", "min_salary": 150, "max_salary": 300,
+                                               "order_by": "salary", "limit": 2, "fields": "name"})
+    data = response.json()
+    assert data["spycats"] == [{"id": ids[3], "name": "Filtes"}, {"id": ids[2], "name": "FilterGamma"}]
+    response = client.get("/spycat/", params={"name_prefix": "Filt", "min_salary": 150, "max_salary": 300,
+                                               "order_by": "salary", "limit": 2, "fields": "name",
+                                               "cursor": data["next_cursor"]})
+    assert response.json()["spycats"] == [{"id": ids[0], "name": "FilterAlpha"}]
+
+    with QueryCounter(TEST_ENGINE) as counter:
+        client.get("/spycat/", params={"breed": "Sphynx", "fields": "name,breed", "include_count": False})
+    assert "spycat.salary" not in counter.statements[0]
+    assert "spycat.breed = ?" in counter.statements[0]
+
+    assert client.get("/spycat/", params={"fields": "name,password"}).status_code == 400
+    assert client.get("/spycat/", params={"order_by": "breed"}).status_code == 422
+
+    mission_id = client.post("/mission/", json={"cat_id": ids[0], "is_complete": True}).json()["id"]
+    unassigned_id = client.post("/mission/", json={"is_complete": False}).json()["id"]
+
+    data = client.get("/mission/", params={"cat_id": ids[0], "is_complete": True}).json()
+    assert [mission["id"] for mission in data["missions"]] == [mission_id]
+    assert data["missions"][0]["cat"]["name"] == "FilterAlpha"
+    assert data["all_count"] == 1
+
+    data = client.get("/mission/", params={"unassigned": True, "is_complete": False, "limit": 0, "fields": "is_complete"}).json()
+    assert {"id": unassigned_id, "is_complete": False} in data["missions"]
+    assert all(set(mission) == {"id", "is_complete"} for mission in data["missions"])
+
+    data = client.get("/mission/", params={"cat_id": ids[0], "fields": "cat"}).json()
+    assert data["missions"] == [{"id": mission_id, "cat": {**cats[0], "id": ids[0], "salary": 300.0}}]
+
+    # Cursor pages over a nullable sort key visit every mission once, unassigned ones first
+    client.post("/mission/", json={"cat_id": ids[0], "is_complete": False})
+    client.post("/mission/", json={"is_complete": True})
+    everything = client.get("/mission/", params={"limit": 0, "fields": "cat_id"}).json()["missions"]
+    expected = sorted(everything, key=lambda mission: (mission["cat_id"] is not None, mission["cat_id"] or 0, mission["id"]))
+
+    seen, cursor = [], None
+    while True:
+        data = client.get("/mission/", params={"order_by": "cat_id", "limit": 2, "fields": "cat_id",
+                                                "include_count": False, **({"cursor": cursor} if cursor else {})}).json()
+        seen += data["missions"]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+    data = client.get("/mission/", params={"cat_id": ids[0], "order_by": "is_complete", "fields": "is_complete"}).json()
+    assert [mission["is_complete"] for mission in data["missions"]] == [False, True]
+    cursor = client.get("/mission/", params={"cat_id": ids[0], "order_by": "is_complete", "limit": 1}).json()["next_cursor"]
+    data = client.get("/mission/", params={"cat_id": ids[0], "order_by": "is_complete", "cursor": cursor}).json()
+    assert [mission["id"] for mission in data["missions"]] == [mission_id]
+    assert client.get("/mission/", params={"order_by": "cat_id", "cursor": cursor}).status_code == 400
+    assert client.get("/mission/", params={"order_by": "cat"}).status_code == 422
+
+def test_search():
+    """Test full-text search over notes and targets kept in sync by triggers."""
+    mission_id = client.post("/mission/", json={"is_complete": False}).json()["id"]
+    target = client.post(f"/mission/{mission_id}/target/", json={"name": "Zanzibar Harbour", "country": "Tanzania"}).json()
+    other = client.post(f"/mission/{mission_id}/target/", json={"name": "Lighthouse", "country": "Zanzibar"}).json()
+    note = client.post(f"/target/{other['id']}/note/", json={"content": "Rendezvous at the zanzibar docks at dawn"}).json()
+    client.post(f"/target/{other['id']}/note/", json={"content": "Nothing to report"})
+
+    with QueryCounter(TEST_ENGINE) as counter:
+        response = client.get("/search", params={"q": "Zanzibar"})
+    assert response.status_code == 200
+    assert counter.count == 1
+    results = response.json()["results"]
+
+    assert {(result["type"], result["id"]) for result in results} == {
+        ("target", target["id"]), ("target", other["id"]), ("note", note["id"])
+    }
+    # Name matches outrank country matches
+    ranked_targets = [result["id"] for result in results if result["type"] == "target"]
+    assert ranked_targets == [target["id"], other["id"]]
+    assert "<mark>zanzibar</mark>" in next(result["snippet"] for result in results if result["type"] == "note")
+
+    page = client.get("/search", params={"q": "zanz*", "limit": 2}).json()
+    assert len(page["results"]) == 2
+    assert page["next_skip"] == 2
+    page = client.get("/search", params={"q": "zanz*", "limit": 2, "skip": 2}).json()
+    assert len(page["results"]) == 1
+    assert page["next_skip"] is None
+
+    results = client.get("/search", params={"q": "rendezvous docks", "type": "note"}).json()["results"]
+    assert [result["id"] for result in results] == [note["id"]]
+
+    # FTS5 syntax in the input is matched literally instead of failing
+    assert client.get("/search", params={"q": 'docks" OR NEAR(('}).status_code == 200
+    assert client.get("/search", params={"q": "!!"}).status_code == 400
+
+    # Snippets escape the stored text, so only the highlight is markup
+    script = client.post(f"/target/{other['id']}/note/", json={"content": "<img src=x onerror=alert(1)> payload & co"}).json()
+    results = client.get("/search", params={"q": "payload", "type": "note"}).json()["results"]
+    assert results == [{"type": "note", "id": script["id"], "rank": results[0]["rank"],
+                        "snippet": "&lt;img src=x onerror=alert(1)&gt; <mark>payload</mark> &amp; co"}]
+
+    client.put(f"/note/{note['id']}", json={"content": "Moved to the airport"})
+    client.delete(f"/target/{target['id']}")
+    results = client.get("/search", params={"q": "zanzibar"}).json()["results"]
+    assert [(result["type"], result["id"]) for result in results] == [("target", other["id"])]
+    assert client.get("/search", params={"q": "airport"}).json()["results"][0]["id"] == note["id"]
+
+def test_set_based_cascade_deletes():
+    """Test that deletes are single statements relying on ON DELETE CASCADE."""
+    assert client.get("/diagnostics/database").json()["effective"]["foreign_keys"] == 1
+
+    targets = [{"name": f"CascadeTarget{i}", "country": "Cascadia",
+                "notes": [{"content": f"cascade note {i}-{j}"} for j in range(5)]} for i in range(10)]
+    mission_id = client.post("/mission/bulk", json=[{"is_complete": True, "targets": targets}]).json()["created"][0]["id"]
+    assert len(client.get("/search", params={"q": "cascadia", "limit": 100}).json()["results"]) == 10
+
+    with QueryCounter(TEST_ENGINE) as counter:
+        response = client.delete(f"/mission/{mission_id}")
+    assert response.status_code == 200
+    assert response.json()["id"] == mission_id
+    assert [s for s in counter.statements if not s.startswith("SELECT")] == [
+        next(s for s in counter.statements if s.startswith("DELETE FROM mission"))
+    ]
+
+    with Session(TEST_ENGINE) as session:
+        assert session.exec(select(Target).where(Target.name.startswith("CascadeTarget"))).all() == []
+        assert session.exec(select(Note).where(Note.content.startswith("cascade note"))).all() == []
+    assert client.get("/search", params={"q": "cascadia"}).json()["results"] == []
+
+    # Foreign keys are enforced
+    with pytest.raises(IntegrityError):
+        with Session(TEST_ENGINE) as session:
+            session.add(Note(target_id=999999, content="orphan"))
+            session.commit()
+
+    # Deleting a cat unassigns its missions
+    cat_id = client.post("/spycat/", json={"name": "Retiring", "years_of_experience": 1, "breed": "Bengal", "salary": 1}).json()["id"]
+    assigned_id = client.post("/mission/", json={"cat_id": cat_id, "is_complete": True}).json()["id"]
+    assert client.delete(f"/mission/{assigned_id}").status_code == 400
+    assert client.delete("/mission/999999").status_code == 404
+    assert client.delete(f"/spycat/{cat_id}").status_code == 200
+    assert client.get(f"/mission/{assigned_id}").json()["cat_id"] is None
+
+    # Bulk delete of completed unassigned missions
+    kept_id = client.post("/mission/", json={"is_complete": False}).json()["id"]
+    cat_id = client.post("/spycat/", json={"name": "Busy", "years_of_experience": 1, "breed": "Bengal", "salary": 1}).json()["id"]
+    busy_id = client.post("/mission/", json={"cat_id": cat_id, "is_complete": True}).json()["id"]
+    client.get(f"/mission/{assigned_id}")
+
+    response = client.delete("/mission/", params={"is_complete": True})
+    assert response.status_code == 200
+    assert response.json()["deleted"] >= 1
+    assert client.get(f"/mission/{assigned_id}").status_code == 404
+    assert client.get(f"/mission/{kept_id}").status_code == 200
+    assert client.get(f"/mission/{busy_id}").status_code == 200
+    assert client.delete("/mission/").status_code == 422
+
+def test_partial_and_bulk_updates():
+    """Test PATCH endpoints and bulk target updates with one UPDATE ... RETURNING."""
+    targets = [{"name": f"PatchTarget{i}", "country": "Patchland"} for i in range(20)]
+    mission = client.post("/mission/bulk", json=[{"targets": targets}]).json()["created"][0]
+    mission_id = mission["id"]
+    target_ids = [target["id"] for target in mission["targets"]]
+
+    # Only the given fields change, in a single statement
+    with QueryCounter(TEST_ENGINE) as counter:
+        response = client.patch(f"/target/{target_ids[0]}", json={"country": "Elsewhere"})
+    assert response.status_code == 200
+    assert response.json() == {**mission["targets"][0], "country": "Elsewhere", "mission_id": mission_id}
+    assert [s.split()[0] for s in counter.statements] == ["UPDATE"]
+
+    assert client.patch(f"/target/{target_ids[0]}", json={"name": ""}).status_code == 400
+    assert client.patch(f"/target/{target_ids[0]}", json={"name": None}).status_code == 400
+    assert client.patch("/target/999999", json={"name": "Nobody"}).status_code == 404
+    # A missing row is reported before invalid data sent for it
+    assert client.patch("/target/999999", json={"name": ""}).status_code == 404
+    assert client.put("/spycat/999999", json={"name": "Nobody", "years_of_experience": 1, "breed": "Invalid", "salary": 1}).status_code == 404
+    assert client.patch("/spycat/999999", json={"salary": -1}).status_code == 404
+    assert client.patch("/note/999999", json={"content": ""}).status_code == 404
+
+    cat_id = client.post("/spycat/", json={"name": "Patchy", "years_of_experience": 2, "breed": "Bengal", "salary": 10}).json()["id"]
+    response = client.patch(f"/spycat/{cat_id}", json={"salary": 20})
+    assert response.json()["salary"] == 20 and response.json()["name"] == "Patchy"
+    assert client.patch(f"/spycat/{cat_id}", json={"salary": -1}).status_code == 400
+    assert client.patch(f"/spycat/{cat_id}", json={"name": None}).status_code == 400
+    assert client.patch(f"/mission/{mission_id}", json={"is_complete": None}).status_code == 400
+
+    assert client.patch(f"/mission/{mission_id}", json={"cat_id": 999999}).status_code == 404
+    assert client.patch(f"/mission/{mission_id}", json={"cat_id": cat_id}).json()["cat_id"] == cat_id
+    assert client.get(f"/spycat/{cat_id}").json()["missions"][0]["id"] == mission_id
+    assert client.patch(f"/mission/{mission_id}", json={"cat_id": None}).json()["cat_id"] is None
+    assert client.get(f"/spycat/{cat_id}").json()["missions"] == []
+
+    # Bulk: one UPDATE per distinct change set
+    note_id = client.post(f"/target/{target_ids[1]}/note/", json={"content": "Still open"}).json()["id"]
+    updates = [{"id": target_id, "is_complete": True} for target_id in target_ids[1:]]
+    updates += [{"id": target_ids[0], "name": "Renamed"}, {"id": 999999, "is_complete": True}, {"id": target_ids[2]}]
+    with QueryCounter(TEST_ENGINE) as counter:
+        response = client.patch("/target/bulk", json=updates)
+    assert response.status_code == 200
+    data = response.json()
+    assert [target["id"] for target in data["updated"]] == target_ids[1:] + [target_ids[0]]
+    assert all(target["is_complete"] for target in data["updated"][:-1])
+    assert data["updated"][-1]["name"] == "Renamed" and not data["updated"][-1]["is_complete"]
+    assert data["errors"] == [
+        {"index": 20, "detail": "Target not found"},
+        {"index": 21, "detail": "Duplicate Target ID"},
+    ]
+    assert len([s for s in counter.statements if s.startswith("UPDATE")]) == 2
+    assert client.get(f"/mission/{mission_id}").json()["targets"][1]["is_complete"] is True
+
+    response = client.patch("/target/bulk", params={"atomic": True}, json=[
+        {"id": target_ids[0], "is_complete": True}, {"id": 999999, "is_complete": True}
+    ])
+    assert response.status_code == 400
+    assert client.get(f"/target/{target_ids[0]}").json()["is_complete"] is False
+
+    # The completed target and mission guards are part of the note UPDATE
+    with QueryCounter(TEST_ENGINE) as counter:
+        response = client.patch(f"/note/{note_id}", json={"content": "Too late"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cannot update note for a completed target"
+    assert counter.statements[0].startswith("UPDATE note")
+
+    client.patch(f"/target/{target_ids[1]}", json={"is_complete": False})
+    client.patch(f"/mission/{mission_id}", json={"is_complete": True})
+    response = client.put(f"/note/{note_id}", json={"content": "Too late"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cannot update note for a completed mission"
+
+    client.patch(f"/mission/{mission_id}", json={"is_complete": False})
+    response = client.patch(f"/note/{note_id}", json={"content": "Just in time"})
+    assert response.status_code == 200
+    assert client.get(f"/note/{note_id}").json()["content"] == "Just in time"
+    assert client.patch("/note/999999", json={"content": "Nobody"}).status_code == 404
+
+    # So are the guards of the note INSERTs
+    client.patch(f"/target/{target_ids[1]}", json={"is_complete": True})
+    with QueryCounter(TEST_ENGINE) as counter:
+        response = client.post(f"/target/{target_ids[1]}/note/", json={"content": "Too late"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cannot add note to a completed target"
+    assert counter.statements[0].startswith("INSERT INTO note") and "EXISTS" in counter.statements[0]
+
+    response = client.post(f"/target/{target_ids[1]}/note/bulk", json=[{"content": "Too late"}])
+    assert response.json()["detail"] == "Cannot add note to a completed target"
+    assert client.post("/target/999999/note/bulk", params={"atomic": True}, json=[{"content": ""}]).status_code == 404
+    assert client.post("/target/999999/note/", json={"content": "Nobody"}).status_code == 404
+
+    # Large batches are inserted in chunks, in input order
+    contents = [f"Bulk note {i}" for i in range(600)] + [""]
+    response = client.post(f"/target/{target_ids[0]}/note/bulk", json=[{"content": content} for content in contents])
+    assert response.status_code == 200
+    assert [note["content"] for note in response.json()["created"]] == contents[:-1]
+    assert response.json()["errors"] == [{"index": 600, "detail": "Invalid Note data"}]
+
+def test_writes_skip_refresh():
+    """Test that writes return the persisted state without a refresh SELECT."""
+    cat_data = {"name": "Fresh", "years_of_experience": 1, "breed": "Bengal", "salary": 100.0}
+
+    with QueryCounter(TEST_ENGINE) as counter:
+        response = client.post("/spycat/", json=cat_data)
+    assert response.status_code == 200
+    assert response.json() == {**cat_data, "id": response.json()["id"]}
+    assert [s.split()[0] for s in counter.statements] == ["INSERT"]
+
+    mission_id = client.post("/mission/", json={"is_complete": False}).json()["id"]
+    target_id = client.post(f"/mission/{mission_id}/target/", json={"name": "T", "country": "C"}).json()["id"]
+    with QueryCounter(TEST_ENGINE) as counter:
+        response = client.post(f"/target/{target_id}/note/", json={"content": "No refresh"})
+    assert response.json() == {"id": response.json()["id"], "target_id": target_id, "content": "No refresh"}
+    assert [s.split()[0] for s in counter.statements] == ["INSERT"]
+
+    # Expiring sessions still return complete objects, at the cost of a refresh
+    expiring = create_session_factory(TEST_ENGINE, expire_on_commit=True)
+
+    def get_expiring_session():
+        with expiring() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_expiring_session
+    try:
+        with QueryCounter(TEST_ENGINE) as counter:
+            response = client.post("/spycat/", json=cat_data)
+    finally:
+        app.dependency_overrides[get_session] = get_test_session
+    assert response.json() == {**cat_data, "id": response.json()["id"]}
+    assert [s.split()[0] for s in counter.statements] == ["INSERT", "SELECT"]
+
+def test_direct_serialization(monkeypatch):
+    """Test that read payloads encoded from column values match the response models byte for byte."""
+    cat_id = client.post("/spycat/", json={"name": "Zoë", "years_of_experience": 4, "breed": "Bengal", "salary": 1500}).json()["id"]
+    mission = client.post("/mission/bulk", json=[{"cat_id": cat_id, "targets": [
+        {"name": "Ünïcode", "country": "Österreich"},
+        {"name": "Empty", "country": "Nowhere"},
+    ]}]).json()["created"][0]
+    mission_id = mission["id"]
+    target_id = mission["targets"][0]["id"]
+    note_id = client.post(f"/target/{target_id}/note/", json={"content": "line\nbreak \"quoted\""}).json()["id"]
+    unassigned_id = client.post("/mission/", json={}).json()["id"]
+
+    endpoints = [
+        (f"/spycat/{cat_id}", SpyCatModelRead),
+        ("/spycat/?limit=100", SpyCatsCount),
+        (f"/mission/{mission_id}", MissionModelRead),
+        (f"/mission/{unassigned_id}", MissionModelRead),
+        ("/mission/?limit=100", MissionCount),
+        (f"/target/{target_id}", TargetModelRead),
+        (f"/target/{mission['targets'][1]['id']}", TargetModelRead),
+        (f"/note/{note_id}", NoteModelRead),
+        (f"/mission/{mission_id}/target/", list[Target]),
+        (f"/target/{target_id}/note/", list[Note]),
+    ]
+
+    payloads = {}
+    for url, model in endpoints:
+        response = client.get(url)
+        assert response.status_code == 200
+        adapter = serialization.type_adapter(model)
+        assert response.content == adapter.dump_json(adapter.validate_json(response.content)), url
+        payloads[url] = response.content
+
+    data = client.get(f"/mission/{mission_id}").json()
+    assert data["cat"]["name"] == "Zoë" and data["cat"]["salary"] == 1500.0
+    assert [target["name"] for target in data["targets"]] == ["Ünïcode", "Empty"]
+    assert client.get(f"/mission/{unassigned_id}").json()["cat"] is None
+
+    # Sparse fieldsets select only the requested columns, the cat through a join
+    missions = client.get("/mission/", params={"fields": "cat,is_complete", "cat_id": cat_id}).json()["missions"]
+    assert missions == [{"id": mission_id, "is_complete": False, "cat": data["cat"]}]
+
+    # Without orjson the payloads and their ETags are unchanged
+    monkeypatch.setattr(serialization, "orjson", None)
+    response_cache.clear()
+    for url, _ in endpoints:
+        assert client.get(url).content == payloads[url], url
+
+    response = client.get("/spycat/999999")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Spy Cat not found"
+
+def test_response_compression(monkeypatch):
+    """Test negotiated brotli and gzip compression and compact responses."""
+    assert compression.negotiate_encoding("gzip, deflate, br") == "br"
+    assert compression.negotiate_encoding("gzip;q=1.0, br;q=0.5") == "gzip"
+    assert compression.negotiate_encoding("br;q=0, *") == "gzip"
+    assert compression.negotiate_encoding("identity") is None
+    assert compression.negotiate_encoding("gzip;q=0") is None
+    assert compression.negotiate_encoding(None) is None
+    assert compression.negotiate_encoding("br, gzip", ("gzip",)) == "gzip"
+
+    targets = [{"name": f"Compressible target {i}", "country": "Compressia"} for i in range(40)]
+    mission_id = client.post("/mission/bulk", json=[{"targets": targets}]).json()["created"][0]["id"]
+    url = f"/mission/{mission_id}"
+
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["vary"]
+    assert len(plain.content) > config.COMPRESS_MIN_SIZE
+
+    for encoding in ("br", "gzip"):
+        response = client.get(url, headers={"Accept-Encoding": encoding})
+        assert response.headers["content-encoding"] == encoding
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) < len(plain.content) // 4
+        assert response.content == plain.content
+        # A strong ETag differs per content coding
+        encoded_etag = response.headers["etag"]
+        assert encoded_etag == plain.headers["etag"][:-1] + f'-{encoding}"'
+
+        response = client.get(url, headers={"Accept-Encoding": encoding, "If-None-Match": encoded_etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == encoded_etag
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert "content-encoding" not in response.headers
+
+        response = client.get(url, headers={"Accept-Encoding": encoding, "If-None-Match": plain.headers["etag"]})
+        assert response.status_code == 304
+        assert response.headers["etag"] == plain.headers["etag"]
+
+    # The suffix is stripped again for conditional writes
+    target_url = f"/target/{plain.json()['targets'][-1]['id']}"
+    target_etag = client.get(url, headers={"Accept-Encoding": "gzip"}).headers["etag"]
+    assert client.patch(target_url, json={"country": "Elsewhere"}, headers={"If-Match": target_etag}).status_code == 412
+    target_etag = etags.variant_etag(client.get(target_url).headers["etag"], "gzip")
+    assert client.patch(target_url, json={"country": "Compressia"}, headers={"If-Match": target_etag}).status_code == 200
+
+    # Small responses and the already-gzipped export are left alone, but small ones still vary
+    cat_id = client.post("/spycat/", json={"name": "Tiny", "years_of_experience": 0, "breed": "Bengal", "salary": 0}).json()["id"]
+    response = client.get(f"/spycat/{cat_id}", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert not response.headers["etag"].endswith('-gzip"')
+    response = client.get("/export", params={"compress": "gzip"}, headers={"Accept-Encoding": "br"})
+    assert response.headers["content-encoding"] == "gzip"
+
+    # compact=true drops nulls and defaults
+    compact = client.get(url, params={"compact": True}).json()
+    assert "cat" not in compact and "cat_id" not in compact and "is_complete" not in compact
+    assert compact["targets"][0] == {"id": compact["targets"][0]["id"], "name": "Compressible target 0", "country": "Compressia"}
+    compact = client.get(f"/spycat/{cat_id}", params={"compact": "true"}).json()
+    assert compact == {"id": cat_id, "name": "Tiny", "breed": "Bengal", "missions": []}
+    missions = client.get("/mission/", params={"compact": True, "is_complete": False}).json()["missions"]
+    assert all("targets" not in mission and "is_complete" not in mission for mission in missions)
+
+    # The compact ETag is a variant of the full one and is accepted by If-Match
+    identity = {"Accept-Encoding": "identity"}
+    full_etag = client.get(url, headers=identity).headers["etag"]
+    response = client.get(url, params={"compact": True}, headers=identity)
+    compact_etag = response.headers["etag"]
+    assert compact_etag == full_etag[:-1] + '-compact"'
+    assert client.get(url, params={"compact": True}, headers={"If-None-Match": compact_etag}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": compact_etag}).status_code == 200
+
+    target_url = f"/target/{response.json()['targets'][0]['id']}"
+    etag = client.get(target_url, params={"compact": True}).headers["etag"]
+    response = client.patch(target_url, json={"country": "Compactia"}, headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert client.patch(target_url, json={"country": "Stale"}, headers={"If-Match": etag}).status_code == 412
+    etag = client.get(target_url, params={"compact": True}).headers["etag"]
+    response = client.put(target_url, json={"name": "Compact target", "country": "Compactia"}, headers={"If-Match": etag})
+    assert response.status_code == 200
+    etag = client.get(target_url, params={"compact": True}).headers["etag"]
+    assert client.delete(target_url, headers={"If-Match": etag}).status_code == 200
+
+    # Large bodies are compressed on a worker thread; streamed bodies pass through
+    threaded = []
+
+    async def to_thread(fn, *args):
+        threaded.append(args[1])
+        return fn(*args)
+
+    monkeypatch.setattr(compression.asyncio, "to_thread", to_thread)
+
+    async def body_app(scope, receive, send):
+        streamed = scope["path"] == "/stream"
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"x" * 5000, "more_body": streamed})
+        if streamed:
+            await send({"type": "http.response.body", "body": b"y" * 5000})
+
+    small_client = TestClient(compression.CompressionMiddleware(body_app, minimum_size=100, thread_size=4096))
+    response = small_client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == b"x" * 5000
+    assert threaded == ["gzip"]
+
+    response = small_client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content == b"x" * 5000 + b"y" * 5000
+    assert threaded == ["gzip"]